@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Z1Test.settings')
+os.environ.setdefault('ASYNC_GRAPHQL', 'true')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from api.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # The WebSocket connections are the GraphQL subscriptions, Django only handles HTTP
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+
+    return await django_application(scope, receive, send)
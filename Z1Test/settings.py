@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'graphene_django',
     'graphql_jwt.refresh_token.apps.RefreshTokenConfig',
     'api',
@@ -93,6 +94,21 @@ DATABASES = {
     'default': env.db('DATABASE_URL', default='postgres:///Z1')
 }
 
+# Read replicas of the default database, e.g. DATABASE_REPLICA_URLS=postgres://replica1/Z1,postgres://replica2/Z1.
+# The tests read from the default database instead
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), 1):
+    DATABASES[f'replica{index}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# GraphQL queries read from a random replica, mutations and everything else use the default database.
+# After a mutation, the user reads from the default database for STICKY_SECONDS (see its writes while the replicas
+# catch up), like every query whose cached responses were invalidated in the last STICKY_SECONDS
+REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 5,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -144,6 +160,10 @@ GRAPHENE = {
     'SCHEMA': 'api.schema.schema',
     'MIDDLEWARE': [
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
+        'api.optimizer.OptimizerMiddleware',
+        'api.instrumentation.SQLInstrumentationMiddleware',
+        # The last one wraps the others
+        'api.tracing.TracingMiddleware',
     ],
 }
 
@@ -155,4 +175,136 @@ AUTHENTICATION_BACKENDS = [
 GRAPHQL_JWT = {
     "JWT_VERIFY_EXPIRATION": True,
     "JWT_LONG_RUNNING_REFRESH_TOKEN": True,
+    # Loads the timeline flag of the profile along with the user
+    "JWT_GET_USER_BY_NATURAL_KEY_HANDLER": "api.auth.get_user_by_natural_key",
+}
+
+# Asynchronous GraphQL view, enabled by asgi.py. The root fields of the operations are resolved
+# concurrently in a pool of MAX_WORKERS threads, which bounds the database connections of the process
+ASYNC_GRAPHQL = env.bool('ASYNC_GRAPHQL', default=False)
+GRAPHQL_EXECUTOR = {
+    'MAX_WORKERS': 20,
+}
+
+# Verified tokens kept in memory with their user, so each request is authenticated without decoding the token
+# or loading the user again. They are forgotten after TIMEOUT seconds, or when the user is updated or deleted
+# (only in the process running the mutation, so TIMEOUT bounds how long other processes can use stale users)
+AUTHENTICATION_CACHE = {
+    'SIZE': 10000,
+    'TIMEOUT': 60,
+}
+
+# Parsed and validated documents kept in memory by the GraphQL view, and
+# how long the queries sent with Automatic Persisted Queries are stored in the cache (in seconds)
+GRAPHQL_DOCUMENTS = {
+    'CACHE_SIZE': 1000,
+    'PERSISTED_QUERIES_TIMEOUT': 24 * 60 * 60,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Responses of the read queries (allIdeas, ideas, followersByUser, followedByUser) cached per user,
+# in seconds. The local memory cache is per process, use a shared cache when running several workers
+RESPONSE_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 5 * 60,
+}
+
+# Keyset pagination of the idea connections (allIdeas, ideas)
+PAGINATION = {
+    'DEFAULT_PAGE_SIZE': 20,
+    'MAX_PAGE_SIZE': 100,
+}
+
+# Maximum number of items of the batch mutations (createIdeas, respondToFollowRequests)
+MUTATIONS = {
+    'MAX_BATCH_SIZE': 100,
+}
+
+# Materialized home timeline (allIdeas). The protected ideas of accounts with more followers than
+# this limit are not copied into the timelines of their followers, which read the feed at query time
+TIMELINE = {
+    'FANOUT_MAX_FOLLOWERS': 10000,
+}
+
+# Broker of the new ideas for the newIdeas subscriptions (WebSocket, only with ASGI). The in-memory one delivers
+# them to the connections of the same process, several processes need a shared broker with the same interface
+SUBSCRIPTIONS = {
+    'BROKER': 'api.subscriptions.InMemoryBroker',
+}
+
+# Follow suggestions (suggestedUsers), the top MAX_SUGGESTIONS of each user are stored. When a user follows
+# or unfollows someone its suggestions are refreshed, and the mutual follows of that user in the suggestions
+# of its followers updated
+SUGGESTIONS = {
+    'MAX_SUGGESTIONS': 50,
+}
+
+# Followee ids of the most recently used SIZE users kept in memory, for the visibility checks of ideas and allIdeas.
+# Updated by the follow mutations of the same process, so TIMEOUT bounds how long other processes use stale follows
+FOLLOW_GRAPH = {
+    'ENABLED': env.bool('FOLLOW_GRAPH', default=False),
+    'SIZE': 10000,
+    'TIMEOUT': 60,
+}
+
+# Static analysis of the operations before executing them. Operations deeper than MAX_DEPTH or whose
+# estimated cost (weights multiplied by the sizes of the lists above each field) exceeds MAX_COST are rejected
+QUERY_COST = {
+    'MAX_DEPTH': 10,
+    'MAX_COST': 5000,
+    'DEFAULT_LIST_SIZE': 100,
+    'FIELD_WEIGHTS': {
+        # Substring search over the whole users table
+        'Query.user': 10,
+    },
+}
+
+# SQL executed by each GraphQL operation (queries, time, duplicates and rows), measured in a sample of them.
+# They are logged by the api.instrumentation logger and added up by operation name in /graphql/metrics/
+SQL_INSTRUMENTATION = {
+    'SAMPLE_RATE': env.float('SQL_SAMPLE_RATE', default=0.1),
+    # Operation names with their own metrics, the names sent by the clients after them are counted as 'other'
+    'MAX_OPERATIONS': 100,
+}
+
+# /graphql/metrics/ is only for staff users (JWT or admin session) unless PUBLIC
+METRICS = {
+    'PUBLIC': env.bool('METRICS_PUBLIC', default=False),
+}
+
+# Spans of a sample of the requests: authentication, execution, serialization and the Query and Mutation fields
+# slower than SLOW_FIELD_MS. Exported in the Zipkin v2 JSON format to FILE (one trace per line), or to a
+# Zipkin compatible collector with EXPORTER 'zipkin' and ZIPKIN_URL (e.g. http://localhost:9411/api/v2/spans)
+TRACING = {
+    'SAMPLE_RATE': env.float('TRACING_SAMPLE_RATE', default=0),
+    'SLOW_FIELD_MS': 50,
+    'EXPORTER': env('TRACING_EXPORTER', default='file'),
+    'FILE': BASE_DIR / 'traces.jsonl',
+    'ZIPKIN_URL': env('TRACING_ZIPKIN_URL', default='http://localhost:9411/api/v2/spans'),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': env('SQL_LOG_LEVEL', default='INFO'),
+        },
+        'api.tracing': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
 }
@@ -14,16 +14,20 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # Third party
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 
 # Local
 from api.schema import schema
+from api.views import AsyncGraphQLView, GraphQLView, metrics_view
 
+# The asynchronous view is used when running with ASGI
+graphql_view = (AsyncGraphQLView if settings.ASYNC_GRAPHQL else GraphQLView).as_view(graphiql=True, schema=schema)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path('graphql/', csrf_exempt(graphql_view)),
+    path('graphql/metrics/', metrics_view),
 ]
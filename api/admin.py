@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import User, FollowRequest, Idea, Profile
+from .models import User, FollowRequest, Idea, Profile, Follow
 
 
 admin.site.register(User)
 admin.site.register(FollowRequest)
 admin.site.register(Idea)
 admin.site.register(Profile)
+admin.site.register(Follow)
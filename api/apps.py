@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Third party
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        # Local
+        from . import auth, follow_graph, signals, suggestions
+        from .instrumentation import install
+        from .models import User
+
+        connection_created.connect(install)
+        post_save.connect(auth.on_user_saved, sender=User)
+        post_delete.connect(auth.on_user_deleted, sender=User)
+        signals.follows_added.connect(follow_graph.on_follows_added)
+        signals.follows_removed.connect(follow_graph.on_follows_removed)
+        signals.user_deleted.connect(follow_graph.on_user_deleted)
+        signals.follows_added.connect(suggestions.on_follows_added)
+        signals.follows_removed.connect(suggestions.on_follows_removed)
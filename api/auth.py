@@ -0,0 +1,110 @@
+import copy
+import time
+
+# Third party
+from django.conf import settings
+from django.db.models import F
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization, get_payload, get_user_by_payload
+
+# Local
+from .models import User, Follow
+from .utils import LRUCache
+
+
+AUTHENTICATION_CACHE_SIZE = 10000
+AUTHENTICATION_CACHE_TIMEOUT = 60
+
+_tokens = None
+
+
+def get_tokens_cache():
+    """ Verified tokens of the process, with the user they belong to """
+    global _tokens
+    if _tokens is None:
+        options = getattr(settings, 'AUTHENTICATION_CACHE', {})
+        _tokens = LRUCache(
+            options.get('SIZE', AUTHENTICATION_CACHE_SIZE),
+            ttl=options.get('TIMEOUT', AUTHENTICATION_CACHE_TIMEOUT)
+        )
+
+    return _tokens
+
+
+def get_user_by_natural_key(username):
+    """
+    JWT_GET_USER_BY_NATURAL_KEY_HANDLER, loads the user of a token along with the timeline flags of its profile,
+    so allIdeas does not need another query to know if the materialized timeline is complete, nor the mutations
+    creating ideas to know if they are fanned out
+    """
+    try:
+        return User.objects.annotate(
+            partial_timeline=F('profile__partial_timeline'), timeline_fanout=F('profile__timeline_fanout')
+        ).get(**{User.USERNAME_FIELD: username})
+    except User.DoesNotExist:
+        return None
+
+
+def get_user_by_token(token, request):
+    """ The user of a token, decoding and verifying it and loading its user only if it is not cached """
+    tokens = get_tokens_cache()
+    user = tokens.get(token)
+    if user is None:
+        payload = get_payload(token, request)
+        user = get_user_by_payload(payload)
+        if user is None:
+            return None
+        # Never cached beyond the expiration of the token
+        tokens.set(token, user, ttl=min(tokens.ttl, payload['exp'] - time.time()) if 'exp' in payload else None)
+
+    # Each request gets its own instance, so nothing cached on it is shared
+    return copy.copy(user)
+
+
+def authenticate_request(request):
+    """
+    Authenticates the request once with its token, before executing the operation.
+    The JWT middleware does not authenticate it again in every resolver because the user is no longer anonymous.
+    """
+    token = get_http_authorization(request)
+    if request.user.is_anonymous and token is not None:
+        try:
+            user = get_user_by_token(token, request)
+        except JSONWebTokenError:
+            # The error is reported by the middleware when executing
+            return request.user
+        if user is not None:
+            request.user = user
+
+    return request.user
+
+
+def invalidate_user(user):
+    """ Forgets the tokens of a user, which must be verified again after it changes """
+    invalidate_users([user.pk])
+
+
+def invalidate_users(user_ids):
+    """ Forgets the tokens of several users with a single pass over the cache """
+    user_ids = set(user_ids)
+    get_tokens_cache().delete_matching(lambda cached_user: cached_user.pk in user_ids)
+
+
+def on_user_saved(sender, instance, created, **kwargs):
+    """
+    A new user can get the same token as a deleted one with its username, if created in the same second.
+    The cached users with its username are forgotten, so the token does not resolve to the deleted one
+    """
+    if created:
+        username = instance.get_username()
+        get_tokens_cache().delete_matching(lambda cached_user: cached_user.get_username() == username)
+
+
+def on_user_deleted(sender, instance, **kwargs):
+    invalidate_users([instance.pk])
+
+
+def invalidate_followers(user):
+    """ Forgets the tokens of the cached users following a user, without loading all its followers """
+    cached = {cached_user.pk for cached_user in get_tokens_cache().values()}
+    invalidate_users(Follow.objects.filter(followee=user, follower__in=cached).values_list('follower', flat=True))
@@ -0,0 +1,87 @@
+import hashlib
+from functools import partial
+
+# Third party
+from django.conf import settings
+from graphql import parse, validate
+from graphql.backend import GraphQLCoreBackend, GraphQLDocument
+from graphql.execution import execute, ExecutionResult
+
+# Local
+from .cost import validate_cost, validate_depth
+from .executors import DatabaseExecutor
+from .utils import LRUCache
+
+
+DOCUMENTS_CACHE_SIZE = 1000
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def invalid_document(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+def execute_within_cost(schema, document_ast, *args, **kwargs):
+    """ Rejects the operation before executing it if its estimated cost is over the budget """
+    errors = validate_cost(schema, document_ast, kwargs.get('variable_values'), kwargs.get('operation_name'))
+    if errors:
+        return invalid_document(errors)
+    executor = kwargs.get('executor')
+    if isinstance(executor, DatabaseExecutor):
+        return executor.execute_document(schema, document_ast, *args, **kwargs)
+
+    return execute(schema, document_ast, *args, **kwargs)
+
+
+class CachedBackend(GraphQLCoreBackend):
+    """
+    Parses and validates each distinct query string only once.
+    The documents are kept in a bounded LRU cache keyed by the sha256 of the query, and once validated
+    they are executed directly. Documents with validation errors are cached too, returning their errors.
+    Operations nested deeper than the allowed depth are validation errors, and the cost of each
+    execution is checked against the budget with its variables before running it.
+    """
+
+    def __init__(self, maxsize=DOCUMENTS_CACHE_SIZE, executor=None):
+        super().__init__(executor=executor)
+        self.documents = LRUCache(maxsize)
+
+    def document_from_string(self, schema, document_string):
+        key = schema, get_query_hash(document_string)
+        document = self.documents.get(key)
+        if document is None:
+            document = self.build_document(schema, document_string)
+            self.documents.set(key, document)
+
+        return document
+
+    def build_document(self, schema, document_string):
+        document_ast = parse(document_string)
+        validation_errors = validate(schema, document_ast) or validate_depth(document_ast)
+        if validation_errors:
+            execute_document = partial(invalid_document, validation_errors)
+        else:
+            execute_document = partial(execute_within_cost, schema, document_ast, **self.execute_params)
+
+        return GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=execute_document
+        )
+
+
+_backend = None
+
+
+def get_backend():
+    """ Backend shared by all the views of the process, so they share the documents cache """
+    global _backend
+    if _backend is None:
+        options = getattr(settings, 'GRAPHQL_DOCUMENTS', {})
+        _backend = CachedBackend(maxsize=options.get('CACHE_SIZE', DOCUMENTS_CACHE_SIZE))
+
+    return _backend
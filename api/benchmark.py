@@ -0,0 +1,390 @@
+import json
+import math
+import random
+import subprocess
+import time
+from uuid import uuid4
+
+# Third party
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token, create_refresh_token
+
+# Local
+from . import metrics, response_cache
+from .models import User, Idea, Follow, FollowRequest
+
+
+SAMPLE_SIZE = 1000
+PERCENTILES = (50, 95, 99)
+
+# Name of every query and mutation of the schema, with its document and the function building its variables
+OPERATIONS = {}
+
+
+def operation(name, document):
+    """
+    Registers the function returning the user sending an operation (None if anonymous) and its variables,
+    or None if the sample has no data for it
+    """
+    def register(build):
+        OPERATIONS[name] = document, build
+        return build
+
+    return register
+
+
+class Sample:
+    """ Random users of the database, and related rows the operations need """
+
+    def __init__(self, rng, password):
+        self.random = rng
+        self.password = password
+        user_ids = list(User.objects.values_list('id', flat=True))
+        users = User.objects.in_bulk(rng.sample(user_ids, min(SAMPLE_SIZE, len(user_ids))))
+        self.users = list(users.values())
+        self.ideas = list(Idea.objects.filter(user__in=users).values_list('id', 'user_id')[:SAMPLE_SIZE])
+        self.pending = list(
+            FollowRequest.objects.filter(to_user__in=users, status='pending')
+            .values_list('to_user_id', 'from_user__username')[:SAMPLE_SIZE]
+        )
+        self.follows = list(
+            Follow.objects.filter(follower__in=users).values_list('follower_id', 'followee__username')[:SAMPLE_SIZE]
+        )
+        self.followers = list(
+            Follow.objects.filter(followee__in=users).values_list('followee_id', 'follower__username')[:SAMPLE_SIZE]
+        )
+        self.words = [word for idea in Idea.objects.values_list('text', flat=True)[:100] for word in idea.split()]
+        self.tokens = {}
+        self.refresh_tokens = {}
+
+    def choice(self, rows):
+        return self.random.choice(rows) if rows else None
+
+    def user(self):
+        return self.choice(self.users)
+
+    def username(self):
+        return self.user().username
+
+    def word(self):
+        return self.choice(self.words) or 'idea'
+
+    def get_token(self, user_id):
+        if user_id not in self.tokens:
+            self.tokens[user_id] = get_token(User.objects.get(pk=user_id))
+        return self.tokens[user_id]
+
+    def get_refresh_token(self, user):
+        if user.pk not in self.refresh_tokens:
+            self.refresh_tokens[user.pk] = str(create_refresh_token(user))
+        return self.refresh_tokens[user.pk]
+
+
+PAGE = '''
+    edges{
+        node{
+            text
+            visibility
+            user{
+                username
+            }
+        }
+    }
+    pageInfo{
+        hasNextPage
+        endCursor
+    }
+'''
+
+
+@operation('users', 'query{ users{ username } }')
+def build_users(sample):
+    return sample.user().pk, {}
+
+
+@operation('user', 'query user($username: String){ user(username: $username){ username email } }')
+def build_user(sample):
+    return sample.user().pk, {'username': sample.username()[:4]}
+
+
+@operation('searchUsers', 'query searchUsers($query: String!){ searchUsers(query: $query, first: 10){ username } }')
+def build_search_users(sample):
+    return sample.user().pk, {'query': sample.username()[:5]}
+
+
+@operation('suggestedUsers', 'query{ suggestedUsers(first: 10){ username } }')
+def build_suggested_users(sample):
+    return sample.user().pk, {}
+
+
+@operation('requests', 'query{ requests(status: "pending"){ status fromUser{ username } toUser{ username } } }')
+def build_requests(sample):
+    return sample.user().pk, {}
+
+
+@operation('ideas', 'query ideas($username: String){ ideas(username: $username, first: 20){%s} }' % PAGE)
+def build_ideas(sample):
+    return sample.user().pk, {'username': sample.username()}
+
+
+@operation('allIdeas', 'query{ allIdeas(first: 20){%s} }' % PAGE)
+def build_all_ideas(sample):
+    return sample.user().pk, {}
+
+
+@operation('searchIdeas', 'query searchIdeas($query: String!){ searchIdeas(query: $query, first: 20){%s} }' % PAGE)
+def build_search_ideas(sample):
+    return sample.user().pk, {'query': sample.word()}
+
+
+@operation('followersByUser', 'query{ followersByUser(first: 20){ edges{ node{ username } } } }')
+def build_followers_by_user(sample):
+    return sample.user().pk, {}
+
+
+@operation('followedByUser', 'query{ followedByUser(first: 20){ edges{ node{ username } } } }')
+def build_followed_by_user(sample):
+    return sample.user().pk, {}
+
+
+@operation(
+    'tokenAuth',
+    'mutation tokenAuth($username: String!, $password: String!){'
+    ' tokenAuth(username: $username, password: $password){ token } }'
+)
+def build_token_auth(sample):
+    return None, {'username': sample.username(), 'password': sample.password}
+
+
+@operation('verifyToken', 'mutation verifyToken($token: String!){ verifyToken(token: $token){ payload } }')
+def build_verify_token(sample):
+    return None, {'token': sample.get_token(sample.user().pk)}
+
+
+@operation('refreshToken', 'mutation refreshToken($token: String!){ refreshToken(refreshToken: $token){ token } }')
+def build_refresh_token(sample):
+    return None, {'token': sample.get_refresh_token(sample.user())}
+
+
+@operation(
+    'createUser',
+    'mutation createUser($username: String!){'
+    ' createUser(userData: {username: $username, email: "benchmark@example.com", password: "benchmark"}){ token } }'
+)
+def build_create_user(sample):
+    return None, {'username': f'benchmark{uuid4().hex[:12]}'}
+
+
+@operation(
+    'updateUser', 'mutation updateUser($email: String!){ updateUser(userData: {email: $email}){ user{ email } } }'
+)
+def build_update_user(sample):
+    user = sample.user()
+    return user.pk, {'email': f'updated.{user.email}'}
+
+
+@operation('deleteUser', 'mutation{ deleteUser{ user{ username } } }')
+def build_delete_user(sample):
+    return sample.user().pk, {}
+
+
+@operation(
+    'createFollowRequest',
+    'mutation createFollowRequest($username: String!){'
+    ' createFollowRequest(followRequestData: {toUser: $username}){ followRequest{ status } } }'
+)
+def build_create_follow_request(sample):
+    return sample.user().pk, {'username': sample.username()}
+
+
+@operation(
+    'updateFollowRequest',
+    'mutation updateFollowRequest($username: String!){'
+    ' updateFollowRequest(followRequestData: {fromUser: $username, status: "accepted"}){ followRequest{ status } } }'
+)
+def build_update_follow_request(sample):
+    request = sample.choice(sample.pending)
+    return request and (request[0], {'username': request[1]})
+
+
+@operation(
+    'respondToFollowRequests',
+    'mutation respondToFollowRequests($decisions: [FollowRequestInput!]!){'
+    ' respondToFollowRequests(decisions: $decisions){ followRequests{ status } } }'
+)
+def build_respond_to_follow_requests(sample):
+    request = sample.choice(sample.pending)
+    if request is None:
+        return None
+    usernames = [username for to_user_id, username in sample.pending if to_user_id == request[0]]
+    return request[0], {'decisions': [
+        {'fromUser': username, 'status': sample.random.choice(['accepted', 'rejected'])} for username in usernames
+    ]}
+
+
+@operation(
+    'createIdea',
+    'mutation createIdea($text: String!){ createIdea(ideaData: {text: $text, visibility: "protected"}){ idea{ id } } }'
+)
+def build_create_idea(sample):
+    return sample.user().pk, {'text': ' '.join(sample.word() for _ in range(8))}
+
+
+@operation('createIdeas', 'mutation createIdeas($ideas: [IdeaInput!]!){ createIdeas(ideas: $ideas){ ideas{ id } } }')
+def build_create_ideas(sample):
+    return sample.user().pk, {'ideas': [
+        {'text': ' '.join(sample.word() for _ in range(8)), 'visibility': visibility}
+        for visibility in ['public', 'protected', 'private'] * 3
+    ]}
+
+
+@operation(
+    'updateIdea',
+    'mutation updateIdea($id: ID!){'
+    ' updateIdea(ideaData: {id: $id, text: "updated", visibility: "public"}){ idea{ id } } }'
+)
+def build_update_idea(sample):
+    idea = sample.choice(sample.ideas)
+    return idea and (idea[1], {'id': idea[0]})
+
+
+@operation('deleteIdea', 'mutation deleteIdea($id: ID!){ deleteIdea(id: $id){ idea{ text } } }')
+def build_delete_idea(sample):
+    idea = sample.choice(sample.ideas)
+    return idea and (idea[1], {'id': idea[0]})
+
+
+@operation(
+    'deleteFollower',
+    'mutation deleteFollower($username: String!){'
+    ' deleteFollower(follower: $username){ follower{ username } followersCount } }'
+)
+def build_delete_follower(sample):
+    follow = sample.choice(sample.followers)
+    return follow and (follow[0], {'username': follow[1]})
+
+
+@operation(
+    'deleteFollowed',
+    'mutation deleteFollowed($username: String!){'
+    ' deleteFollowed(followed: $username){ followed{ username } followedCount } }'
+)
+def build_delete_followed(sample):
+    follow = sample.choice(sample.follows)
+    return follow and (follow[0], {'username': follow[1]})
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of sorted values """
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def send(client, sample, document, user_id, variables):
+    """ Sends the operation, returning its latency in seconds and whether the response has no errors """
+    headers = {} if user_id is None else {'HTTP_AUTHORIZATION': f'JWT {sample.get_token(user_id)}'}
+    body = json.dumps({'query': document, 'variables': variables})
+
+    start = time.perf_counter()
+    response = client.post('/graphql/', body, content_type='application/json', **headers)
+    latency = time.perf_counter() - start
+
+    return latency, response.status_code == 200 and not json.loads(response.content).get('errors')
+
+
+def get_cache_hits():
+    return metrics.get_metrics().get('response_cache.hits', 0)
+
+
+def invalidate_responses(sample):
+    """
+    Makes the responses cached for the users of the sample unreachable, with the versioned invalidation: the cache
+    may be shared with a running server, and also holds the persisted queries and the replica stickiness.
+    Every cached root field depends on a per user scope, so the other users keep their responses
+    """
+    user_ids = [user.pk for user in sample.users]
+    response_cache.invalidate('feed', *user_ids)
+    response_cache.invalidate('follows', *user_ids)
+
+
+def run_operation(client, sample, name, requests, warmup):
+    document, build = OPERATIONS[name]
+    latencies = []
+    errors = 0
+    cache_hits = 0
+    # The responses cached by other operations are not reused, neither are the ones of rolled back mutations
+    invalidate_responses(sample)
+    for index in range(warmup + requests):
+        built = build(sample)
+        if built is None:
+            return None
+        hits = get_cache_hits()
+        # Mutations are rolled back, so every run measures the same data
+        with transaction.atomic():
+            latency, ok = send(client, sample, document, *built)
+            transaction.set_rollback(True)
+        if index >= warmup:
+            latencies.append(latency)
+            errors += not ok
+            cache_hits += get_cache_hits() - hits
+
+    latencies.sort()
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'cache_hits': cache_hits,
+        'throughput': requests / sum(latencies),
+        'mean': sum(latencies) / requests,
+    }
+    result.update({f'p{p}': percentile(latencies, p) for p in PERCENTILES})
+
+    return result
+
+
+def run_benchmark(operations=None, requests=100, warmup=5, password='password', seed=None, cache=False):
+    """
+    Sends every operation `requests` times through the Django test client, each time on behalf of a random user,
+    and measures its latencies (seconds) and throughput (requests per second, one at a time).
+    The operations without data to run them are skipped. `password` is the one of the users, for tokenAuth.
+    The response cache is disabled unless `cache`, and then its hits are reported with each operation.
+    """
+    rng = random.Random(seed)
+    sample = Sample(rng, password)
+    client = Client()
+
+    results = {}
+    skipped = []
+    with override_settings(RESPONSE_CACHE={**getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': cache}):
+        for name in operations or OPERATIONS:
+            result = run_operation(client, sample, name, requests, warmup)
+            if result is None:
+                skipped.append(name)
+            else:
+                results[name] = result
+
+    return {
+        'commit': get_commit(),
+        'date': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'response_cache': cache,
+        'rows': {
+            'users': User.objects.count(),
+            'ideas': Idea.objects.count(),
+            'follows': Follow.objects.count(),
+            'follow_requests': FollowRequest.objects.count(),
+        },
+        'operations': results,
+        'skipped': skipped,
+    }
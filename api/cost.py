@@ -0,0 +1,158 @@
+# Third party
+from django.conf import settings
+from graphene.relay import Connection
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull, get_named_type, is_leaf_type
+
+# Local
+from .pagination import get_page_size
+
+
+DEFAULT_OPTIONS = {
+    'MAX_DEPTH': 10,
+    'MAX_COST': 5000,
+    # Assumed length of the lists without pagination arguments
+    'DEFAULT_LIST_SIZE': 100,
+    # Cost of resolving a field once, by 'Type.field'. Object fields cost 1 and scalars 0 by default
+    'FIELD_WEIGHTS': {},
+}
+
+
+def get_options():
+    return {**DEFAULT_OPTIONS, **getattr(settings, 'QUERY_COST', {})}
+
+
+def get_fragments(document_ast):
+    return {
+        definition.name.value: definition
+        for definition in document_ast.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    }
+
+
+def get_operations(document_ast):
+    return [definition for definition in document_ast.definitions if isinstance(definition, ast.OperationDefinition)]
+
+
+def iter_fields(selection_set, fragments):
+    """ Fields of a selection set with the fragments expanded, introspection fields excluded """
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            if not selection.name.value.startswith('__'):
+                yield selection
+        elif isinstance(selection, ast.FragmentSpread):
+            yield from iter_fields(fragments[selection.name.value].selection_set, fragments)
+        elif isinstance(selection, ast.InlineFragment):
+            yield from iter_fields(selection.selection_set, fragments)
+
+
+def get_depth(selection_set, fragments):
+    return max(
+        (1 + get_depth(field.selection_set, fragments) if field.selection_set else 1
+         for field in iter_fields(selection_set, fragments)),
+        default=0
+    )
+
+
+def get_argument(field, name, variables):
+    for argument in field.arguments:
+        if argument.name.value == name:
+            if isinstance(argument.value, ast.Variable):
+                value = (variables or {}).get(argument.value.name.value)
+            elif isinstance(argument.value, ast.IntValue):
+                value = int(argument.value.value)
+            else:
+                return None
+            # The values that are not valid page sizes are reported by the executor, the default size is assumed
+            if isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+                return value
+    return None
+
+
+def is_connection(graphql_type):
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    return graphene_type is not None and issubclass(graphene_type, Connection)
+
+
+def get_list_size(field, field_def, parent_type, variables, options):
+    """ Number of items a field resolves to, from its pagination arguments """
+    field_type = field_def.type
+    if isinstance(field_type, GraphQLNonNull):
+        field_type = field_type.of_type
+
+    if is_connection(parent_type):
+        # The edges of a connection are counted in the connection field
+        return 1
+    if is_connection(get_named_type(field_type)) or (isinstance(field_type, GraphQLList) and 'first' in field_def.args):
+        return get_page_size(get_argument(field, 'first', variables))
+    if isinstance(field_type, GraphQLList):
+        return options['DEFAULT_LIST_SIZE']
+
+    return 1
+
+
+def get_cost(selection_set, parent_type, fragments, variables, options, multiplier=1):
+    cost = 0
+    for field in iter_fields(selection_set, fragments):
+        field_def = parent_type.fields.get(field.name.value)
+        if field_def is None:
+            continue
+        field_type = get_named_type(field_def.type)
+
+        default_weight = 0 if is_leaf_type(field_type) else 1
+        cost += multiplier * options['FIELD_WEIGHTS'].get(f'{parent_type.name}.{field.name.value}', default_weight)
+        if field.selection_set:
+            size = get_list_size(field, field_def, parent_type, variables, options)
+            cost += get_cost(field.selection_set, field_type, fragments, variables, options, multiplier * size)
+
+    return cost
+
+
+def get_root_type(schema, operation):
+    return {
+        'query': schema.get_query_type,
+        'mutation': schema.get_mutation_type,
+        'subscription': schema.get_subscription_type,
+    }[operation.operation]()
+
+
+def validate_depth(document_ast):
+    """ Errors of the operations nested deeper than the maximum depth, checked once per document """
+    max_depth = get_options()['MAX_DEPTH']
+    fragments = get_fragments(document_ast)
+    errors = []
+    for operation in get_operations(document_ast):
+        depth = get_depth(operation.selection_set, fragments)
+        if depth > max_depth:
+            errors.append(GraphQLError(
+                f'Query depth {depth} exceeds the maximum depth of {max_depth}', [operation]
+            ))
+
+    return errors
+
+
+def validate_cost(schema, document_ast, variables=None, operation_name=None):
+    """
+    Errors of the operation to execute if its estimated cost exceeds the maximum cost.
+    The cost of each field is its weight times the number of times it is resolved,
+    which is multiplied by the page size or the default list size of every list above it.
+    """
+    options = get_options()
+    operations = get_operations(document_ast)
+    if operation_name is not None:
+        operations = [
+            operation for operation in operations if operation.name and operation.name.value == operation_name
+        ]
+    if len(operations) != 1:
+        # Reported by the executor
+        return []
+
+    operation = operations[0]
+    cost = get_cost(
+        operation.selection_set, get_root_type(schema, operation), get_fragments(document_ast), variables, options
+    )
+    if cost > options['MAX_COST']:
+        return [GraphQLError(f'Query cost {cost} exceeds the maximum cost of {options["MAX_COST"]}', [operation])]
+
+    return []
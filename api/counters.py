@@ -0,0 +1,60 @@
+# Third party
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Local
+from .models import User, Profile, Idea, Follow, FollowRequest
+
+
+COUNTERS = ('followers_count', 'followed_count', 'idea_count', 'pending_request_count')
+
+
+def add(users, **deltas):
+    """
+    Adds the deltas to the counters of the users (instances, ids or a queryset of ids)
+    in a single UPDATE, so concurrent mutations don't overwrite each other
+    """
+    deltas = {counter: F(counter) + delta for counter, delta in deltas.items() if delta}
+    if deltas:
+        Profile.objects.filter(user__in=users).update(**deltas)
+
+
+def get(user, counter):
+    """ Current value of a counter of the user in the database, 0 if the user has no profile """
+    return Profile.objects.filter(user=user).values_list(counter, flat=True).first() or 0
+
+
+def count(queryset, field):
+    """ Correlated subquery counting the rows of the queryset whose `field` is the user of the profile """
+    rows = queryset.filter(**{field: OuterRef('user')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(rows.values('count')), 0)
+
+
+def get_counts():
+    """ Expressions calculating the counters of a profile """
+    return {
+        'followers_count': count(Follow.objects.all(), 'followee'),
+        'followed_count': count(Follow.objects.all(), 'follower'),
+        'idea_count': count(Idea.objects.all(), 'user'),
+        'pending_request_count': count(FollowRequest.objects.filter(status='pending'), 'to_user'),
+    }
+
+
+def reconcile(users=None):
+    """
+    Recalculates the counters of the users (all of them by default), creating the missing profiles.
+    Returns the number of profiles whose counters were wrong.
+    """
+    users = User.objects.all() if users is None else users
+    Profile.objects.bulk_create([Profile(user=user) for user in users.filter(profile__isnull=True)])
+
+    profiles = Profile.objects.filter(user__in=users)
+    counts = get_counts()
+    wrong = profiles.annotate(**{f'actual_{counter}': expression for counter, expression in counts.items()}).exclude(
+        **{counter: F(f'actual_{counter}') for counter in COUNTERS}
+    )
+    ids = list(wrong.values_list('id', flat=True))
+    if ids:
+        Profile.objects.filter(id__in=ids).update(**counts)
+
+    return len(ids)
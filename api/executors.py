@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Third party
+from django.conf import settings
+from django.db import close_old_connections
+from graphql.execution import ExecutionResult, execute
+from graphql.execution.executors.sync import SyncExecutor
+from graphql.language import ast
+from promise import Promise
+
+# Local
+from .cost import get_fragments, get_operations
+
+
+MAX_WORKERS = 20
+
+_pool = None
+
+
+def get_pool():
+    """ Threads running the database work of the asynchronous view. Its size bounds the database connections in use """
+    global _pool
+    if _pool is None:
+        options = getattr(settings, 'GRAPHQL_EXECUTOR', {})
+        _pool = ThreadPoolExecutor(options.get('MAX_WORKERS', MAX_WORKERS), thread_name_prefix='graphql-db')
+
+    return _pool
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def run_in_thread(fn, *args, **kwargs):
+    """ Runs fn managing the database connections of the thread like a request does """
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run_in_pool(fn, *args, **kwargs):
+    """ Future of fn run in the database threads, in a copy of the current context """
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(
+        get_pool(), partial(context.run, run_in_thread, fn, *args, **kwargs)
+    )
+
+
+def split_operation(document_ast, operation_name):
+    """
+    Documents of the root fields of a query, one for each response key, or None if it is not split:
+    mutations execute their fields one after another, and fragments at the root may select any field
+    """
+    operations = get_operations(document_ast)
+    if operation_name is not None:
+        operations = [
+            operation for operation in operations if operation.name and operation.name.value == operation_name
+        ]
+    if len(operations) != 1 or operations[0].operation != 'query':
+        return None
+    operation = operations[0]
+    if not all(isinstance(selection, ast.Field) for selection in operation.selection_set.selections):
+        return None
+
+    # The fields with the same response key are merged by the executor, so they are kept together
+    groups = {}
+    for field in operation.selection_set.selections:
+        groups.setdefault((field.alias or field.name).value, []).append(field)
+    if len(groups) < 2:
+        return None
+
+    fragments = list(get_fragments(document_ast).values())
+    return [
+        ast.Document(definitions=[
+            ast.OperationDefinition(
+                operation=operation.operation,
+                name=operation.name,
+                variable_definitions=operation.variable_definitions,
+                directives=operation.directives,
+                selection_set=ast.SelectionSet(selections=fields),
+                loc=operation.loc
+            ),
+            *fragments
+        ])
+        for fields in groups.values()
+    ]
+
+
+def merge_results(results):
+    """ Result of a query from the results of its root fields, in the order of the fields """
+    data = {}
+    errors = []
+    for result in results:
+        if result.invalid:
+            return result
+        errors += result.errors or []
+        data = None if data is None or result.data is None else {**data, **result.data}
+
+    return ExecutionResult(data=data, errors=errors or None)
+
+
+class DatabaseExecutor(SyncExecutor):
+    """
+    Executes the operations of the asynchronous view in the database threads, so every resolver can use the ORM,
+    the nested ones included. The root fields of a query are executed concurrently: each one is executed with its
+    nested fields as an operation of its own in a thread of the pool, and their results are merged.
+    Mutations are executed in a single thread, one field after another.
+    """
+
+    def execute_document(self, schema, document_ast, **kwargs):
+        """ Promise of the ExecutionResult, the backend calls it for the valid documents within the cost budget """
+        kwargs.update(executor=SyncExecutor(), return_promise=False)
+        parts = split_operation(document_ast, kwargs.get('operation_name')) or [document_ast]
+        futures = [run_in_pool(execute, schema, part, **kwargs) for part in parts]
+
+        return Promise.resolve(asyncio.gather(*futures)).then(merge_results)
@@ -0,0 +1,117 @@
+from array import array
+from bisect import bisect_left
+from threading import Lock
+
+# Third party
+from django.conf import settings
+
+# Local
+from .models import Follow
+from .utils import LRUCache
+
+
+FOLLOW_GRAPH_SIZE = 10000
+FOLLOW_GRAPH_TIMEOUT = 60
+
+_graph = None
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+class FollowGraph:
+    """
+    Followee ids of the most recently used users, each one a sorted array of integers, loaded on first use.
+    The arrays are never changed once stored, the follow events replace them, so readers need no lock.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.followed = LRUCache(maxsize, ttl=ttl)
+        self.lock = Lock()
+        # Changes applied, an array loaded while they happen may already be outdated
+        self.changes = 0
+
+    def get_followed(self, user_id):
+        followed = self.followed.get(user_id)
+        if followed is None:
+            changes = self.changes
+            followed = array('q', Follow.objects.filter(follower=user_id).order_by('followee').values_list(
+                'followee', flat=True
+            ))
+            with self.lock:
+                if self.changes == changes:
+                    self.followed.set(user_id, followed)
+
+        return followed
+
+    def follows(self, follower_id, followee_id):
+        return contains(self.get_followed(follower_id), followee_id)
+
+    def add(self, followers, followee_id):
+        """ Adds the followee to the arrays of the followers already loaded """
+        with self.lock:
+            self.changes += 1
+            for follower_id in followers:
+                followed = self.followed.get(follower_id)
+                if followed is not None and not contains(followed, followee_id):
+                    index = bisect_left(followed, followee_id)
+                    self.followed.set(follower_id, followed[:index] + array('q', [followee_id]) + followed[index:])
+
+    def remove(self, followers, followee_id):
+        with self.lock:
+            self.changes += 1
+            for follower_id in followers:
+                followed = self.followed.get(follower_id)
+                if followed is not None and contains(followed, followee_id):
+                    index = bisect_left(followed, followee_id)
+                    self.followed.set(follower_id, followed[:index] + followed[index + 1:])
+
+    def remove_user(self, user_id):
+        """ Forgets a deleted user, the arrays of its followers are loaded again """
+        with self.lock:
+            self.changes += 1
+            self.followed.delete(user_id)
+            self.followed.delete_matching(lambda followed: contains(followed, user_id))
+
+    def clear(self):
+        with self.lock:
+            self.changes += 1
+            self.followed.clear()
+
+
+def get_follow_graph():
+    """ Follow graph index of the process, None if it is disabled (FOLLOW_GRAPH) """
+    global _graph
+    options = getattr(settings, 'FOLLOW_GRAPH', {})
+    if not options.get('ENABLED', False):
+        return None
+    if _graph is None:
+        _graph = FollowGraph(
+            options.get('SIZE', FOLLOW_GRAPH_SIZE),
+            ttl=options.get('TIMEOUT', FOLLOW_GRAPH_TIMEOUT)
+        )
+
+    return _graph
+
+
+def get_followed(user):
+    """ Ids of the users followed by the user from the index, None if it is disabled """
+    graph = get_follow_graph()
+    return graph.get_followed(user.pk) if graph is not None else None
+
+
+def on_follows_added(sender, followers, followee, **kwargs):
+    if _graph is not None:
+        _graph.add(followers, followee)
+
+
+def on_follows_removed(sender, followers, followee, **kwargs):
+    if _graph is not None:
+        _graph.remove(followers, followee)
+
+
+def on_user_deleted(sender, user_id, **kwargs):
+    if _graph is not None:
+        _graph.remove_user(user_id)
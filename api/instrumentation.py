@@ -0,0 +1,154 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from threading import Lock
+
+# Third party
+from django.conf import settings
+
+# Local
+from . import metrics
+
+
+SAMPLE_RATE = 0.1
+# Repeated statements shown in the log of an operation
+MAX_DUPLICATES = 3
+# Operation names with their own metrics, the rest are counted as 'other'
+MAX_OPERATIONS = 100
+OTHER_OPERATIONS = 'other'
+
+logger = logging.getLogger(__name__)
+
+# Recorder of the operation being executed, None when it is not sampled
+_recorder = ContextVar('sql_recorder', default=None)
+
+# Operation names with their own metrics
+_operations = set()
+_operations_lock = Lock()
+
+
+def get_sample_rate():
+    return getattr(settings, 'SQL_INSTRUMENTATION', {}).get('SAMPLE_RATE', SAMPLE_RATE)
+
+
+def get_metric_name(operation):
+    """
+    Name of an operation in the metrics. The names are chosen by the clients, so only the first MAX_OPERATIONS
+    of the process get their own metrics, and the rest share the 'other' ones
+    """
+    max_operations = getattr(settings, 'SQL_INSTRUMENTATION', {}).get('MAX_OPERATIONS', MAX_OPERATIONS)
+    with _operations_lock:
+        if operation not in _operations:
+            if len(_operations) >= max_operations:
+                return OTHER_OPERATIONS
+            _operations.add(operation)
+
+    return operation
+
+
+class Recorder:
+    """
+    SQL executed by a GraphQL operation. The root fields of the asynchronous view may run it from several threads
+    """
+
+    def __init__(self):
+        self.operation = None
+        self.queries = 0
+        self.time = 0.0
+        self.rows = 0
+        self.statements = Counter()
+        self.lock = Lock()
+
+    def add(self, sql, duration, rows):
+        with self.lock:
+            self.queries += 1
+            self.time += duration
+            # Unknown (-1) for the SELECT statements in SQLite
+            self.rows += max(rows, 0)
+            self.statements[sql] += 1
+
+    def get_duplicates(self):
+        """ Statements executed again with the same SQL and maybe other parameters, the trace of an N+1 """
+        return self.queries - len(self.statements)
+
+    def as_dict(self):
+        return {
+            'operation': self.operation,
+            'queries': self.queries,
+            'time_ms': round(self.time * 1000, 3),
+            'duplicates': self.get_duplicates(),
+            'rows': self.rows,
+            'duplicated_statements': [
+                {'sql': sql, 'count': count}
+                for sql, count in self.statements.most_common(MAX_DUPLICATES) if count > 1
+            ],
+        }
+
+
+def record_query(execute, sql, params, many, context):
+    """ Execute wrapper installed on every database connection, it only measures the sampled operations """
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, time.perf_counter() - start, context['cursor'].rowcount)
+
+
+def install(connection, **kwargs):
+    """ connection_created receiver. The wrappers list outlives the connection, so it is only added once """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_recorder(request):
+    """
+    Recorder of the operation of the request, started on the first call if the operation is sampled.
+    It is activated in the current context, so the queries run later by the same thread
+    (or by the database threads the context is copied to) are recorded too.
+    """
+    recorder = getattr(request, 'sql_recorder', None)
+    if recorder is None:
+        recorder = request.sql_recorder = Recorder() if random.random() < get_sample_rate() else False
+    if recorder and _recorder.get() is not recorder:
+        _recorder.set(recorder)
+
+    return recorder
+
+
+def finish(request):
+    """ Reports the SQL of the operation of the request, once it has been executed """
+    recorder = getattr(request, 'sql_recorder', None)
+    request.sql_recorder = None
+    _recorder.set(None)
+    if not recorder:
+        return
+
+    data = recorder.as_dict()
+    logger.info(json.dumps(data), extra={'graphql_sql': data})
+    prefix = f'sql.{get_metric_name(recorder.operation)}'
+    metrics.increment(f'{prefix}.operations')
+    metrics.increment(f'{prefix}.queries', recorder.queries)
+    metrics.increment(f'{prefix}.duplicates', data['duplicates'])
+    metrics.increment(f'{prefix}.rows', recorder.rows)
+    metrics.increment(f'{prefix}.time_ms', data['time_ms'])
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Records the queries count, time, duplicates and rows of a sample of the operations (SQL_INSTRUMENTATION),
+    grouped by operation name. The view reports them once the operation has been executed.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        recorder = get_recorder(info.context)
+        if recorder and recorder.operation is None:
+            recorder.operation = info.operation.name.value if info.operation.name else 'anonymous'
+
+        return next(root, info, **kwargs)
@@ -0,0 +1,49 @@
+import threading
+
+# Third party
+from promise import Promise
+from promise.dataloader import DataLoader
+
+# Local
+from .executors import in_event_loop, run_in_pool
+from .models import User
+
+
+class UserLoader(DataLoader):
+    """ Batches the users requested while resolving an operation in a single `id IN (...)` query """
+
+    def __init__(self, related=(), **kwargs):
+        super().__init__(**kwargs)
+        # Relations selected along with the users
+        self.related = related
+
+    def batch_load_fn(self, keys):
+        if in_event_loop():
+            # Asynchronous view, the query runs in the database threads
+            return Promise.resolve(run_in_pool(self.load_users, keys, self.related))
+        return Promise.resolve(self.load_users(keys, self.related))
+
+    @staticmethod
+    def load_users(keys, related=()):
+        users = User.objects.select_related(*related).in_bulk(keys)
+        return [users.get(key) for key in keys]
+
+
+class Loaders:
+    def __init__(self):
+        self.user = UserLoader()
+        # The profile has the counters of the user
+        self.user_with_profile = UserLoader(related=['profile'])
+
+
+def get_loaders(info):
+    """
+    DataLoaders of the current request, shared by the resolvers of the operation that run in the same thread.
+    The root fields of the asynchronous view run in several threads, and a DataLoader is not thread safe
+    """
+    loaders = vars(info.context).setdefault('loaders', {})
+    thread = threading.get_ident()
+    if thread not in loaders:
+        loaders[thread] = Loaders()
+
+    return loaders[thread]
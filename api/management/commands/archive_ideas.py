@@ -0,0 +1,37 @@
+from datetime import datetime
+
+# Third party
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Local
+from api import partitions, response_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Detach the monthly partitions of the ideas created before a month, so they are no longer read nor '
+        'maintained. They are kept as standalone tables to be archived, unless --drop is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('before', help='First month to keep, as YYYY-MM')
+        parser.add_argument('--drop', action='store_true', help='Drop the partitions instead of keeping them')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql' or not partitions.is_partitioned():
+            raise CommandError('The ideas are not partitioned, run partition_ideas first')
+        try:
+            before = datetime.strptime(options['before'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month "{options["before"]}", use YYYY-MM')
+
+        names = partitions.detach_partitions(before, drop=options['drop'])
+        if names:
+            # The archived ideas may be in any cached response
+            response_cache.invalidate('users')
+
+        action = 'dropped' if options['drop'] else 'detached'
+        self.stdout.write(self.style.SUCCESS(
+            f'Partitions {action}: {", ".join(names)}' if names else 'There are no partitions before that month'
+        ))
@@ -0,0 +1,59 @@
+import json
+
+# Third party
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+# Local
+from api.benchmark import OPERATIONS, PERCENTILES, run_benchmark
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency percentiles and throughput of every query and mutation, saving them as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operations', nargs='*', help='Only run these operations (all of them by default)')
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests of each operation')
+        parser.add_argument('--warmup', type=int, default=5, help='Requests of each operation sent before measuring')
+        parser.add_argument('--password', default='password', help='Password of the users, for tokenAuth')
+        parser.add_argument('--seed', type=int, help='Seed of the random generator, to send the same requests')
+        parser.add_argument('--output', default='benchmark.json', help='JSON file of the results')
+        parser.add_argument(
+            '--response-cache', action='store_true',
+            help='Keep the response cache enabled, reporting its hits with each operation'
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['operations']) - set(OPERATIONS)
+        if unknown:
+            raise CommandError(f'Unknown operations: {", ".join(sorted(unknown))}')
+        if options['requests'] < 1:
+            raise CommandError('At least one request of each operation is needed')
+        if settings.ASYNC_GRAPHQL:
+            # The asynchronous view resolves the fields in other threads, out of the transactions rolled back
+            raise CommandError('The benchmark runs the synchronous view, unset ASYNC_GRAPHQL')
+        if not User.objects.exists():
+            raise CommandError('There are no users, generate them with the generate_data command')
+
+        # Host of the test client
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            results = run_benchmark(
+                options['operations'], options['requests'], options['warmup'], options['password'], options['seed'],
+                options['response_cache']
+            )
+
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2)
+
+        for name, result in results['operations'].items():
+            self.stdout.write('{:<24} {:>8.1f} req/s  {}  errors {}{}'.format(
+                name, result['throughput'],
+                '  '.join(f'p{p} {result[f"p{p}"] * 1000:7.2f} ms' for p in PERCENTILES),
+                result['errors'],
+                f'  cache hits {result["cache_hits"]}' if options['response_cache'] else ''
+            ))
+        for name in results['skipped']:
+            self.stdout.write(f'{name:<24} skipped, no data to run it')
+        self.stdout.write(self.style.SUCCESS(f'Results saved in {options["output"]}'))
@@ -0,0 +1,43 @@
+# Third party
+from django.core.management.base import BaseCommand, CommandError
+
+# Local
+from api.models import User
+from api.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, follows, follow requests and ideas to measure the API at scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users')
+        parser.add_argument('--ideas', type=int, default=10000, help='Number of ideas')
+        parser.add_argument('--follows', type=int, default=20, help='Average number of users followed by a user')
+        parser.add_argument('--alpha', type=float, default=1.0, help='Exponent of the power law of the popularity')
+        parser.add_argument('--pending', type=float, default=0.1, help='Pending requests per follow')
+        parser.add_argument('--rejected', type=float, default=0.05, help='Rejected requests per follow')
+        parser.add_argument('--prefix', default='synthetic', help='Prefix of the usernames')
+        parser.add_argument('--password', default='password', help='Password of every user')
+        parser.add_argument('--seed', type=int, help='Seed of the random generator, to repeat the same data')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['ideas'] < 0:
+            raise CommandError('At least one user is needed, and the number of ideas can not be negative')
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f'There are users starting with "{options["prefix"]}" already, use another --prefix')
+
+        generator = Generator(
+            prefix=options['prefix'],
+            password=options['password'],
+            follows=options['follows'],
+            alpha=options['alpha'],
+            pending=options['pending'],
+            rejected=options['rejected'],
+            seed=options['seed'],
+        )
+        counts = generator.generate(options['users'], options['ideas'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {users} users, {follows} follows, {pending} pending and {rejected} rejected requests '
+            'and {ideas} ideas'.format(**counts)
+        ))
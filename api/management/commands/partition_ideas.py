@@ -0,0 +1,33 @@
+# Third party
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Local
+from api import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Partition the ideas by month of creation (PostgreSQL only). The first time the table is converted, '
+        'which locks it while the ideas are copied. Then it creates the partitions of the next months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='Months ahead to create the partitions for')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The ideas can only be partitioned in PostgreSQL')
+        if options['months'] < 0:
+            raise CommandError('The number of months can not be negative')
+
+        if not partitions.is_partitioned():
+            partitions.convert(options['months'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Ideas partitioned by month, {len(partitions.get_partitions())} partitions created'
+            ))
+        else:
+            created = partitions.create_partitions(options['months'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Partitions created: {", ".join(created)}' if created else 'The partitions already exist'
+            ))
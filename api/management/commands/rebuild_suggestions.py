@@ -0,0 +1,22 @@
+# Third party
+from django.core.management.base import BaseCommand
+
+# Local
+from api.models import User
+from api.suggestions import rebuild_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the follow suggestions (suggestedUsers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Only rebuild the suggestions of these users (all the suggestions by default)'
+        )
+
+    def handle(self, *args, **options):
+        usernames = options['usernames']
+        rebuild_suggestions(User.objects.filter(username__in=usernames) if usernames else None)
+
+        self.stdout.write(self.style.SUCCESS('Suggestions rebuilt'))
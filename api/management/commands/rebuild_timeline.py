@@ -0,0 +1,28 @@
+# Third party
+from django.core.management.base import BaseCommand
+
+# Local
+from api import response_cache
+from api.models import User
+from api.timeline import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the materialized home timelines (allIdeas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Only rebuild the timeline of these users (all the timelines by default)'
+        )
+
+    def handle(self, *args, **options):
+        usernames = options['usernames']
+        users = User.objects.filter(username__in=usernames) if usernames else None
+
+        rebuild_timeline(users)
+        # The cached responses may show the previous timelines
+        response_cache.invalidate('public')
+        response_cache.invalidate('feed', *(users or User.objects.all()).values_list('pk', flat=True))
+
+        self.stdout.write(self.style.SUCCESS('Timelines rebuilt'))
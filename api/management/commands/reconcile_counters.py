@@ -0,0 +1,28 @@
+# Third party
+from django.core.management.base import BaseCommand
+
+# Local
+from api import response_cache
+from api.counters import reconcile
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = 'Recalculate the follower, followed, idea and pending request counters of the users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Only reconcile the counters of these users (all of them by default)'
+        )
+
+    def handle(self, *args, **options):
+        usernames = options['usernames']
+        users = User.objects.filter(username__in=usernames) if usernames else None
+
+        fixed = reconcile(users)
+        if fixed:
+            # The users are shown in every cached response
+            response_cache.invalidate('users')
+
+        self.stdout.write(self.style.SUCCESS(f'Counters reconciled, {fixed} profiles were wrong'))
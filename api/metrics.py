@@ -0,0 +1,22 @@
+from collections import Counter
+from threading import Lock
+
+
+_counters = Counter()
+_lock = Lock()
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def get_metrics():
+    """ Counters of the current process """
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_duplicated_requests(apps, schema_editor):
+    """ Keep only the first request between each pair of users before adding the unique constraint """
+    FollowRequest = apps.get_model('api', 'FollowRequest')
+    first_requests = FollowRequest.objects.values('from_user', 'to_user').annotate(first_id=models.Min('id'))
+    FollowRequest.objects.exclude(id__in=first_requests.values('first_id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_timeline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='followrequest',
+            index=models.Index(fields=['to_user', 'status'], name='request_to_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='idea',
+            index=models.Index(fields=['user', '-created_date', '-id'], name='idea_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='idea',
+            index=models.Index(fields=['user', 'visibility', '-created_date', '-id'], name='idea_user_visibility_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='idea',
+            index=models.Index(fields=['visibility', '-created_date', '-id'], name='idea_visibility_date_idx'),
+        ),
+        migrations.RunPython(delete_duplicated_requests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='followrequest',
+            constraint=models.UniqueConstraint(fields=('from_user', 'to_user'), name='unique_follow_request'),
+        ),
+        # The single column indexes of the foreign keys are covered by the composite ones
+        migrations.AlterField(
+            model_name='followrequest',
+            name='from_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='from_user', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='followrequest',
+            name='to_user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='to_user', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='idea',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='idea', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
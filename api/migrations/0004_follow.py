@@ -0,0 +1,83 @@
+# Generated by Django 3.2.9 on 2026-10-18 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BATCH_SIZE = 1000
+
+
+def copy_profile_follows(apps, schema_editor):
+    """ Each relationship was stored in both Profile.followers and Profile.followed, it becomes one edge """
+    Profile = apps.get_model('api', 'Profile')
+    Follow = apps.get_model('api', 'Follow')
+
+    followers = Profile.followers.through.objects.values_list('user_id', 'profile__user_id')
+    followed = Profile.followed.through.objects.values_list('profile__user_id', 'user_id')
+    for edges in (followers, followed):
+        batch = []
+        for follower, followee in edges.iterator():
+            batch.append(Follow(follower_id=follower, followee_id=followee))
+            if len(batch) == BATCH_SIZE:
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def copy_follows_to_profiles(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    Follow = apps.get_model('api', 'Follow')
+    profiles = dict(Profile.objects.values_list('user_id', 'id'))
+
+    followers = []
+    followed = []
+    for follower, followee in Follow.objects.values_list('follower_id', 'followee_id').iterator():
+        # Each side is stored in the profile of its user, the users without profile (createsuperuser) are skipped
+        if followee in profiles:
+            followers.append(Profile.followers.through(profile_id=profiles[followee], user_id=follower))
+        if follower in profiles:
+            followed.append(Profile.followed.through(profile_id=profiles[follower], user_id=followee))
+    Profile.followers.through.objects.bulk_create(followers, batch_size=BATCH_SIZE)
+    Profile.followed.through.objects.bulk_create(followed, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('followee', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['followee', '-created', '-id'], name='follow_followee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['follower', '-created', '-id'], name='follow_follower_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'followee'), name='unique_follow'),
+        ),
+        migrations.RunPython(copy_profile_follows, copy_follows_to_profiles),
+        migrations.RemoveField(
+            model_name='profile',
+            name='followed',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='followers',
+        ),
+    ]
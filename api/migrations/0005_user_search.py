@@ -0,0 +1,36 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:02
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    Indexes of searchUsers, only in PostgreSQL. They are not declared in User.Meta because
+    Django 3.2 can't declare operator classes on expressions, and other databases can't create them.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Similarity search, username % 'query'
+    schema_editor.execute('CREATE INDEX user_username_trgm_idx ON api_user USING gin (username gin_trgm_ops)')
+    # Prefix search, UPPER(username::text) LIKE UPPER('query%')
+    schema_editor.execute('CREATE INDEX user_username_prefix_idx ON api_user (UPPER(username::text) text_pattern_ops)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS user_username_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS user_username_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_follow'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
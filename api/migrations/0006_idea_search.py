@@ -0,0 +1,37 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_vectors(apps, schema_editor):
+    """
+    Fills the search vector of the existing ideas and indexes it, only in PostgreSQL. The index is not declared
+    in Idea.Meta because other databases can't create GIN indexes.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("UPDATE api_idea SET search_vector = to_tsvector('simple'::regconfig, COALESCE(text, ''))")
+    schema_editor.execute('CREATE INDEX idea_search_vector_idx ON api_idea USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS idea_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idea',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_vectors, drop_search_index),
+    ]
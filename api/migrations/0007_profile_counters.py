@@ -0,0 +1,55 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(queryset, field):
+    rows = queryset.filter(**{field: OuterRef('user')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(rows.values('count')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    Follow = apps.get_model('api', 'Follow')
+    Idea = apps.get_model('api', 'Idea')
+    FollowRequest = apps.get_model('api', 'FollowRequest')
+
+    Profile.objects.update(
+        followers_count=count(Follow.objects.all(), 'followee'),
+        followed_count=count(Follow.objects.all(), 'follower'),
+        idea_count=count(Idea.objects.all(), 'user'),
+        pending_request_count=count(FollowRequest.objects.filter(status='pending'), 'to_user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_idea_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='idea_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='pending_request_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
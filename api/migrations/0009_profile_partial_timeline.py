@@ -0,0 +1,29 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:36
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def fill_partial_timeline(apps, schema_editor):
+    Profile = apps.get_model('api', 'Profile')
+    Follow = apps.get_model('api', 'Follow')
+
+    Profile.objects.update(partial_timeline=Exists(
+        Follow.objects.filter(follower=OuterRef('user'), followee__profile__timeline_fanout=False)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='partial_timeline',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fill_partial_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.9 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+def create_prefix_index(apps, schema_editor):
+    """
+    The text_pattern_ops index only served the LIKE of searchUsers, which then sorted every match.
+    With the "C" collation the index serves both the prefix and its order
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS user_username_prefix_idx')
+    schema_editor.execute('CREATE INDEX user_username_prefix_idx ON api_user ((UPPER(username::text) COLLATE "C"))')
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS user_username_prefix_idx')
+    schema_editor.execute('CREATE INDEX user_username_prefix_idx ON api_user (UPPER(username::text) text_pattern_ops)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_profile_partial_timeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.9 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='idea',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='api.idea'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -9,8 +11,35 @@ class User(AbstractUser):
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    followers = models.ManyToManyField(User, blank=True, related_name='followers')
-    followed = models.ManyToManyField(User, blank=True, related_name='followed')
+    # Disabled when the user has too many followers to copy its protected ideas into their timelines
+    timeline_fanout = models.BooleanField(default=True)
+    # Enabled when the user follows an account without fan-out, so its timeline is built at read time
+    partial_timeline = models.BooleanField(default=False)
+    # Denormalized counters of the user, updated by the mutations and recalculated by reconcile_counters
+    followers_count = models.IntegerField(default=0)
+    followed_count = models.IntegerField(default=0)
+    idea_count = models.IntegerField(default=0)
+    pending_request_count = models.IntegerField(default=0)
+
+
+class Follow(models.Model):
+    """ Edge of the follow graph, the follower follows the followee """
+    # The follower is the leading column of the unique constraint
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following', db_index=False)
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers', db_index=False)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Query.followersByUser and the timeline fan-out to the followers of an user
+            models.Index(fields=['followee', '-created', '-id'], name='follow_followee_date_idx'),
+            # Query.followedByUser
+            models.Index(fields=['follower', '-created', '-id'], name='follow_follower_date_idx'),
+        ]
+        constraints = [
+            # Visibility checks of Query.ideas(username:) and Query.allIdeas
+            models.UniqueConstraint(fields=['follower', 'followee'], name='unique_follow'),
+        ]
 
 
 class FollowRequest(models.Model):
@@ -19,10 +48,39 @@ class FollowRequest(models.Model):
         ('accepted', 'accepted'),
         ('rejected', 'rejected'),
     ]
-    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='from_user')
-    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='to_user')
+    # Both foreign keys are the leading column of a composite index
+    from_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='from_user', db_index=False)
+    to_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='to_user', db_index=False)
     status = models.CharField(max_length=8, choices=STATUS_OPTIONS, default='pending')
 
+    class Meta:
+        indexes = [
+            # Query.requests(status:) and the requests of a user
+            models.Index(fields=['to_user', 'status'], name='request_to_user_status_idx'),
+        ]
+        constraints = [
+            # CreateFollowRequest and UpdateFollowRequest lookups, only one request per pair of users
+            models.UniqueConstraint(fields=['from_user', 'to_user'], name='unique_follow_request'),
+        ]
+
+
+class IdeaQuerySet(models.QuerySet):
+    def visible_to(self, viewer, followed=None):
+        """
+        Ideas the viewer can read: the public ones, its own ones and the protected ones of the users it follows.
+        The follow is checked with an EXISTS subquery per author, so filtering by author, paginating or searching
+        on top of it is still a single query. If the ids of the `followed` users are known they are used instead.
+        """
+        if followed is not None:
+            following = Q(user__in=followed)
+        else:
+            following = Q(Exists(Follow.objects.filter(follower=viewer, followee=OuterRef('user'))))
+        return self.filter(
+            Q(visibility='public')
+            | Q(user=viewer)
+            | following & Q(visibility='protected')
+        )
+
 
 class Idea(models.Model):
     VISIBILITY_OPTIONS = [
@@ -32,5 +90,62 @@ class Idea(models.Model):
     ]
     text = models.TextField(max_length=150)
     visibility = models.CharField(max_length=9, choices=VISIBILITY_OPTIONS, default='public')
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idea')
+    # The foreign key is the leading column of the composite indexes
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idea', db_index=False)
     created_date = models.DateTimeField(default=timezone.now)
+    # to_tsvector of the text for searchIdeas, written by the mutations. GIN index in PostgreSQL only
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = IdeaQuerySet.as_manager()
+
+    class Meta:
+        # Once partitioned (partition_ideas) the primary key of the table is (id, created_date). Django still uses
+        # id alone, which stays unique as it comes from the sequence
+        # The ideas are always read newest first, ordered by (created_date, id) for the keyset pagination
+        indexes = [
+            # Query.ideas() of the request user
+            models.Index(fields=['user', '-created_date', '-id'], name='idea_user_date_idx'),
+            # Query.ideas(username:) and Query.ideas(visibility:), timeline fan-out of the protected ideas
+            models.Index(fields=['user', 'visibility', '-created_date', '-id'], name='idea_user_visibility_date_idx'),
+            # Public ideas of Query.allIdeas and the rebuild of the public timeline
+            models.Index(fields=['visibility', '-created_date', '-id'], name='idea_visibility_date_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline (allIdeas), filled on write.
+    Entries without owner form the shared bucket of public ideas, the rest belong to the timeline
+    of a single user: its own protected and private ideas and the protected ideas of the users it follows.
+    """
+    owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='timeline')
+    # Without a constraint in the database, it can't reference the ideas once partitioned. Django deletes in cascade
+    idea = models.ForeignKey(Idea, on_delete=models.CASCADE, related_name='timeline_entries', db_constraint=False)
+    created_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_date', '-idea'], name='timeline_owner_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'idea'], name='unique_timeline_entry'),
+        ]
+
+
+class Suggestion(models.Model):
+    """
+    User suggested to follow (suggestedUsers): it is followed by `mutual` of the users the owner follows.
+    Only the top SUGGESTIONS['MAX_SUGGESTIONS'] of each user are kept, refreshed when its follows change.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions', db_index=False)
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggested_to')
+    mutual = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # Query.suggestedUsers, the best suggestions of a user first
+            models.Index(fields=['user', '-mutual', 'suggested'], name='suggestion_user_mutual_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_suggestion'),
+        ]
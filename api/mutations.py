@@ -1,11 +1,51 @@
+from functools import partial
+
 # Third party
 import graphene
+from django.conf import settings
+from django.db import transaction
+from graphql import GraphQLError
 from graphql_jwt.decorators import login_required
 from graphql_jwt.shortcuts import get_token
 
 # Local
-from .models import User, FollowRequest, Profile, Idea
+from .models import User, FollowRequest, Profile, Idea, Follow
 from .types import UserType, FollowRequestType, IdeaType
+from . import counters, response_cache, search, signals, subscriptions, suggestions, timeline
+from .auth import invalidate_user, invalidate_users
+from .optimizer import optimize
+
+
+MAX_BATCH_SIZE = 100
+
+
+def check_batch_size(items, argument):
+    """ Rejects the batch mutations with more items than MUTATIONS['MAX_BATCH_SIZE'], before touching the database """
+    max_size = getattr(settings, 'MUTATIONS', {}).get('MAX_BATCH_SIZE', MAX_BATCH_SIZE)
+    if len(items) > max_size:
+        raise GraphQLError(f'Argument "{argument}" must have at most {max_size} items')
+
+
+def reload_user(info, user, *path):
+    """
+    User of a payload field, loaded again along with its profile when the selection reads its counters:
+    the mutations change them with UPDATEs that don't refresh the instances
+    """
+    users = optimize(User.objects.filter(pk=user.pk), info, path=path)
+    return users.first() if users.query.select_related else user
+
+
+def invalidate_on_commit(function, *args):
+    """
+    Invalidates the cached responses once the transaction is committed. Before it, a concurrent read would cache
+    the data being changed again under the new version
+    """
+    transaction.on_commit(partial(function, *args))
+
+
+def send_on_commit(signal, **kwargs):
+    """ Sends a signal about the changes of the current transaction once it is committed, never if rolled back """
+    transaction.on_commit(partial(signal.send, sender=Follow, **kwargs))
 
 
 class UserInput(graphene.InputObjectType):
@@ -73,7 +113,9 @@ class CreateFollowRequest(graphene.Mutation):
                 to_user=to_user,
                 status='pending'
             )
-            follow_request.save()
+            with transaction.atomic():
+                follow_request.save()
+                counters.add([to_user], pending_request_count=1)
             return CreateFollowRequest(follow_request=follow_request)
         else:
             return CreateFollowRequest(follow_request=None)
@@ -93,10 +135,51 @@ class CreateIdea(graphene.Mutation):
             visibility=idea_data.visibility,
             user=info.context.user
         )
-        idea.save()
+        # The idea is never committed without its search vector and timeline entries
+        with transaction.atomic():
+            idea.save()
+            counters.add([idea.user], idea_count=1)
+            search.update_search_vectors([idea])
+            timeline.fan_out_idea(idea)
+            transaction.on_commit(partial(subscriptions.publish_ideas, [idea]))
+            invalidate_on_commit(response_cache.invalidate_idea, idea, idea.visibility)
         return CreateIdea(idea=idea)
 
 
+def bulk_create_ideas(user, ideas):
+    """ Inserts the ideas of a user in a single query, returning them with their primary keys """
+    ideas = Idea.objects.bulk_create(ideas)
+    if ideas and ideas[0].pk is None:
+        # Backends that can't return the inserted rows, the ideas are the last ones of the user in this transaction
+        ideas = list(reversed(Idea.objects.filter(user=user).order_by('-id')[:len(ideas)]))
+
+    return ideas
+
+
+class CreateIdeas(graphene.Mutation):
+    class Arguments:
+        ideas = graphene.List(graphene.NonNull(IdeaInput), required=True)
+
+    ideas = graphene.List(IdeaType)
+
+    @staticmethod
+    @login_required
+    def mutate(root, info, ideas):
+        check_batch_size(ideas, 'ideas')
+        user = info.context.user
+        with transaction.atomic():
+            new_ideas = bulk_create_ideas(user, [
+                Idea(text=idea_data.text, visibility=idea_data.visibility, user=user)
+                for idea_data in ideas
+            ])
+            counters.add([user], idea_count=len(new_ideas))
+            search.update_search_vectors(new_ideas)
+            timeline.fan_out_ideas(user, new_ideas)
+            transaction.on_commit(partial(subscriptions.publish_ideas, new_ideas))
+            invalidate_on_commit(response_cache.invalidate_ideas, user.pk, {idea.visibility for idea in new_ideas})
+        return CreateIdeas(ideas=new_ideas)
+
+
 class UpdateUser(graphene.Mutation):
     class Arguments:
         user_data = UserInput()
@@ -118,8 +201,12 @@ class UpdateUser(graphene.Mutation):
         if password:
             user.set_password(password)
 
-        user.save()
-        return UpdateUser(user=user)
+        with transaction.atomic():
+            user.save()
+            # The username is in its tokens, and shown in every cached response
+            invalidate_on_commit(invalidate_user, user)
+            invalidate_on_commit(response_cache.invalidate, 'users')
+        return UpdateUser(user=reload_user(info, user, 'user'))
 
 
 class UpdateFollowRequest(graphene.Mutation):
@@ -140,20 +227,76 @@ class UpdateFollowRequest(graphene.Mutation):
             # If the request was accepted or rejected, the update is not allowed
             if follow_request.status not in {'accepted', 'rejected'}:
                 follow_request.status = follow_request_data.status
-                # Add the follower and followed to their respective lists if the new status is accepted
-                if follow_request_data.status == 'accepted':
-                    from_user = User.objects.get(username=follow_request.from_user.username)
-                    profile_from_user = Profile.objects.get(user__username=from_user.username)
-                    profile_to_user = Profile.objects.get(user__username=info.context.user.username)
-                    profile_to_user.followers.add(from_user)
-                    profile_from_user.followed.add(info.context.user)
-                follow_request.save()
+                with transaction.atomic():
+                    # Add the follower and followed to their respective lists if the new status is accepted
+                    if follow_request_data.status == 'accepted':
+                        _, created = Follow.objects.get_or_create(
+                            follower=follow_request.from_user, followee=info.context.user
+                        )
+                        if created:
+                            counters.add([info.context.user], followers_count=1)
+                            counters.add([follow_request.from_user], followed_count=1)
+                            send_on_commit(
+                                signals.follows_added,
+                                followers=[follow_request.from_user.pk], followee=info.context.user.pk
+                            )
+                        timeline.follow_added(follow_request.from_user, info.context.user)
+                    if follow_request.status != 'pending':
+                        counters.add([info.context.user], pending_request_count=-1)
+                    follow_request.save()
+                    if follow_request_data.status == 'accepted':
+                        invalidate_on_commit(
+                            response_cache.invalidate_follow, follow_request.from_user, info.context.user
+                        )
                 return UpdateFollowRequest(follow_request=follow_request)
             else:
                 return UpdateFollowRequest(follow_request=follow_request)
         return UpdateFollowRequest(follow_request=None)
 
 
+class RespondToFollowRequests(graphene.Mutation):
+    class Arguments:
+        decisions = graphene.List(graphene.NonNull(FollowRequestInput), required=True)
+
+    follow_requests = graphene.List(FollowRequestType)
+
+    @staticmethod
+    @login_required
+    def mutate(root, info, decisions):
+        check_batch_size(decisions, 'decisions')
+        user = info.context.user
+        statuses = {decision.from_user: decision.status for decision in decisions}
+        with transaction.atomic():
+            follow_requests = list(
+                FollowRequest.objects.filter(to_user=user, from_user__username__in=statuses).select_related('from_user')
+            )
+            # As in UpdateFollowRequest, the accepted or rejected requests are not updated
+            pending = [request for request in follow_requests if request.status not in {'accepted', 'rejected'}]
+            for follow_request in pending:
+                follow_request.status = statuses[follow_request.from_user.username]
+            FollowRequest.objects.bulk_update(pending, ['status'])
+
+            followers = [request.from_user for request in pending if request.status == 'accepted']
+            # Only the new follows are counted
+            following = set(
+                Follow.objects.filter(followee=user, follower__in=followers).values_list('follower_id', flat=True)
+            )
+            followers = [follower for follower in followers if follower.pk not in following]
+            Follow.objects.bulk_create(
+                [Follow(follower=follower, followee=user) for follower in followers],
+                ignore_conflicts=True
+            )
+            counters.add([user], followers_count=len(followers), pending_request_count=-len(
+                [request for request in pending if request.status != 'pending']
+            ))
+            counters.add(followers, followed_count=1)
+            timeline.follows_added(followers, user)
+            send_on_commit(signals.follows_added, followers=[follower.pk for follower in followers], followee=user.pk)
+            if followers:
+                invalidate_on_commit(response_cache.invalidate_follows, followers, user)
+        return RespondToFollowRequests(follow_requests=follow_requests)
+
+
 class UpdateIdea(graphene.Mutation):
     class Arguments:
         idea_data = IdeaInput(required=True)
@@ -167,11 +310,20 @@ class UpdateIdea(graphene.Mutation):
         text = idea_data.get('text')
         visibility = idea_data.get('visibility')
         if idea:
+            previous_visibility = idea.visibility
+            visibility_changed = visibility and visibility != idea.visibility
             if text:
                 idea.text = text
             if visibility:
                 idea.visibility = visibility
-            idea.save()
+            with transaction.atomic():
+                idea.save()
+                if text:
+                    search.update_search_vectors([idea])
+                # The idea is now visible in other timelines
+                if visibility_changed:
+                    timeline.refresh_idea(idea)
+                invalidate_on_commit(response_cache.invalidate_idea, idea, previous_visibility, idea.visibility)
             return UpdateIdea(idea=idea)
         return UpdateIdea(idea=None)
 
@@ -185,7 +337,20 @@ class DeleteUser(graphene.Mutation):
     def mutate(root, info):
         user = User.objects.get(username=info.context.user.username)
         if user:
-            user.delete()
+            with transaction.atomic():
+                # Its primary key is cleared by the delete
+                invalidate_on_commit(invalidate_users, [user.pk])
+                # The counters of the other users lose its follows and pending requests
+                counters.add(Follow.objects.filter(follower=user).values('followee'), followers_count=-1)
+                counters.add(Follow.objects.filter(followee=user).values('follower'), followed_count=-1)
+                counters.add(
+                    FollowRequest.objects.filter(from_user=user, status='pending').values('to_user'),
+                    pending_request_count=-1
+                )
+                suggestions.remove_user(user)
+                send_on_commit(signals.user_deleted, user_id=user.pk)
+                user.delete()
+                invalidate_on_commit(response_cache.invalidate, 'users')
 
         return DeleteUser(user=None)
 
@@ -201,38 +366,56 @@ class DeleteIdea(graphene.Mutation):
     def mutate(root, info, id):
         idea = Idea.objects.get(pk=id, user__username=info.context.user.username)
         if idea:
-            idea.delete()
+            # Its timeline entries are removed in cascade
+            with transaction.atomic():
+                idea.delete()
+                counters.add([info.context.user], idea_count=-1)
+                invalidate_on_commit(response_cache.invalidate_idea, idea, idea.visibility)
 
         return DeleteIdea(idea=idea)
 
 
+def remove_follow(follower, followee):
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if deleted:
+            counters.add([followee], followers_count=-1)
+            counters.add([follower], followed_count=-1)
+            send_on_commit(signals.follows_removed, followers=[follower.pk], followee=followee.pk)
+        timeline.follow_removed(follower, followee)
+        invalidate_on_commit(response_cache.invalidate_follow, follower, followee)
+
+
 class DeleteFollower(graphene.Mutation):
     class Arguments:
         follower = graphene.String()
 
-    followers = graphene.List(UserType)
+    follower = graphene.Field(UserType)
+    followers_count = graphene.Int()
 
     @staticmethod
     def mutate(root, info, follower):
-        profile = Profile.objects.get(user__username=info.context.user.username)
         follower = User.objects.get(username=follower)
-        profile.followers.remove(follower)
-        profile_follower = Profile.objects.get(user__username=follower)
-        profile_follower.followed.remove(info.context.user)
-        return DeleteFollower(followers=profile.followers.all())
+        remove_follow(follower, info.context.user)
+        # The removed follower and the remaining count, not the whole list
+        return DeleteFollower(
+            follower=reload_user(info, follower, 'follower'),
+            followers_count=counters.get(info.context.user, 'followers_count')
+        )
 
 
 class DeleteFollowed(graphene.Mutation):
     class Arguments:
         followed = graphene.String()
 
-    all_followed = graphene.List(UserType)
+    followed = graphene.Field(UserType)
+    followed_count = graphene.Int()
 
     @staticmethod
     def mutate(root, info, followed):
-        profile = Profile.objects.get(user__username=info.context.user.username)
         followed = User.objects.get(username=followed)
-        profile.followed.remove(followed)
-        profile_followed = Profile.objects.get(user__username=followed)
-        profile_followed.followers.remove(info.context.user)
-        return DeleteFollowed(all_followed=profile.followed.all())
+        remove_follow(info.context.user, followed)
+        return DeleteFollowed(
+            followed=reload_user(info, followed, 'followed'),
+            followed_count=counters.get(info.context.user, 'followed_count')
+        )
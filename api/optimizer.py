@@ -0,0 +1,139 @@
+from functools import partial
+
+# Third party
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from django.db.models.query import ModelIterable
+from graphene.relay import Connection
+from graphene.utils.str_converters import to_camel_case
+from graphene.utils.thenables import maybe_thenable
+from graphene_django.types import DjangoObjectType
+from graphql.language import ast
+from graphql.type import get_named_type
+
+
+class QueryPlan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch_related = set()
+
+
+def get_selections(info, field_asts):
+    """ Selected fields by name (aliases and fragments merged) with the field nodes of each one """
+    fields = {}
+    pending = [field.selection_set for field in field_asts if field.selection_set]
+    while pending:
+        for selection in pending.pop().selections:
+            if isinstance(selection, ast.Field):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, ast.FragmentSpread):
+                pending.append(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, ast.InlineFragment):
+                pending.append(selection.selection_set)
+
+    return fields
+
+
+def get_graphql_fields(info, graphene_type):
+    """ GraphQL fields of a graphene type by their name in the schema, with their attribute name """
+    graphql_type = info.schema.get_type(graphene_type._meta.name)
+    fields = {}
+    for attname, field in graphene_type._meta.fields.items():
+        name = getattr(field, 'name', None) or to_camel_case(attname)
+        # Relations to models without a type are not in the schema
+        if name in graphql_type.fields:
+            fields[name] = attname, graphql_type.fields[name]
+
+    return fields
+
+
+def plan_fields(info, graphene_type, model, field_asts, prefix, plan):
+    graphql_fields = get_graphql_fields(info, graphene_type)
+
+    for name, nodes in get_selections(info, field_asts).items():
+        if name not in graphql_fields:
+            continue
+        attname, graphql_field = graphql_fields[name]
+
+        try:
+            model_field = model._meta.get_field(attname)
+        except FieldDoesNotExist:
+            # Fields with custom resolvers, with the model fields they read in the optimizer_hints of the type
+            for hint in getattr(graphene_type, 'optimizer_hints', {}).get(attname, ()):
+                path = f'{prefix}__{hint}' if prefix else hint
+                plan.only.add(path)
+                if '__' in hint:
+                    plan.select_related.add(path.rpartition('__')[0])
+            continue
+        path = f'{prefix}__{attname}' if prefix else attname
+
+        if model_field.many_to_many or model_field.one_to_many:
+            plan.prefetch_related.add(path)
+        elif model_field.is_relation:
+            related_type = get_named_type(graphql_field.type).graphene_type
+            if model_field.concrete:
+                plan.only.add(path)
+            if issubclass(related_type, DjangoObjectType):
+                plan.select_related.add(path)
+                plan_fields(info, related_type, model_field.related_model, nodes, path, plan)
+        else:
+            plan.only.add(path)
+
+
+def optimize(queryset, info, related=None, only=(), path=()):
+    """
+    Restrict the queryset to the selection set of the current field: only() the selected columns,
+    select_related() the foreign keys traversed by the client and prefetch_related() the reverse relations.
+    For connections the node selection (edges { node { ... } }) is used. If `related` is given the rows
+    are edges and the nodes are found through that foreign key. `only` adds fields needed by the resolver.
+    `path` are the fields of the returned type leading to the rows, like the objects of a mutation payload.
+    """
+    if queryset.query.is_sliced or queryset._result_cache is not None or queryset._iterable_class != ModelIterable:
+        return queryset
+
+    graphene_type = get_named_type(info.return_type).graphene_type
+    field_asts = info.field_asts
+    for name in path:
+        graphql_field = info.schema.get_type(graphene_type._meta.name).fields[name]
+        field_asts = get_selections(info, field_asts).get(name, [])
+        graphene_type = get_named_type(graphql_field.type).graphene_type
+    if issubclass(graphene_type, Connection):
+        field_asts = get_selections(info, field_asts).get('edges', [])
+        field_asts = get_selections(info, field_asts).get('node', [])
+        graphene_type = graphene_type._meta.node
+    if not issubclass(graphene_type, DjangoObjectType):
+        return queryset
+
+    plan = QueryPlan()
+    plan.only.update(only)
+    model = queryset.model
+    if related:
+        model = model._meta.get_field(related).related_model
+        plan.only.update([related, f'{related}__{model._meta.pk.name}'])
+        plan.select_related.add(related)
+    if not issubclass(model, graphene_type._meta.model):
+        return queryset
+    plan_fields(info, graphene_type, model, field_asts, related, plan)
+
+    if plan.select_related:
+        queryset = queryset.select_related(*plan.select_related)
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*plan.prefetch_related)
+    # The primary key is always loaded
+    return queryset.only(*plan.only or ['pk'])
+
+
+class OptimizerMiddleware:
+    """ Optimizes every queryset returned by a resolver according to the selection set of its field """
+
+    def resolve(self, next, root, info, **kwargs):
+        # The resolved value may be wrapped in a promise by the executor
+        return maybe_thenable(next(root, info, **kwargs), partial(self.on_resolve, info))
+
+    @staticmethod
+    def on_resolve(info, result):
+        if isinstance(result, QuerySet):
+            return optimize(result, info)
+
+        return result
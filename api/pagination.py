@@ -0,0 +1,97 @@
+import base64
+import binascii
+import heapq
+from datetime import datetime
+from itertools import islice
+
+# Third party
+from django.conf import settings
+from django.db.models import Q
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+from graphql.type import get_named_type
+
+# Local
+from .optimizer import optimize
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(first=None):
+    """ Number of items to return for the `first` argument, bounded by the configured maximum """
+    options = getattr(settings, 'PAGINATION', {})
+    default_size = options.get('DEFAULT_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    max_size = options.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+
+    if first is None:
+        return default_size
+    if first < 0:
+        raise GraphQLError('Argument "first" must be a non-negative integer')
+
+    return min(first, max_size)
+
+
+def encode_cursor(date, pk):
+    value = f'{date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise GraphQLError(f'Invalid cursor "{cursor}"')
+
+
+def paginate(queryset, info, first=None, after=None, date_field='created_date', id_field='id', node_field=None):
+    """
+    Keyset pagination over (date_field, id_field), newest first, returning the connection type of the field.
+    The cursor stores the values of the last row returned, so the next page is a range scan
+    starting right after it instead of an OFFSET, and every page costs the same as the first one.
+    If node_field is given, the rows are edges of another model and the node is taken from that relation.
+    A list of disjoint querysets is read as one range scan each, limited to the page, and merged.
+    """
+    page_size = get_page_size(first)
+    connection_type = get_named_type(info.return_type).graphene_type
+
+    def get_rows(queryset):
+        queryset = optimize(queryset, info, related=node_field, only=(date_field, id_field))
+        queryset = queryset.order_by(f'-{date_field}', f'-{id_field}')
+        if after is not None:
+            date, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lt': date})
+                | Q(**{date_field: date, f'{id_field}__lt': pk})
+            )
+        # One extra row tells if there is a next page without a COUNT query
+        return list(queryset[:page_size + 1])
+
+    if isinstance(queryset, (list, tuple)):
+        rows = heapq.merge(
+            *(get_rows(part) for part in queryset),
+            key=lambda row: (getattr(row, date_field), getattr(row, id_field)), reverse=True
+        )
+        rows = list(islice(rows, page_size + 1))
+    else:
+        rows = get_rows(queryset)
+    has_next_page = len(rows) > page_size
+    rows = rows[:page_size]
+
+    edges = [
+        connection_type.Edge(
+            node=getattr(row, node_field) if node_field else row,
+            cursor=encode_cursor(getattr(row, date_field), getattr(row, id_field))
+        )
+        for row in rows
+    ]
+    page_info = PageInfo(
+        has_next_page=has_next_page,
+        has_previous_page=after is not None,
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+    )
+
+    return connection_type(edges=edges, page_info=page_info)
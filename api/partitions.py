@@ -0,0 +1,203 @@
+from datetime import date, datetime, timezone
+
+# Third party
+from django.db import connection
+
+# Local
+from .counters import reconcile
+from .models import User, Idea, TimelineEntry
+
+
+TABLE = Idea._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEARCH_INDEX = 'idea_search_vector_idx'
+USER_CONSTRAINT = 'idea_user_fk'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month):
+    return f'{TABLE}_y{month.year}m{month.month:02d}'
+
+
+def get_partition_month(name):
+    """ First day of the month of a partition from its name, None for the default partition """
+    try:
+        return datetime.strptime(name[len(TABLE):], '_y%Ym%m').date()
+    except ValueError:
+        return None
+
+
+def get_bound(month):
+    """ Start of the month in UTC, the bounds don't depend on the time zone of the session """
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_partitions():
+    """ Months of the partitions of the table, oldest first """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [TABLE]
+        )
+        months = [get_partition_month(name) for name, in cursor.fetchall()]
+    return sorted(month for month in months if month is not None)
+
+
+def create_partition(schema_editor, month):
+    """
+    Partition of the ideas created during the month. Returns whether it was created.
+    The ideas of the month already in the default partition are moved to it, as they can't stay in the default one.
+    """
+    quote = schema_editor.quote_name
+    name = get_partition_name(month)
+    bounds = [get_bound(month), get_bound(add_months(month, 1))]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [name])
+        if cursor.fetchone():
+            return False
+        cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [DEFAULT_PARTITION])
+        moved = cursor.fetchone() is not None
+        if moved:
+            cursor.execute(
+                f'SELECT 1 FROM {quote(DEFAULT_PARTITION)} WHERE created_date >= %s AND created_date < %s LIMIT 1',
+                bounds
+            )
+            moved = cursor.fetchone() is not None
+
+    if not moved:
+        schema_editor.execute(
+            f'CREATE TABLE {quote(name)} PARTITION OF {quote(TABLE)} FOR VALUES FROM (%s) TO (%s)', bounds
+        )
+        return True
+
+    # Filled as a standalone table and then attached, which creates its indexes and checks the default partition
+    schema_editor.execute(f'CREATE TABLE {quote(name)} (LIKE {quote(TABLE)})')
+    schema_editor.execute(
+        f'WITH moved AS (DELETE FROM {quote(DEFAULT_PARTITION)} WHERE created_date >= %s AND created_date < %s '
+        f'RETURNING *) INSERT INTO {quote(name)} SELECT * FROM moved',
+        bounds
+    )
+    schema_editor.execute(
+        f'ALTER TABLE {quote(TABLE)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)', bounds
+    )
+    return True
+
+
+def create_partitions(months_ahead):
+    """ Partitions from the current month to `months_ahead` months later. Returns the names of the new ones """
+    current = month_start(datetime.now(timezone.utc))
+    created = []
+    with connection.schema_editor() as schema_editor:
+        for count in range(months_ahead + 1):
+            month = add_months(current, count)
+            if create_partition(schema_editor, month):
+                created.append(get_partition_name(month))
+
+    return created
+
+
+def convert(months_ahead):
+    """
+    Turns the table of the ideas into a table partitioned by month of created_date, moving the existing rows.
+    The primary key of a partitioned table must include the partition key, so it becomes (id, created_date),
+    and any foreign key of other tables to the ideas is dropped: the model of the timeline entries has none,
+    and Django already deletes in cascade.
+    The table is locked while the rows are copied, it must be run in a maintenance window.
+    """
+    quote = connection.ops.quote_name
+    with connection.schema_editor() as schema_editor:
+        schema_editor.execute(f'LOCK TABLE {quote(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT conrelid::regclass::text, conname FROM pg_constraint '
+                "WHERE confrelid = %s::regclass AND contype = 'f'",
+                [TABLE]
+            )
+            references = cursor.fetchall()
+            cursor.execute(f'SELECT MIN(created_date) FROM {quote(TABLE)}')
+            oldest, = cursor.fetchone()
+            cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+            sequence, = cursor.fetchone()
+        for table, name in references:
+            schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {quote(name)}')
+
+        old_table = f'{TABLE}_unpartitioned'
+        schema_editor.execute(f'ALTER TABLE {quote(TABLE)} RENAME TO {quote(old_table)}')
+        schema_editor.execute(
+            f'CREATE TABLE {quote(TABLE)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE (created_date)'
+        )
+        if sequence:
+            schema_editor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote(TABLE)}.id')
+
+        # A partition for every month since the oldest idea, and the default one for any other date
+        month = month_start(oldest or datetime.now(timezone.utc))
+        last = add_months(month_start(datetime.now(timezone.utc)), months_ahead)
+        while month <= last:
+            create_partition(schema_editor, month)
+            month = add_months(month, 1)
+        schema_editor.execute(f'CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT')
+
+        schema_editor.execute(f'INSERT INTO {quote(TABLE)} SELECT * FROM {quote(old_table)}')
+        schema_editor.execute(f'DROP TABLE {quote(old_table)}')
+
+        # Created on the partitioned table once the names are free, so every partition gets its own
+        schema_editor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, created_date)')
+        for index in Idea._meta.indexes:
+            schema_editor.add_index(Idea, index)
+        schema_editor.execute(f'CREATE INDEX {quote(SEARCH_INDEX)} ON {quote(TABLE)} USING gin (search_vector)')
+        user = Idea._meta.get_field('user')
+        schema_editor.execute(
+            f'ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(USER_CONSTRAINT)} FOREIGN KEY ({quote(user.column)}) '
+            f'REFERENCES {quote(User._meta.db_table)} ({quote(user.target_field.column)}) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def detach_partitions(before, drop=False):
+    """
+    Detaches the partitions of the months before `before`: their ideas are no longer read by the API, but they are
+    kept as standalone tables to be archived, without the foreign key to their authors, unless `drop`.
+    Their timeline entries are deleted and the counters of their authors recalculated.
+    Returns the names of the partitions.
+    """
+    quote = connection.ops.quote_name
+    months = [month for month in get_partitions() if add_months(month, 1) <= month_start(before)]
+    names = [get_partition_name(month) for month in months]
+    if not names:
+        return names
+
+    with connection.schema_editor() as schema_editor:
+        with connection.cursor() as cursor:
+            cursor.execute(' UNION '.join(f'SELECT user_id FROM {quote(name)}' for name in names))
+            authors = [user_id for user_id, in cursor.fetchall()]
+        TimelineEntry.objects.filter(
+            created_date__gte=get_bound(months[0]), created_date__lt=get_bound(add_months(months[-1], 1))
+        ).delete()
+        for name in names:
+            schema_editor.execute(f'ALTER TABLE {quote(TABLE)} DETACH PARTITION {quote(name)}')
+            if drop:
+                schema_editor.execute(f'DROP TABLE {quote(name)}')
+            else:
+                # The detached table keeps its copy of the foreign key, which would prevent deleting its authors
+                schema_editor.execute(f'ALTER TABLE {quote(name)} DROP CONSTRAINT IF EXISTS {quote(USER_CONSTRAINT)}')
+        reconcile(User.objects.filter(pk__in=authors))
+
+    return names
@@ -0,0 +1,173 @@
+import json
+import time
+from uuid import uuid4
+
+# Third party
+from django.conf import settings
+from django.core.cache import caches
+from graphql.language.printer import print_ast
+
+# Local
+from . import metrics
+from .backend import get_query_hash
+from .cost import get_fragments, get_operations, iter_fields
+from .models import Follow
+
+
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+
+# Data each cacheable root field depends on. 'feed' and 'follows' are versioned per user,
+# 'public' (public ideas) and 'users' (usernames shown in every response) for everybody
+CACHED_FIELDS = {
+    'allIdeas': ('feed', 'public', 'users'),
+    'ideas': ('feed', 'public', 'users'),
+    'searchIdeas': ('feed', 'public', 'users'),
+    'followersByUser': ('follows', 'users'),
+    'followedByUser': ('follows', 'users'),
+}
+USER_SCOPES = {'feed', 'follows'}
+# Counters of the users, changed by almost every mutation. The responses selecting them are not cached
+UNCACHED_FIELDS = {'followersCount', 'followedCount', 'ideaCount', 'pendingRequestCount'}
+
+
+def get_options():
+    return getattr(settings, 'RESPONSE_CACHE', {})
+
+
+def is_enabled():
+    return get_options().get('ENABLED', True)
+
+
+def get_cache():
+    return caches[get_options().get('CACHE_ALIAS', 'default')]
+
+
+def get_version_key(scope, user_id=None):
+    if scope in USER_SCOPES:
+        return f'graphql:version:{scope}:{user_id}'
+    return f'graphql:version:{scope}'
+
+
+def new_version():
+    """ Unique version of a scope, starting with the time it was invalidated """
+    return f'{time.time():.6f}:{uuid4().hex}'
+
+
+def get_invalidated_at(versions):
+    """ Time of the latest invalidation of the versions, 0 for the ones created before it was stored """
+    return max(float(version.split(':', 1)[0]) if ':' in version else 0 for version in versions)
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A version lost from the cache is replaced by a new one, so nothing cached before is reused
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+
+    return [versions[key] for key in keys]
+
+
+def invalidate(scope, *user_ids):
+    """ Changes the version of the scope, for the given users if it is a per user scope """
+    if scope in USER_SCOPES:
+        keys = [get_version_key(scope, user_id) for user_id in user_ids]
+    else:
+        keys = [get_version_key(scope)]
+    get_cache().set_many({key: new_version() for key in keys}, None)
+
+
+def invalidate_idea(idea, *visibilities):
+    """ Invalidates the responses showing an idea with any of the visibilities it had """
+    invalidate_ideas(idea.user_id, visibilities)
+
+
+def invalidate_ideas(user_id, visibilities):
+    """ Invalidates the responses showing ideas of a user with any of the visibilities """
+    if 'public' in visibilities:
+        invalidate('public')
+    user_ids = [user_id]
+    if 'protected' in visibilities:
+        user_ids.extend(Follow.objects.filter(followee_id=user_id).values_list('follower_id', flat=True))
+    invalidate('feed', *user_ids)
+
+
+def invalidate_follow(follower, followee):
+    invalidate_follows([follower], followee)
+
+
+def invalidate_follows(followers, followee):
+    invalidate('follows', followee.pk, *[follower.pk for follower in followers])
+    invalidate('feed', *[follower.pk for follower in followers])
+
+
+def get_normalized_hash(document):
+    """ Hash of the document printed back, which does not depend on its formatting. Kept in the cached document """
+    normalized_hash = getattr(document, 'normalized_hash', None)
+    if normalized_hash is None:
+        normalized_hash = document.normalized_hash = get_query_hash(print_ast(document.document_ast))
+
+    return normalized_hash
+
+
+def selects_any(selection_set, fragments, names):
+    """ If any of the fields at any depth of the selection set is one of the names """
+    for field in iter_fields(selection_set, fragments):
+        if field.name.value in names:
+            return True
+        if field.selection_set and selects_any(field.selection_set, fragments, names):
+            return True
+
+    return False
+
+
+def get_scopes(document, operation_name):
+    """ Scopes the operation depends on, None if it is not cacheable """
+    operations = get_operations(document.document_ast)
+    if operation_name is not None:
+        operations = [
+            operation for operation in operations if operation.name and operation.name.value == operation_name
+        ]
+    if len(operations) != 1 or operations[0].operation != 'query':
+        return None
+
+    fragments = get_fragments(document.document_ast)
+    if selects_any(operations[0].selection_set, fragments, UNCACHED_FIELDS):
+        return None
+
+    scopes = set()
+    for field in iter_fields(operations[0].selection_set, fragments):
+        if field.name.value not in CACHED_FIELDS:
+            return None
+        scopes.update(CACHED_FIELDS[field.name.value])
+
+    return sorted(scopes) or None
+
+
+def get_response_key(document, user, variables, operation_name):
+    """
+    Key of the response of an operation for a user, and the time its data was last invalidated,
+    or (None, None) if it is not cacheable.
+    It contains the versions of the data the operation depends on, so any change makes the previous key unreachable.
+    """
+    if not is_enabled() or not user.is_authenticated:
+        return None, None
+    scopes = get_scopes(document, operation_name)
+    if scopes is None:
+        return None, None
+
+    versions = get_versions([get_version_key(scope, user.pk) for scope in scopes])
+    key = json.dumps([get_normalized_hash(document), operation_name, variables, versions], sort_keys=True, default=str)
+    return f'graphql:response:{user.pk}:{get_query_hash(key)}', get_invalidated_at(versions)
+
+
+def get_response(key):
+    data = get_cache().get(key)
+    metrics.increment('response_cache.misses' if data is None else 'response_cache.hits')
+    return data
+
+
+def set_response(key, data):
+    get_cache().set(key, data, get_options().get('TIMEOUT', RESPONSE_CACHE_TIMEOUT))
@@ -0,0 +1,82 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Third party
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+
+STICKY_SECONDS = 5
+
+# Database the reads of the current operation go to, the primary unless a GraphQL query sets a replica
+_read_database = ContextVar('read_database', default=DEFAULT_DB_ALIAS)
+
+
+def get_options():
+    return getattr(settings, 'REPLICAS', {})
+
+
+def get_replicas():
+    return get_options().get('ALIASES', [])
+
+
+def get_sticky_seconds():
+    return get_options().get('STICKY_SECONDS', STICKY_SECONDS)
+
+
+def get_sticky_key(user):
+    return f'graphql:primary:{user.pk}'
+
+
+def stick_to_primary(user):
+    """ The user reads from the primary for a while, until the replicas have its writes """
+    if user.is_authenticated:
+        cache.set(get_sticky_key(user), True, get_sticky_seconds())
+
+
+def get_read_database(user, operation_type, invalidated_at=None):
+    """
+    Database of an operation. Queries read from a random replica, except if the user has sent a mutation
+    or the data they depend on (invalidated_at, from the response cache) has changed in the last STICKY_SECONDS.
+    """
+    replicas = get_replicas()
+    if operation_type != 'query' or not replicas:
+        return DEFAULT_DB_ALIAS
+    if invalidated_at is not None and time.time() - invalidated_at < get_sticky_seconds():
+        return DEFAULT_DB_ALIAS
+    if user.is_authenticated and cache.get(get_sticky_key(user)):
+        return DEFAULT_DB_ALIAS
+
+    return random.choice(replicas)
+
+
+@contextmanager
+def reading_from(database):
+    """ Sends the reads of the current context (copied to the database threads) to the database """
+    token = _read_database.set(database)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the GraphQL queries to the replicas (REPLICAS) and everything else to the primary.
+    The replicas are copies of the primary, so they are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in get_replicas() else None
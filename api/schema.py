@@ -1,27 +1,46 @@
 # Third party
 import graphene
 import graphql_jwt
+from rx import Observable
 from graphql_jwt.decorators import login_required
-from django.db.models import Q
 
 # Local
-from .models import User, FollowRequest, Idea, Profile
-from .types import UserType, FollowRequestType, IdeaType
+from .models import User, FollowRequest, Idea, Follow
+from .types import UserType, FollowRequestType, IdeaType, IdeaConnection, UserConnection
+from .pagination import get_page_size, paginate
+from .follow_graph import get_follow_graph, get_followed
+from .optimizer import optimize
+from . import search, suggestions
+from .timeline import home_timeline
 from .mutations import CreateUser, UpdateUser, DeleteUser, CreateFollowRequest, UpdateFollowRequest, CreateIdea, \
-    UpdateIdea, DeleteIdea, DeleteFollower, DeleteFollowed
+    UpdateIdea, DeleteIdea, DeleteFollower, DeleteFollowed, CreateIdeas, RespondToFollowRequests
 
 
 class Query(graphene.ObjectType):
     users = graphene.List(UserType)
     user = graphene.List(UserType, username=graphene.String())
+    search_users = graphene.List(UserType, query=graphene.String(required=True), first=graphene.Int())
+    suggested_users = graphene.List(UserType, first=graphene.Int())
 
     requests = graphene.List(FollowRequestType, status=graphene.String())
 
-    ideas = graphene.List(IdeaType, username=graphene.String(), visibility=graphene.String())
-    all_ideas = graphene.List(IdeaType)
-
-    followers_by_user = graphene.List(UserType)
-    followed_by_user = graphene.List(UserType)
+    ideas = graphene.Field(
+        IdeaConnection,
+        username=graphene.String(),
+        visibility=graphene.String(),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
+    all_ideas = graphene.Field(IdeaConnection, first=graphene.Int(), after=graphene.String())
+    search_ideas = graphene.Field(
+        IdeaConnection,
+        query=graphene.String(required=True),
+        first=graphene.Int(),
+        after=graphene.String()
+    )
+
+    followers_by_user = graphene.Field(UserConnection, first=graphene.Int(), after=graphene.String())
+    followed_by_user = graphene.Field(UserConnection, first=graphene.Int(), after=graphene.String())
 
     @login_required
     def resolve_users(self, info):
@@ -40,15 +59,26 @@ class Query(graphene.ObjectType):
 
         return result
 
+    @login_required
+    def resolve_search_users(self, info, query, first=None):
+        # With the columns and the profile the selection needs
+        return search.search_users(query, first, optimize(User.objects.all(), info))
+
+    @login_required
+    def resolve_suggested_users(self, info, first=None):
+        # Precomputed, a range scan over suggestion_user_mutual_idx
+        users = optimize(suggestions.suggested_users(info.context.user), info)
+        return list(users[:get_page_size(first)])
+
     @login_required
     def resolve_requests(self, info, **kwargs):
         status = kwargs.get('status')
-        to_user = info.context.user.username
+        to_user = info.context.user
 
         if status is not None:
-            result = FollowRequest.objects.filter(status=status, to_user__username=to_user)
+            result = FollowRequest.objects.filter(status=status, to_user=to_user)
         else:
-            result = FollowRequest.objects.filter(to_user__username=to_user)
+            result = FollowRequest.objects.filter(to_user=to_user)
 
         return result
 
@@ -56,62 +86,64 @@ class Query(graphene.ObjectType):
     def resolve_ideas(self, info, **kwargs):
         username = kwargs.get('username')
         visibility = kwargs.get('visibility')
-        request_username = info.context.user.username
-
         if username is not None:
-            is_follower = Profile.objects.filter(user__username=request_username, followed__username=username)
-            if is_follower:
-                result = Idea.objects.filter(
-                    user__username=username,
-                    visibility__in=['public', 'protected']
-                ).order_by('-created_date')
+            graph = get_follow_graph()
+            if graph is None:
+                # The follow of the author is checked in the same query
+                result = Idea.objects.visible_to(info.context.user).filter(user__username=username)
             else:
-                result = Idea.objects.filter(user__username=username, visibility='public').order_by('-created_date')
+                # The follow of the author is checked in memory, and its ideas read by visibility
+                author = User.objects.filter(username=username).only('pk').first()
+                if author is None:
+                    visibilities = []
+                elif author.pk == info.context.user.pk:
+                    visibilities = ['public', 'protected', 'private']
+                elif graph.follows(info.context.user.pk, author.pk):
+                    visibilities = ['public', 'protected']
+                else:
+                    visibilities = ['public']
+                result = Idea.objects.filter(user=author, visibility__in=visibilities)
         elif visibility is not None:
-            result = Idea.objects.filter(
-                user__username=request_username,
-                visibility=visibility
-            ).order_by('-created_date')
+            result = Idea.objects.filter(user=info.context.user, visibility=visibility)
         else:
-            result = Idea.objects.filter(user__username=request_username).order_by('-created_date')
+            result = Idea.objects.filter(user=info.context.user)
 
-        return result
+        # Ordered by (created_date, id) descending inside the paginator
+        return paginate(result, info, kwargs.get('first'), kwargs.get('after'))
 
     @login_required
     def resolve_all_ideas(self, info, **kwargs):
-        request_username = info.context.user.username
-        request_profile = Profile.objects.get(user__username=request_username)
-        followed_list = request_profile.followed.values_list('username', flat=True)
-        ideas = Idea.objects.filter(
-            Q(visibility='public')
-            | Q(user__username=request_username)
-            | Q(user__username__in=followed_list, visibility='protected')
-        ).order_by('-created_date')
-
-        return ideas
+        entries = home_timeline(info.context.user)
+        if entries is not None:
+            # Materialized timeline, a range scan over the entries of the user and another over the public ones
+            return paginate(
+                entries, info, kwargs.get('first'), kwargs.get('after'),
+                id_field='idea_id', node_field='idea'
+            )
+
+        # Fallback for users following accounts with too many followers to fan out their ideas
+        ideas = Idea.objects.visible_to(info.context.user, get_followed(info.context.user))
+        return paginate(ideas, info, kwargs.get('first'), kwargs.get('after'))
 
+    @login_required
+    def resolve_search_ideas(self, info, query, **kwargs):
+        ideas = search.search_ideas(info.context.user, query)
+        return paginate(ideas, info, kwargs.get('first'), kwargs.get('after'))
 
     @login_required
     def resolve_followers_by_user(self, info, **kwargs):
-        username = info.context.user.username
-        result = None
-
-        if username:
-            profile = Profile.objects.get(user__username=username)
-            result = profile.followers.all()
-
-        return result
+        # Newest follows first, a range scan over follow_followee_date_idx
+        return paginate(
+            Follow.objects.filter(followee=info.context.user), info, kwargs.get('first'), kwargs.get('after'),
+            date_field='created', node_field='follower'
+        )
 
     @login_required
     def resolve_followed_by_user(self, info, **kwargs):
-        username = info.context.user.username
-        result = None
-
-        if username:
-            profile = Profile.objects.get(user__username=username)
-            result = profile.followed.all()
-
-        return result
+        return paginate(
+            Follow.objects.filter(follower=info.context.user), info, kwargs.get('first'), kwargs.get('after'),
+            date_field='created', node_field='followee'
+        )
 
 
 class Mutation(graphene.ObjectType):
@@ -125,8 +157,10 @@ class Mutation(graphene.ObjectType):
 
     create_follow_request = CreateFollowRequest.Field()
     update_follow_request = UpdateFollowRequest.Field()
+    respond_to_follow_requests = RespondToFollowRequests.Field()
 
     create_idea = CreateIdea.Field()
+    create_ideas = CreateIdeas.Field()
     update_idea = UpdateIdea.Field()
     delete_idea = DeleteIdea.Field()
 
@@ -134,4 +168,12 @@ class Mutation(graphene.ObjectType):
     delete_followed = DeleteFollowed.Field()
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(graphene.ObjectType):
+    new_ideas = graphene.Field(IdeaType)
+
+    def resolve_new_ideas(root, info):
+        # Executed for every idea delivered to the subscription (api.websocket), which is the root value
+        return Observable.of(root)
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
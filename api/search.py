@@ -0,0 +1,84 @@
+# Third party
+from django.contrib.postgres.search import SearchQuery, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models.functions import Collate, Length, Upper
+
+# Local
+from .models import User, Idea
+from .pagination import get_page_size
+
+
+# Shorter queries have too few trigrams to find similar usernames, only their prefix is searched
+TRIGRAM_MIN_LENGTH = 3
+# Text search configuration of the ideas, without stemming or stop words because they are written in any language.
+# It must match the one of the migration that filled the vectors
+SEARCH_CONFIG = 'simple'
+
+
+def get_prefix_key():
+    """
+    Expression of user_username_prefix_idx. With the "C" collation the same index serves the LIKE of the prefix
+    and its order, so the search stops after reading a page of it
+    """
+    key = Upper('username')
+    return Collate(key, 'C') if connection.vendor == 'postgresql' else key
+
+
+def search_users(query, first=None, users=None):
+    """
+    Users whose username starts with the query, in alphabetical order so an exact match comes first, followed
+    by the most similar usernames (pg_trgm) when there are not enough. At most a page of results.
+    Without PostgreSQL the usernames containing the query are used instead of the similar ones.
+    `users` is the queryset searched, all the users by default.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    limit = get_page_size(first)
+    users = User.objects.all() if users is None else users
+
+    matches = list(
+        users.alias(prefix_key=get_prefix_key())
+        .filter(prefix_key__startswith=query.upper())
+        .order_by('prefix_key', 'username')[:limit]
+    )
+    if len(matches) == limit or len(query) < TRIGRAM_MIN_LENGTH:
+        return matches
+
+    others = users.exclude(pk__in=[user.pk for user in matches])
+    if connection.vendor == 'postgresql':
+        others = others.filter(username__trigram_similar=query).annotate(
+            similarity=TrigramSimilarity('username', query)
+        ).order_by('-similarity', 'username')
+    else:
+        others = others.filter(username__icontains=query).order_by(Length('username'), 'username')
+
+    return matches + list(others[:limit - len(matches)])
+
+
+def update_search_vectors(ideas):
+    """ Recalculates the search vector of the ideas from their text, in a single query """
+    if connection.vendor != 'postgresql' or not ideas:
+        return
+    Idea.objects.filter(pk__in=[idea.pk for idea in ideas]).update(
+        search_vector=SearchVector('text', config=SEARCH_CONFIG)
+    )
+
+
+def search_ideas(user, query):
+    """
+    Ideas visible for the user containing all the words of the query. Both conditions are part of the same
+    query, so a page is never shortened by ideas filtered out after reading them.
+    Without PostgreSQL the words are searched in the text instead of the indexed vector.
+    """
+    words = query.split()
+    if not words:
+        return Idea.objects.none()
+
+    ideas = Idea.objects.visible_to(user)
+    if connection.vendor == 'postgresql':
+        return ideas.filter(search_vector=SearchQuery(' '.join(words), config=SEARCH_CONFIG))
+
+    for word in words:
+        ideas = ideas.filter(text__icontains=word)
+    return ideas
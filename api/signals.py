@@ -0,0 +1,9 @@
+# Third party
+from django.dispatch import Signal
+
+
+# Sent by the mutations once the transaction is committed, with the ids of the `followers` and the `followee`
+follows_added = Signal()
+follows_removed = Signal()
+# Sent once a user is deleted along with its follows, with its `user_id`
+user_deleted = Signal()
@@ -0,0 +1,124 @@
+import logging
+from collections import defaultdict
+from itertools import count
+from threading import Lock
+
+# Third party
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Local
+from .models import Follow
+
+
+IDEAS_CHANNEL = 'ideas'
+BROKER = 'api.subscriptions.InMemoryBroker'
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_subscribers = None
+
+
+class InMemoryBroker:
+    """
+    Delivers the messages to the subscribers of the same process, in the thread publishing them.
+    Other brokers (Redis pub/sub...) need the same methods to deliver them to every process.
+    """
+
+    def __init__(self):
+        self.callbacks = defaultdict(list)
+        self.lock = Lock()
+
+    def subscribe(self, channel, callback):
+        with self.lock:
+            self.callbacks[channel].append(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self.lock:
+            self.callbacks[channel].remove(callback)
+
+    def publish(self, channel, message):
+        with self.lock:
+            callbacks = list(self.callbacks[channel])
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                # The publisher is not affected by the subscribers
+                logger.exception('The message could not be delivered to %s', callback)
+
+
+def get_broker():
+    """ Broker of the process, configured in SUBSCRIPTIONS['BROKER'] """
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'SUBSCRIPTIONS', {}).get('BROKER', BROKER))()
+
+    return _broker
+
+
+def get_viewers(message, viewers):
+    """
+    Viewers allowed to see the published idea: anyone if public, its followers if protected, only its author if private
+    """
+    if message['visibility'] == 'public':
+        return set(viewers)
+
+    allowed = {message['user']} & set(viewers)
+    if message['visibility'] == 'protected':
+        allowed.update(Follow.objects.filter(
+            followee=message['user'], follower__in=viewers
+        ).values_list('follower', flat=True))
+
+    return allowed
+
+
+class Subscribers:
+    """ newIdeas subscriptions of the connections of this process, each one a viewer and a delivery function """
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.keys = count()
+        self.lock = Lock()
+
+    def add(self, viewer_id, deliver):
+        key = next(self.keys)
+        with self.lock:
+            self.subscriptions[key] = viewer_id, deliver
+
+        return key
+
+    def remove(self, key):
+        with self.lock:
+            self.subscriptions.pop(key, None)
+
+    def on_idea(self, message):
+        """ Broker callback, delivers the id of a new idea to the subscriptions of the viewers allowed to see it """
+        with self.lock:
+            subscriptions = list(self.subscriptions.values())
+        if not subscriptions:
+            return
+
+        # A single query for all the viewers
+        allowed = get_viewers(message, {viewer_id for viewer_id, deliver in subscriptions})
+        for viewer_id, deliver in subscriptions:
+            if viewer_id in allowed:
+                deliver(message['id'])
+
+
+def get_subscribers():
+    """ Subscriptions of the process, listening to the broker since the first one """
+    global _subscribers
+    if _subscribers is None:
+        _subscribers = Subscribers()
+        get_broker().subscribe(IDEAS_CHANNEL, _subscribers.on_idea)
+
+    return _subscribers
+
+
+def publish_ideas(ideas):
+    """ Publishes new ideas for the newIdeas subscriptions. The mutations call it once they are committed """
+    broker = get_broker()
+    for idea in ideas:
+        broker.publish(IDEAS_CHANNEL, {'id': idea.pk, 'user': idea.user_id, 'visibility': idea.visibility})
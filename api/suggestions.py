@@ -0,0 +1,152 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+# Third party
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min, OuterRef, Subquery
+
+# Local
+from .models import User, Follow, Suggestion
+
+
+MAX_SUGGESTIONS = 50
+BATCH_SIZE = 100
+
+
+def get_options():
+    return getattr(settings, 'SUGGESTIONS', {})
+
+
+def compute(user_ids):
+    """
+    Best suggestions of each user: the users followed by the users it follows (friends of friends), ranked by
+    the number of them following each one, without the user itself and the users it already follows.
+    """
+    followed = defaultdict(set)
+    for follower, followee in Follow.objects.filter(follower__in=user_ids).values_list('follower', 'followee'):
+        followed[follower].add(followee)
+
+    # Follows of the followees of the users, grouped by user and suggested user
+    rows = Follow.objects.filter(follower__followers__follower__in=user_ids).values_list(
+        'follower__followers__follower', 'followee'
+    ).annotate(mutual=Count('*')).order_by()
+    candidates = defaultdict(list)
+    for user_id, suggested_id, mutual in rows:
+        if suggested_id != user_id and suggested_id not in followed[user_id]:
+            candidates[user_id].append((mutual, suggested_id))
+
+    size = get_options().get('MAX_SUGGESTIONS', MAX_SUGGESTIONS)
+    return {
+        user_id: heapq.nsmallest(size, candidates[user_id], key=lambda candidate: (-candidate[0], candidate[1]))
+        for user_id in user_ids
+    }
+
+
+def chunks(values):
+    values = iter(values)
+    batch = list(islice(values, BATCH_SIZE))
+    while batch:
+        yield batch
+        batch = list(islice(values, BATCH_SIZE))
+
+
+def refresh(user_ids):
+    """ Replaces the suggestions of the users with the current ones """
+    for batch in chunks(user_ids):
+        suggestions = compute(batch)
+        with transaction.atomic():
+            Suggestion.objects.filter(user__in=batch).delete()
+            Suggestion.objects.bulk_create([
+                Suggestion(user_id=user_id, suggested_id=suggested_id, mutual=mutual)
+                for user_id, ranking in suggestions.items()
+                for mutual, suggested_id in ranking
+            ])
+
+
+def rebuild_suggestions(users=None):
+    """ Recomputes the suggestions of the given users (all of them by default) """
+    users = User.objects.all() if users is None else users
+    refresh(users.order_by('pk').values_list('pk', flat=True).iterator())
+
+
+def suggested_users(user):
+    """ Users suggested to the user, the best ones first """
+    return User.objects.filter(suggested_to__user=user).order_by('-suggested_to__mutual', 'suggested_to__suggested')
+
+
+def mutual_follows(followers):
+    """ Number of the followers followed by the user of each suggestion, as a subquery """
+    follows = Follow.objects.filter(follower=OuterRef('user'), followee__in=followers)
+    return Subquery(follows.values('follower').annotate(count=Count('*')).values('count'))
+
+
+def increment(followers, followee):
+    """
+    Suggestions of the followee to the users following the followers, who now have one more mutual follow with it
+    for each follower they follow. The ones already stored are incremented in a single update, and the new ones
+    are added with all their mutual follows if they fit in the top of the user.
+    """
+    users = Follow.objects.filter(followee__in=followers).values('follower')
+    Suggestion.objects.filter(user__in=users, suggested=followee).update(mutual=F('mutual') + mutual_follows(followers))
+
+    size = get_options().get('MAX_SUGGESTIONS', MAX_SUGGESTIONS)
+    rows = Follow.objects.filter(followee=followee, follower__followers__follower__in=users).values_list(
+        'follower__followers__follower'
+    ).annotate(mutual=Count('*')).order_by()
+    for batch in chunks(rows):
+        user_ids = [user_id for user_id, mutual in batch]
+        skipped = set(Suggestion.objects.filter(user__in=user_ids, suggested=followee).values_list('user', flat=True))
+        skipped.update(
+            Follow.objects.filter(follower__in=user_ids, followee=followee).values_list('follower', flat=True)
+        )
+        stored = {
+            row['user']: row for row in Suggestion.objects.filter(user__in=user_ids).values('user').annotate(
+                count=Count('*'), lowest=Min('mutual')
+            ).order_by()
+        }
+
+        new = []
+        for user_id, mutual in batch:
+            if user_id == followee or user_id in skipped:
+                continue
+            row = stored.get(user_id)
+            if row is not None and row['count'] >= size:
+                if mutual <= row['lowest']:
+                    continue
+                # Takes the place of the last suggestion of the user
+                Suggestion.objects.filter(user=user_id).order_by('mutual', '-suggested').first().delete()
+            new.append(Suggestion(user_id=user_id, suggested_id=followee, mutual=mutual))
+        Suggestion.objects.bulk_create(new)
+
+
+def decrement(followers, suggested):
+    """
+    Suggestions of the suggested users to the users following the followers, which have one mutual follow less
+    for each follower they follow. Those left without mutual follows are deleted
+    """
+    suggestions = Suggestion.objects.filter(
+        user__in=Follow.objects.filter(followee__in=followers).values('follower'), suggested__in=suggested
+    )
+    suggestions.filter(mutual__lte=mutual_follows(followers)).delete()
+    suggestions.update(mutual=F('mutual') - mutual_follows(followers))
+
+
+def remove_user(user):
+    """
+    Called by DeleteUser before deleting the user, while its follows exist. Its own suggestions and the suggestions
+    of it are deleted in cascade, the users following it lose its followees as mutual follows
+    """
+    decrement([user.pk], Follow.objects.filter(follower=user).values('followee'))
+
+
+def on_follows_added(sender, followers, followee, **kwargs):
+    increment(followers, followee)
+    # The suggestions of the followers themselves are recomputed, after the changes to their followers' ones
+    refresh(followers)
+
+
+def on_follows_removed(sender, followers, followee, **kwargs):
+    decrement(followers, [followee])
+    refresh(followers)
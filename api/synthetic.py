@@ -0,0 +1,152 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+# Third party
+from django.contrib.auth.hashers import make_password
+from django.contrib.postgres.search import SearchVector
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Local
+from . import counters, response_cache
+from .models import User, Profile, Idea, Follow, FollowRequest
+from .search import SEARCH_CONFIG
+from .suggestions import rebuild_suggestions
+from .timeline import rebuild_timeline
+
+
+BATCH_SIZE = 1000
+VISIBILITY_WEIGHTS = {'public': 6, 'protected': 3, 'private': 1}
+WORDS = [
+    'green', 'tea', 'coffee', 'book', 'music', 'travel', 'code', 'python', 'graphql', 'django', 'idea', 'project',
+    'morning', 'night', 'city', 'beach', 'mountain', 'game', 'movie', 'startup', 'design', 'data', 'team', 'weekend',
+]
+
+
+class Generator:
+    """
+    Users with a power-law follower graph: their popularity follows a Zipf distribution of exponent `alpha`,
+    so a few accounts have most of the followers, and the number of users each one follows is Pareto distributed
+    around `follows` (average). Ideas are published following the same kind of distribution.
+    Every follow has its accepted request, and some other pairs of users have a pending or rejected one.
+    """
+
+    def __init__(self, prefix='synthetic', password='password', follows=20, alpha=1.0, pending=0.1, rejected=0.05,
+                 days=30, seed=None):
+        self.prefix = prefix
+        self.password = password
+        self.follows = follows
+        self.alpha = alpha
+        self.pending = pending
+        self.rejected = rejected
+        self.days = days
+        self.random = random.Random(seed)
+
+    def get_cum_weights(self, count):
+        """ Cumulative Zipf weights of `count` ranks, for random.choices """
+        return list(accumulate(1 / rank ** self.alpha for rank in range(1, count + 1)))
+
+    def get_out_degree(self, users_count):
+        # Pareto of shape 2 has mean 2
+        return min(users_count - 1, int(self.follows / 2 * self.random.paretovariate(2)))
+
+    def create_users(self, count):
+        """ Users and profiles, returning their ids. The password is hashed once for all of them """
+        password = make_password(self.password)
+        for start in range(0, count, BATCH_SIZE):
+            User.objects.bulk_create([
+                User(username=f'{self.prefix}{index}', email=f'{self.prefix}{index}@example.com', password=password)
+                for index in range(start, min(start + BATCH_SIZE, count))
+            ])
+        user_ids = list(
+            User.objects.filter(username__startswith=self.prefix).order_by('id').values_list('id', flat=True)
+        )
+        Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=BATCH_SIZE)
+
+        return user_ids
+
+    def create_follows(self, user_ids):
+        """ Follows with their accepted requests, and the pending and rejected requests. Returns their count """
+        # The most popular users are not the first ones created
+        popular = self.random.sample(user_ids, len(user_ids))
+        cum_weights = self.get_cum_weights(len(popular))
+        counts = {'follows': 0, 'pending': 0, 'rejected': 0}
+
+        follows, requests = [], []
+        for user_id in user_ids:
+            degree = self.get_out_degree(len(user_ids))
+            pending = int(degree * self.pending)
+            rejected = int(degree * self.rejected)
+            wanted = min(len(user_ids) - 1, degree + pending + rejected)
+
+            followees = set()
+            while len(followees) < wanted:
+                followees.update(self.random.choices(popular, cum_weights=cum_weights, k=wanted - len(followees)))
+                followees.discard(user_id)
+            followees = list(followees)
+            self.random.shuffle(followees)
+
+            for index, followee_id in enumerate(followees):
+                if index < degree:
+                    status = 'accepted'
+                    follows.append(Follow(follower_id=user_id, followee_id=followee_id, created=self.get_date()))
+                    counts['follows'] += 1
+                else:
+                    status = 'pending' if index < degree + pending else 'rejected'
+                    counts[status] += 1
+                requests.append(FollowRequest(from_user_id=user_id, to_user_id=followee_id, status=status))
+
+            if len(requests) >= BATCH_SIZE:
+                Follow.objects.bulk_create(follows)
+                FollowRequest.objects.bulk_create(requests)
+                follows, requests = [], []
+
+        Follow.objects.bulk_create(follows)
+        FollowRequest.objects.bulk_create(requests)
+
+        return counts
+
+    def create_ideas(self, user_ids, count):
+        active = self.random.sample(user_ids, len(user_ids))
+        cum_weights = self.get_cum_weights(len(active))
+        visibilities = list(VISIBILITY_WEIGHTS)
+        visibility_weights = list(VISIBILITY_WEIGHTS.values())
+
+        for start in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - start)
+            Idea.objects.bulk_create([
+                Idea(
+                    text=' '.join(self.random.choices(WORDS, k=self.random.randint(3, 12))),
+                    visibility=visibility,
+                    user_id=user_id,
+                    created_date=self.get_date()
+                )
+                for user_id, visibility in zip(
+                    self.random.choices(active, cum_weights=cum_weights, k=size),
+                    self.random.choices(visibilities, weights=visibility_weights, k=size)
+                )
+            ])
+
+        if connection.vendor == 'postgresql':
+            Idea.objects.filter(user_id__in=user_ids).update(search_vector=SearchVector('text', config=SEARCH_CONFIG))
+
+    def get_date(self):
+        return timezone.now() - timedelta(seconds=self.random.uniform(0, self.days * 24 * 60 * 60))
+
+    def generate(self, users, ideas):
+        """
+        Creates the data and rebuilds the timelines and suggestions. Returns the count of every kind of row created
+        """
+        with transaction.atomic():
+            user_ids = self.create_users(users)
+            counts = {'users': len(user_ids), **self.create_follows(user_ids), 'ideas': ideas}
+            self.create_ideas(user_ids, ideas)
+            counters.reconcile(User.objects.filter(username__startswith=self.prefix))
+
+        rebuild_timeline()
+        rebuild_suggestions(User.objects.filter(username__startswith=self.prefix))
+        # Every cached response depends on the users
+        response_cache.invalidate('users')
+
+        return counts
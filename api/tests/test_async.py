@@ -0,0 +1,191 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TransactionTestCase
+from django.test.utils import override_settings
+
+from api import counters, executors, tracing
+from api.loaders import UserLoader
+from api.models import User, Follow, FollowRequest
+from api.schema import schema
+from api.views import AsyncGraphQLView
+from .utils import create_user
+
+
+class TestAsyncView(TransactionTestCase):
+    QUERY = '''
+        {
+            allIdeas{
+                edges{
+                    node{
+                        text
+                        user{
+                            username
+                        }
+                    }
+                }
+            }
+            followersByUser{
+                edges{
+                    node{
+                        username
+                    }
+                }
+            }
+            requests{
+                fromUser{
+                    username
+                }
+                status
+            }
+        }
+        '''
+
+    def setUp(self):
+        cache.clear()
+        self.user1, _, self.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        self.user2, _, self.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        FollowRequest.objects.create(from_user=self.user2, to_user=self.user1, status='accepted')
+
+    async def post(self, query, token):
+        request = AsyncRequestFactory().post(
+            '/graphql/',
+            json.dumps({'query': query}),
+            content_type='application/json'
+        )
+        request.META['HTTP_AUTHORIZATION'] = f'JWT {token}'
+        request.user = AnonymousUser()
+        response = await AsyncGraphQLView.as_view(schema=schema)(request)
+        return json.loads(response.content)
+
+    async def test_root_fields_resolved_in_pool(self):
+        threads = []
+        original_execute = executors.execute
+
+        def execute(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return original_execute(*args, **kwargs)
+
+        with mock.patch('api.executors.execute', wraps=execute):
+            content = await self.post(self.QUERY, self.token_user1)
+
+        self.assertNotIn('errors', content)
+        self.assertEqual(['allIdeas', 'followersByUser', 'requests'], list(content['data']))
+        self.assertEqual([{'node': {'username': 'user2'}}], content['data']['followersByUser']['edges'])
+        self.assertEqual([{'fromUser': {'username': 'user2'}, 'status': 'ACCEPTED'}], content['data']['requests'])
+        # One operation for each root field, with its nested fields
+        self.assertEqual(3, len(threads))
+        self.assertTrue(all(name.startswith('graphql-db') for name in threads))
+
+    async def test_nested_fields_in_pool(self):
+        # Lazy foreign keys and related objects of the payloads are loaded in the database threads
+        content = await self.post(
+            '''
+            mutation{
+                createIdea(ideaData: {text: "async idea", visibility: "public"}){
+                    idea{
+                        user{
+                            username
+                            ideaCount
+                        }
+                    }
+                }
+            }
+            ''',
+            self.token_user1
+        )
+        self.assertNotIn('errors', content)
+        self.assertEqual({'username': 'user1', 'ideaCount': 1}, content['data']['createIdea']['idea']['user'])
+
+        # The follow of the setup was created without its counters
+        await executors.run_in_pool(counters.reconcile, User.objects.all())
+        content = await self.post(
+            'mutation{ deleteFollowed(followed: "user1"){ followed{ username followersCount } } }',
+            self.token_user2
+        )
+        self.assertNotIn('errors', content)
+        self.assertEqual({'username': 'user1', 'followersCount': 0}, content['data']['deleteFollowed']['followed'])
+
+        content = await self.post(
+            '{ a: searchUsers(query: "user"){ username followersCount } b: user(username: "user2"){ username } }',
+            self.token_user1
+        )
+        self.assertNotIn('errors', content)
+        self.assertEqual(['a', 'b'], list(content['data']))
+
+    async def test_mutation(self):
+        content = await self.post(
+            '''
+            mutation{
+                createIdea(ideaData: {text: "async idea", visibility: "protected"}){
+                    idea{
+                        text
+                        user{
+                            username
+                        }
+                    }
+                }
+            }
+            ''',
+            self.token_user1
+        )
+
+        self.assertEqual({'text': 'async idea', 'user': {'username': 'user1'}}, content['data']['createIdea']['idea'])
+        content = await self.post(self.QUERY, self.token_user2)
+        self.assertEqual(
+            [{'node': {'text': 'async idea', 'user': {'username': 'user1'}}}],
+            content['data']['allIdeas']['edges']
+        )
+
+    async def test_errors(self):
+        content = await self.post('{ ideas(username: "unknown"){ edges{ node{ text } } } }', 'invalid')
+        self.assertEqual('Error decoding signature', content['errors'][0]['message'])
+
+        content = await self.post('{ unknownField }', self.token_user1)
+        self.assertIn('unknownField', content['errors'][0]['message'])
+
+    async def test_loader_in_event_loop(self):
+        # The batch is loaded in the database threads
+        user = await UserLoader().load(self.user1.pk)
+        self.assertEqual('user1', user.username)
+
+    @override_settings(SQL_INSTRUMENTATION={'SAMPLE_RATE': 1})
+    async def test_instrumentation(self):
+        # The database threads record the queries of their root fields and of the DataLoader batches
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            await self.post(self.QUERY, self.token_user1)
+        async_data = json.loads(logs.records[0].getMessage())
+
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            await executors.run_in_pool(
+                self.client.post, '/graphql/', json.dumps({'query': self.QUERY}),
+                content_type='application/json', HTTP_AUTHORIZATION=f'JWT {self.token_user1}'
+            )
+        sync_data = json.loads(logs.records[0].getMessage())
+
+        # Timeline, followers, requests and the users of the requests
+        self.assertGreaterEqual(async_data['queries'], 4)
+        self.assertEqual(sync_data['queries'], async_data['queries'])
+
+    async def test_tracing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'traces.jsonl')
+            tracing._exporter = None
+            try:
+                with override_settings(TRACING={'SAMPLE_RATE': 1, 'SLOW_FIELD_MS': 0, 'FILE': path}):
+                    await self.post(self.QUERY, self.token_user1)
+            finally:
+                tracing._exporter = None
+            with open(path) as traces:
+                root, *spans = json.loads(traces.readline())
+
+        self.assertEqual('anonymous', root['name'])
+        self.assertEqual(
+            {'auth', 'execute', 'serialize', 'Query.allIdeas', 'Query.followersByUser', 'Query.requests'},
+            {span['name'] for span in spans}
+        )
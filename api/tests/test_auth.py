@@ -0,0 +1,87 @@
+import json
+from graphene_django.utils.testing import GraphQLTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.auth import get_tokens_cache, get_user_by_token
+from api.models import User
+from .utils import create_user
+
+
+class TestAuthentication(GraphQLTestCase):
+    QUERY = '''
+        {
+            requests{
+                status
+            }
+            followersByUser{
+                edges{
+                    node{
+                        username
+                    }
+                }
+            }
+            followedByUser{
+                edges{
+                    node{
+                        username
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, profile1, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+
+    def setUp(self):
+        get_tokens_cache().clear()
+
+    def query(self, *args, **kwargs):
+        # The caches are invalidated once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().query(*args, **kwargs)
+
+    def query_as_user1(self, query):
+        return self.query(query, headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'})
+
+    def count_user_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertResponseNoErrors(self.query_as_user1(self.QUERY))
+        # The user of the token is looked up by its username
+        return len([query for query in context.captured_queries if 'WHERE "api_user"."username" =' in query['sql']])
+
+    def test_authenticated_once(self):
+        # The user is loaded once for the three root fields, and then taken from the cache
+        self.assertEqual(1, self.count_user_queries())
+        self.assertEqual(0, self.count_user_queries())
+
+    def test_update_user_invalidates_token(self):
+        self.count_user_queries()
+        response = self.query_as_user1('mutation{ updateUser(userData: {email: "new@gmail.com"}){ user{ email } } }')
+        self.assertResponseNoErrors(response)
+
+        self.assertEqual(1, self.count_user_queries())
+
+    def test_delete_user_invalidates_token(self):
+        self.count_user_queries()
+        response = self.query_as_user1('mutation{ deleteUser{ user{ username } } }')
+        self.assertResponseNoErrors(response)
+
+        response = self.query_as_user1(self.QUERY)
+        self.assertIn('errors', json.loads(response.content))
+
+    def test_new_user_with_same_username(self):
+        user, _, token = create_user('user9', 'user9@gmail.com', 'user9')
+        self.assertEqual(user.pk, get_user_by_token(token, None).pk)
+
+        # Removed without the cache noticing it, as when a test rolls back its users
+        User.objects.filter(pk=user.pk).update(username='removed')
+        new_user, _, new_token = create_user('user9', 'user9@gmail.com', 'user9')
+        self.assertEqual(new_user.pk, get_user_by_token(new_token, None).pk)
+
+    def test_invalid_token(self):
+        response = self.query(self.QUERY, headers={'HTTP_AUTHORIZATION': 'JWT invalid'})
+        self.assertEqual('Error decoding signature', json.loads(response.content)['errors'][0]['message'])
+        self.assertEqual(0, len(get_tokens_cache()))
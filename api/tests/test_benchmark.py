@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+
+from api.benchmark import OPERATIONS
+from api.models import User, Idea, Follow, FollowRequest, TimelineEntry
+
+
+class TestBenchmark(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generate_data', users=30, ideas=200, follows=5, seed=1, stdout=open(os.devnull, 'w'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_data(self):
+        self.assertEqual(30, User.objects.filter(username__startswith='synthetic').count())
+        self.assertEqual(200, Idea.objects.count())
+        self.assertEqual(
+            {'public', 'protected', 'private'}, set(Idea.objects.values_list('visibility', flat=True))
+        )
+        # Every follow has its accepted request
+        self.assertEqual(Follow.objects.count(), FollowRequest.objects.filter(status='accepted').count())
+        self.assertTrue(FollowRequest.objects.filter(status='pending').exists())
+        self.assertFalse(Follow.objects.filter(follower=F('followee')).exists())
+        # The timelines are built
+        self.assertTrue(TimelineEntry.objects.filter(owner__isnull=False).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('generate_data', users=1, ideas=0)
+
+    def test_benchmark(self):
+        users, ideas = User.objects.count(), Idea.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark', requests=3, warmup=1, seed=1, output=output, stdout=open(os.devnull, 'w'))
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        self.assertEqual(set(OPERATIONS), set(results['operations']) | set(results['skipped']))
+        for name, result in results['operations'].items():
+            self.assertEqual(0, result['errors'], name)
+            self.assertEqual(3, result['requests'])
+            # The response cache is disabled
+            self.assertEqual(0, result['cache_hits'], name)
+            self.assertLessEqual(result['p50'], result['p95'])
+            self.assertLessEqual(result['p95'], result['p99'])
+        # The mutations are rolled back
+        self.assertEqual((users, ideas), (User.objects.count(), Idea.objects.count()))
+
+    def test_benchmark_with_response_cache(self):
+        # Other entries of the cache, like the persisted queries, are kept
+        cache.set('graphql:persisted-query:other', 'query{ allIdeas{ edges{ node{ text } } } }')
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command(
+                'benchmark', 'followersByUser', requests=20, warmup=0, seed=1, response_cache=True, output=output,
+                stdout=open(os.devnull, 'w')
+            )
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        self.assertTrue(results['response_cache'])
+        # The sample has fewer users than requests, some of them are answered from the cache
+        self.assertGreater(results['operations']['followersByUser']['cache_hits'], 0)
+        self.assertIsNotNone(cache.get('graphql:persisted-query:other'))
+
+    def test_unknown_operation(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', 'unknown')
@@ -0,0 +1,104 @@
+import json
+from django.test import override_settings
+from graphene_django.utils.testing import GraphQLTestCase
+
+from api import backend
+from .utils import create_user
+
+QUERY_COST = {
+    'MAX_DEPTH': 5,
+    'MAX_COST': 250,
+    'DEFAULT_LIST_SIZE': 100,
+    'FIELD_WEIGHTS': {'Query.user': 10},
+}
+
+
+@override_settings(QUERY_COST=QUERY_COST)
+class TestQueryCost(GraphQLTestCase):
+    IDEAS_QUERY = '''
+        query ($first: Int){
+            allIdeas(first: $first){
+                edges{
+                    node{
+                        text
+                        user{
+                            username
+                        }
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, profile1, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+
+    def setUp(self):
+        backend.get_backend().documents.clear()
+
+    def query_ideas(self, first):
+        return self.query(
+            self.IDEAS_QUERY,
+            variables={'first': first},
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+        )
+
+    def test_cost_within_budget(self):
+        # 1 (allIdeas) + 50 edges + 50 nodes + 50 users
+        response = self.query_ideas(50)
+        self.assertResponseNoErrors(response)
+
+    def test_cost_multiplied_by_page_size(self):
+        # The same document with a bigger page is rejected
+        response = self.query_ideas(100)
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            'Query cost 301 exceeds the maximum cost of 250',
+            json.loads(response.content)['errors'][0]['message']
+        )
+
+    def test_invalid_page_size(self):
+        # Reported by the executor as an invalid variable, not as an error of the cost analysis
+        response = self.query_ideas('abc')
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(
+            "could not convert string to float: 'abc'", json.loads(response.content)['errors'][0]['message']
+        )
+
+        response = self.query_ideas(-1)
+        self.assertEqual(
+            'Argument "first" must be a non-negative integer', json.loads(response.content)['errors'][0]['message']
+        )
+
+    @override_settings(QUERY_COST={**QUERY_COST, 'FIELD_WEIGHTS': {'Query.user': 10, 'UserType.email': 3}})
+    def test_unpaginated_list(self):
+        # 10 (user) + 100 users of the default list size * 3 (email)
+        response = self.query('{ user(username: "user"){ username email } }')
+        self.assertEqual(400, response.status_code)
+        self.assertIn('Query cost 310 exceeds the maximum cost of 250', response.content.decode())
+
+    @override_settings(QUERY_COST={**QUERY_COST, 'MAX_DEPTH': 4})
+    def test_max_depth(self):
+        response = self.query('''
+            fragment IdeaUser on IdeaType{
+                user{
+                    username
+                }
+            }
+            {
+                allIdeas{
+                    edges{
+                        node{
+                            ...IdeaUser
+                        }
+                    }
+                }
+            }
+            ''')
+        self.assertEqual(400, response.status_code)
+        self.assertIn('Query depth 5 exceeds the maximum depth of 4', response.content.decode())
+
+    def test_introspection_not_counted(self):
+        response = self.query('{ __schema{ types{ name fields{ name type{ name ofType{ name } } } } } }')
+        self.assertResponseNoErrors(response)
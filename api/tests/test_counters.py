@@ -0,0 +1,190 @@
+import json
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.auth import get_tokens_cache
+from api.counters import COUNTERS, reconcile
+from api.models import Profile, Idea, Follow, FollowRequest
+from .utils import create_user
+
+
+class TestCounters(GraphQLTestCase):
+    PROFILE = '''
+        query profile($username: String){
+            user(username: $username){
+                username
+                followersCount
+                followedCount
+                ideaCount
+                pendingRequestCount
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, _, cls.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        cls.user3, _, cls.token_user3 = create_user('user3', 'user3@gmail.com', 'user3')
+
+    def setUp(self):
+        cache.clear()
+
+    def query_as(self, token, query, variables=None):
+        response = self.query(query, variables=variables, headers={'HTTP_AUTHORIZATION': f'JWT {token}'})
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']
+
+    def get_counters(self, username):
+        return self.query_as(self.token_user1, self.PROFILE, {'username': username})['user'][0]
+
+    def assertCounters(self, username, followers, followed, ideas, pending):
+        counters = self.get_counters(username)
+        self.assertEqual(
+            {
+                'followersCount': followers, 'followedCount': followed, 'ideaCount': ideas,
+                'pendingRequestCount': pending
+            },
+            {name: value for name, value in counters.items() if name != 'username'}
+        )
+        # They match the rows counted again
+        self.assertEqual(0, reconcile())
+
+    def request_follow(self, token, username):
+        self.query_as(
+            token,
+            'mutation follow($username: String){'
+            ' createFollowRequest(followRequestData: {toUser: $username}){ followRequest{ status } } }',
+            {'username': username}
+        )
+
+    def test_follows(self):
+        self.request_follow(self.token_user2, 'user1')
+        self.request_follow(self.token_user2, 'user1')
+        self.request_follow(self.token_user3, 'user1')
+        self.assertCounters('user1', 0, 0, 0, 2)
+
+        self.query_as(self.token_user1, '''
+            mutation{
+                updateFollowRequest(followRequestData: {fromUser: "user2", status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            ''')
+        self.assertCounters('user1', 1, 0, 0, 1)
+        self.assertCounters('user2', 0, 1, 0, 0)
+
+        self.query_as(self.token_user1, '''
+            mutation{
+                respondToFollowRequests(decisions: [
+                    {fromUser: "user2", status: "rejected"}, {fromUser: "user3", status: "accepted"}
+                ]){
+                    followRequests{
+                        status
+                    }
+                }
+            }
+            ''')
+        self.assertCounters('user1', 2, 0, 0, 0)
+        self.assertCounters('user3', 0, 1, 0, 0)
+
+        self.query_as(self.token_user1, 'mutation{ deleteFollower(follower: "user2"){ followersCount } }')
+        self.query_as(self.token_user3, 'mutation{ deleteFollowed(followed: "user1"){ followedCount } }')
+        self.query_as(self.token_user3, 'mutation{ deleteFollowed(followed: "user1"){ followedCount } }')
+        self.assertCounters('user1', 0, 0, 0, 0)
+        self.assertCounters('user2', 0, 0, 0, 0)
+
+    def test_ideas(self):
+        content = self.query_as(
+            self.token_user1, 'mutation{ createIdea(ideaData: {text: "idea", visibility: "public"}){ idea{ id } } }'
+        )
+        self.query_as(
+            self.token_user1,
+            'mutation{ createIdeas(ideas: [{text: "a", visibility: "public"}, {text: "b", visibility: "private"}]){'
+            ' ideas{ id } } }'
+        )
+        self.assertCounters('user1', 0, 0, 3, 0)
+
+        self.query_as(
+            self.token_user1, 'mutation delete($id: ID){ deleteIdea(id: $id){ idea{ text } } }',
+            {'id': content['createIdea']['idea']['id']}
+        )
+        self.assertCounters('user1', 0, 0, 2, 0)
+
+    def test_delete_user(self):
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        Follow.objects.create(follower=self.user1, followee=self.user3)
+        FollowRequest.objects.create(from_user=self.user2, to_user=self.user3, status='pending')
+        reconcile()
+
+        self.query_as(self.token_user2, 'mutation{ deleteUser{ user{ username } } }')
+        self.assertCounters('user1', 0, 1, 0, 0)
+        self.assertCounters('user3', 1, 0, 0, 0)
+
+    def test_single_row_read(self):
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        Idea.objects.create(text='idea', visibility='public', user=self.user1)
+        reconcile()
+        get_tokens_cache().clear()
+        self.query_as(self.token_user1, '{ __typename }')
+
+        with CaptureQueriesContext(connection) as context:
+            counters = self.get_counters('user1')
+        self.assertEqual(1, len(context.captured_queries))
+        self.assertEqual(1, counters['followersCount'])
+        self.assertEqual(1, counters['ideaCount'])
+
+    def test_payloads_select_profile(self):
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        reconcile()
+
+        def profile_queries(token, query):
+            with CaptureQueriesContext(connection) as context:
+                data = self.query_as(token, query)
+            # The profile is joined to the users, never loaded on its own
+            return data, [
+                query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('SELECT "api_profile"."id"')
+            ]
+
+        data, queries = profile_queries(
+            self.token_user1,
+            'mutation{ createIdea(ideaData: {text: "idea", visibility: "public"}){ idea{ user{ ideaCount } } } }'
+        )
+        self.assertEqual({'ideaCount': 1}, data['createIdea']['idea']['user'])
+        self.assertEqual([], queries)
+
+        data, queries = profile_queries(
+            self.token_user2, 'mutation{ deleteFollowed(followed: "user1"){ followed{ followersCount } } }'
+        )
+        self.assertEqual({'followersCount': 0}, data['deleteFollowed']['followed'])
+        self.assertEqual([], queries)
+
+        data, queries = profile_queries(self.token_user1, '{ searchUsers(query: "user"){ username ideaCount } }')
+        self.assertEqual({'username': 'user1', 'ideaCount': 1}, data['searchUsers'][0])
+        self.assertEqual([], queries)
+
+    def test_not_cached(self):
+        self.assertEqual(0, self.get_counters('user1')['ideaCount'])
+        Idea.objects.create(text='idea', visibility='public', user=self.user1)
+        reconcile()
+        self.assertEqual(1, self.get_counters('user1')['ideaCount'])
+
+    def test_reconcile_command(self):
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+        Profile.objects.filter(user=self.user3).update(idea_count=7)
+        Profile.objects.filter(user=self.user2).delete()
+
+        call_command('reconcile_counters', stdout=open('/dev/null', 'w'))
+        self.assertEqual(
+            [(1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 0, 0)],
+            [
+                tuple(Profile.objects.values_list(*COUNTERS).get(user=user))
+                for user in [self.user1, self.user2, self.user3]
+            ]
+        )
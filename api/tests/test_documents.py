@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+
+from api import backend
+from api.backend import get_query_hash
+from .utils import create_user
+
+
+class TestDocuments(GraphQLTestCase):
+    QUERY = '''
+        {
+            ideas{
+                edges{
+                    node{
+                        text
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, profile1, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+
+    def setUp(self):
+        backend.get_backend().documents.clear()
+        cache.clear()
+
+    def post(self, body):
+        return self.client.post(
+            self.GRAPHQL_URL,
+            json.dumps(body),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {self.token_user1}'
+        )
+
+    def test_query_parsed_and_validated_once(self):
+        with mock.patch('api.backend.parse', wraps=backend.parse) as parse, \
+                mock.patch('api.backend.validate', wraps=backend.validate) as validate:
+            for _ in range(3):
+                response = self.query(self.QUERY, headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'})
+                self.assertResponseNoErrors(response)
+
+        self.assertEqual(1, parse.call_count)
+        self.assertEqual(1, validate.call_count)
+
+    def test_invalid_query_cached(self):
+        for _ in range(2):
+            response = self.query('{ ideas{ unknownField } }')
+            self.assertEqual(400, response.status_code)
+            self.assertIn('unknownField', response.content.decode())
+
+    def test_persisted_query(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': get_query_hash(self.QUERY)}}
+
+        # Unknown hash, the client has to send the query
+        response = self.post({'extensions': extensions})
+        content = json.loads(response.content)
+        self.assertEqual('PersistedQueryNotFound', content['errors'][0]['message'])
+
+        response = self.post({'query': self.QUERY, 'extensions': extensions})
+        self.assertResponseNoErrors(response)
+
+        # From now on the hash is enough
+        response = self.post({'extensions': extensions})
+        self.assertResponseNoErrors(response)
+        self.assertEqual({'ideas': {'edges': []}}, json.loads(response.content)['data'])
+
+    def test_persisted_query_wrong_hash(self):
+        extensions = {'persistedQuery': {'version': 1, 'sha256Hash': get_query_hash('{ users{ username } }')}}
+
+        response = self.post({'query': self.QUERY, 'extensions': extensions})
+        self.assertEqual(400, response.status_code)
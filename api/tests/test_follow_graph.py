@@ -0,0 +1,137 @@
+import json
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api import follow_graph
+from api.follow_graph import FollowGraph
+from api.models import Idea, Follow, FollowRequest
+from .utils import create_user
+
+
+@override_settings(FOLLOW_GRAPH={'ENABLED': True, 'SIZE': 100, 'TIMEOUT': 60})
+class TestFollowGraph(GraphQLTestCase):
+    IDEAS = '''
+        query ideas($username: String){
+            ideas(username: $username){
+                edges{
+                    node{
+                        text
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, _, cls.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        cls.user3, _, cls.token_user3 = create_user('user3', 'user3@gmail.com', 'user3')
+        Follow.objects.create(follower=cls.user1, followee=cls.user3)
+        Idea.objects.create(user=cls.user2, text='protected from user2', visibility='protected')
+        Idea.objects.create(user=cls.user3, text='protected from user3', visibility='protected')
+
+    def setUp(self):
+        cache.clear()
+        follow_graph._graph = None
+
+    def tearDown(self):
+        follow_graph._graph = None
+
+    def query_as(self, token, query, variables=None):
+        # The follow events are sent once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.query(query, variables=variables, headers={'HTTP_AUTHORIZATION': f'JWT {token}'})
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']
+
+    def get_texts(self, username):
+        cache.clear()
+        data = self.query_as(self.token_user1, self.IDEAS, {'username': username})
+        return [edge['node']['text'] for edge in data['ideas']['edges']]
+
+    def test_sorted_arrays(self):
+        graph = FollowGraph(10)
+        Follow.objects.create(follower=self.user2, followee=self.user3)
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+
+        self.assertEqual([self.user1.pk, self.user3.pk], list(graph.get_followed(self.user2.pk)))
+        self.assertTrue(graph.follows(self.user2.pk, self.user3.pk))
+        self.assertFalse(graph.follows(self.user3.pk, self.user2.pk))
+
+        with self.assertNumQueries(0):
+            graph.remove([self.user2.pk], self.user1.pk)
+            graph.add([self.user2.pk], self.user1.pk)
+            graph.add([self.user2.pk], self.user1.pk)
+            self.assertEqual([self.user1.pk, self.user3.pk], list(graph.get_followed(self.user2.pk)))
+
+    def test_lru(self):
+        graph = FollowGraph(2)
+        for user in [self.user1, self.user2, self.user3]:
+            graph.get_followed(user.pk)
+        self.assertEqual(2, len(graph.followed))
+        self.assertIsNone(graph.followed.get(self.user1.pk))
+
+    def test_visibility_without_follow_query(self):
+        self.assertEqual(['protected from user3'], self.get_texts('user3'))
+
+        # The followees of user1 are in memory, the ideas are read without checking the follows
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual([], self.get_texts('user2'))
+        self.assertEqual([], [query['sql'] for query in context.captured_queries if 'api_follow"' in query['sql']])
+        # Neither are the followees inlined in the query of the ideas
+        ideas = [query['sql'] for query in context.captured_queries if 'FROM "api_idea"' in query['sql']]
+        self.assertEqual([], [sql for sql in ideas if '"api_idea"."user_id" IN' in sql])
+
+        self.assertEqual([], self.get_texts('nobody'))
+
+    def test_follow_events(self):
+        self.assertEqual([], self.get_texts('user2'))
+
+        FollowRequest.objects.create(from_user=self.user1, to_user=self.user2, status='pending')
+        self.query_as(self.token_user2, '''
+            mutation{
+                updateFollowRequest(followRequestData: {fromUser: "user1", status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            ''')
+        self.assertEqual(['protected from user2'], self.get_texts('user2'))
+
+        self.query_as(self.token_user1, 'mutation{ deleteFollowed(followed: "user2"){ followedCount } }')
+        self.assertEqual([], self.get_texts('user2'))
+
+    def test_rolled_back_follow(self):
+        self.assertEqual([], self.get_texts('user2'))
+
+        # The transaction of the test is never committed, so the index does not change
+        FollowRequest.objects.create(from_user=self.user1, to_user=self.user2, status='pending')
+        response = self.query(
+            '''
+            mutation{
+                respondToFollowRequests(decisions: [{fromUser: "user1", status: "accepted"}]){
+                    followRequests{
+                        status
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user2}'}
+        )
+        self.assertResponseNoErrors(response)
+        self.assertEqual([self.user3.pk], list(follow_graph.get_followed(self.user1)))
+
+    def test_deleted_user(self):
+        self.assertEqual(['protected from user3'], self.get_texts('user3'))
+
+        self.query_as(self.token_user3, 'mutation{ deleteUser{ user{ username } } }')
+        self.assertIsNone(follow_graph.get_follow_graph().followed.get(self.user1.pk))
+
+    @override_settings(FOLLOW_GRAPH={'ENABLED': False})
+    def test_disabled(self):
+        self.assertEqual(['protected from user3'], self.get_texts('user3'))
+        self.assertIsNone(follow_graph._graph)
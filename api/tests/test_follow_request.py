@@ -1,7 +1,13 @@
 import json
 from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
-from api.models import FollowRequest, Profile
+from api.auth import get_tokens_cache
+from api.counters import reconcile
+from api.models import User, FollowRequest, Follow, Suggestion
 from .utils import create_user
 
 
@@ -11,6 +17,10 @@ class TestIdea(GraphQLTestCase):
     def setUpTestData(cls):
         cls.token_user1, cls.token_user2, cls.token_user3 = cls.create_data()
 
+    def setUp(self):
+        # Responses cached by a previous test
+        cache.clear()
+
     def test_create_follow_request(self):
         # Do query
         response = self.query(
@@ -73,10 +83,8 @@ class TestIdea(GraphQLTestCase):
 
         # Check response and database
         follow_request = FollowRequest.objects.get(from_user__username='user1', to_user__username='user2')
-        profile1 = Profile.objects.get(user__username='user1')
-        profile2 = Profile.objects.get(user__username='user2')
-        followers_user2 = profile2.followers.values_list('username', flat=True)
-        followed_user1 = profile1.followed.values_list('username', flat=True)
+        followers_user2 = Follow.objects.filter(followee__username='user2').values_list('follower__username', flat=True)
+        followed_user1 = Follow.objects.filter(follower__username='user1').values_list('followee__username', flat=True)
         self.assertResponseNoErrors(response)
         self.assertEqual(
             content['data']['updateFollowRequest']['followRequest']['status'],
@@ -109,10 +117,8 @@ class TestIdea(GraphQLTestCase):
 
         # Check response and database
         follow_request = FollowRequest.objects.get(from_user__username='user1', to_user__username='user3')
-        profile1 = Profile.objects.get(user__username='user1')
-        profile3 = Profile.objects.get(user__username='user3')
-        followers_user3 = profile3.followers.values_list('username', flat=True)
-        followed_user1 = profile1.followed.values_list('username', flat=True)
+        followers_user3 = Follow.objects.filter(followee__username='user3').values_list('follower__username', flat=True)
+        followed_user1 = Follow.objects.filter(follower__username='user1').values_list('followee__username', flat=True)
         self.assertResponseNoErrors(response)
         self.assertEqual(
             content['data']['updateFollowRequest']['followRequest']['status'],
@@ -121,15 +127,44 @@ class TestIdea(GraphQLTestCase):
         self.assertEqual('user1' in followers_user3, False)
         self.assertEqual('user2' in followed_user1, False)
 
+    def test_get_requests_joins_selected_users(self):
+        # Do query
+        with CaptureQueriesContext(connection) as context:
+            response = self.query(
+                '''
+                query{
+                    requests(status: "pending"){
+                        status
+                        ...requester
+                    }
+                }
+                fragment requester on FollowRequestType{
+                    fromUser{
+                        username
+                    }
+                }
+                ''',
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+            )
+        content = json.loads(response.content)
+
+        # Check response and that the requesters are read in the same query as the requests
+        self.assertResponseNoErrors(response)
+        self.assertEqual('user1', content['data']['requests'][0]['fromUser']['username'])
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(1, len([sql for sql in queries if 'api_followrequest' in sql]))
+        self.assertEqual([], [sql for sql in queries if '"api_user"."id" IN' in sql])
+
     def test_delete_follower(self):
         # Do query
         response = self.query(
             '''
             mutation{
                 deleteFollower(follower: "user2"){
-                    followers{
+                    follower{
                         username
                     }
+                    followersCount
                 }
             }
             ''',
@@ -138,10 +173,10 @@ class TestIdea(GraphQLTestCase):
 
         # Check response and database
         self.assertResponseNoErrors(response)
-        profile2 = Profile.objects.get(user__username='user2')
-        profile3 = Profile.objects.get(user__username='user3')
-        followers_user3 = profile3.followers.values_list('username', flat=True)
-        followed_user2 = profile2.followed.values_list('username', flat=True)
+        content = json.loads(response.content)
+        self.assertEqual({'follower': {'username': 'user2'}, 'followersCount': 0}, content['data']['deleteFollower'])
+        followers_user3 = Follow.objects.filter(followee__username='user3').values_list('follower__username', flat=True)
+        followed_user2 = Follow.objects.filter(follower__username='user2').values_list('followee__username', flat=True)
         self.assertEqual('user2' in followers_user3, False)
         self.assertEqual('user3' in followed_user2, False)
 
@@ -151,9 +186,10 @@ class TestIdea(GraphQLTestCase):
             '''
             mutation{
                 deleteFollowed(followed: "user3"){
-                    allFollowed{
+                    followed{
                         username
                     }
+                    followedCount
                 }
             }
             ''',
@@ -162,13 +198,152 @@ class TestIdea(GraphQLTestCase):
 
         # Check response and database
         self.assertResponseNoErrors(response)
-        profile2 = Profile.objects.get(user__username='user2')
-        profile3 = Profile.objects.get(user__username='user3')
-        followers_user3 = profile3.followers.values_list('username', flat=True)
-        followed_user2 = profile2.followed.values_list('username', flat=True)
+        content = json.loads(response.content)
+        self.assertEqual({'followed': {'username': 'user3'}, 'followedCount': 0}, content['data']['deleteFollowed'])
+        followers_user3 = Follow.objects.filter(followee__username='user3').values_list('follower__username', flat=True)
+        followed_user2 = Follow.objects.filter(follower__username='user2').values_list('followee__username', flat=True)
         self.assertEqual('user2' in followers_user3, False)
         self.assertEqual('user3' in followed_user2, False)
 
+    def test_paginate_followers(self):
+        """ The followers of an user (user3), newest first, two at a time and each page in a single query """
+        for number in range(4, 8):
+            user, profile, token = create_user(f'user{number}', f'user{number}@gmail.com', f'user{number}')
+            Follow.objects.create(follower=user, followee=User.objects.get(username='user3'))
+        reconcile()
+        query = '''
+            query followers($after: String){
+                followersByUser(first: 2, after: $after){
+                    edges{
+                        node{
+                            username
+                            followersCount
+                        }
+                    }
+                    pageInfo{
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+            '''
+        # Authenticated before counting the queries
+        self.query('{ __typename }', headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'})
+
+        usernames = []
+        after = None
+        has_next_page = True
+        while has_next_page:
+            with CaptureQueriesContext(connection) as context:
+                response = self.query(
+                    query,
+                    variables={'after': after},
+                    headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+                )
+            self.assertResponseNoErrors(response)
+            self.assertEqual(1, len(context.captured_queries))
+            content = json.loads(response.content)['data']['followersByUser']
+            usernames.extend(edge['node']['username'] for edge in content['edges'])
+            after = content['pageInfo']['endCursor']
+            has_next_page = content['pageInfo']['hasNextPage']
+
+        self.assertEqual(['user7', 'user6', 'user5', 'user4', 'user2'], usernames)
+
+    def test_respond_to_follow_requests(self):
+        def respond(usernames, status):
+            decisions = ', '.join(f'{{fromUser: "{username}", status: "{status}"}}' for username in usernames)
+            # The user is loaded in every call
+            get_tokens_cache().clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.query(
+                    f'''
+                    mutation{{
+                        respondToFollowRequests(decisions: [{decisions}]){{
+                            followRequests{{
+                                fromUser{{
+                                    username
+                                }}
+                                status
+                            }}
+                        }}
+                    }}
+                    ''',
+                    headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+                )
+            self.assertResponseNoErrors(response)
+            follow_requests = json.loads(response.content)['data']['respondToFollowRequests']['followRequests']
+            return follow_requests, len(context.captured_queries)
+
+        user3 = User.objects.get(username='user3')
+        usernames = [f'follower{number}' for number in range(20)]
+        for username in usernames:
+            user, profile, token = create_user(username, f'{username}@gmail.com', username)
+            FollowRequest.objects.create(from_user=user, to_user=user3)
+
+        follow_requests, queries = respond(['user1'], 'accepted')
+        self.assertEqual([{'fromUser': {'username': 'user1'}, 'status': 'ACCEPTED'}], follow_requests)
+        follow_requests, batch_queries = respond(usernames[:10], 'accepted')
+        self.assertEqual(10, len(follow_requests))
+        # The query count does not depend on the number of decisions
+        self.assertEqual(queries, batch_queries)
+        respond(usernames[10:], 'rejected')
+
+        followers = Follow.objects.filter(followee__username='user3').values_list('follower__username', flat=True)
+        self.assertEqual({'user1', 'user2', *usernames[:10]}, set(followers))
+        self.assertEqual(10, FollowRequest.objects.filter(to_user__username='user3', status='rejected').count())
+
+        # The decided requests are not changed again
+        follow_requests, queries = respond(['user1'], 'rejected')
+        self.assertEqual('ACCEPTED', follow_requests[0]['status'])
+
+    def test_respond_to_follow_requests_on_commit(self):
+        def respond(usernames):
+            decisions = ', '.join(f'{{fromUser: "{username}", status: "accepted"}}' for username in usernames)
+            # The user is loaded in every call, and the handlers of the follows are run in the same count
+            get_tokens_cache().clear()
+            with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+                response = self.query(
+                    f'mutation{{ respondToFollowRequests(decisions: [{decisions}]){{ followRequests{{ status }} }} }}',
+                    headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+                )
+            self.assertResponseNoErrors(response)
+            return len(context.captured_queries)
+
+        user1, user3 = User.objects.get(username='user1'), User.objects.get(username='user3')
+        usernames = [f'follower{number}' for number in range(43)]
+        for username in usernames:
+            user, profile, token = create_user(username, f'{username}@gmail.com', username)
+            FollowRequest.objects.create(from_user=user, to_user=user3)
+            # The suggestions of user1 change with every follow
+            Follow.objects.create(follower=user1, followee=user)
+
+        # The first follow adds user3 to the suggestions of user1, the next ones increment its mutual follows
+        respond(usernames[:1])
+        queries = respond(usernames[1:3])
+        self.assertEqual(queries, respond(usernames[3:]))
+        self.assertEqual(43, Suggestion.objects.get(user=user1, suggested=user3).mutual)
+
+    @override_settings(MUTATIONS={'MAX_BATCH_SIZE': 1})
+    def test_respond_to_follow_requests_limit(self):
+        response = self.query(
+            '''
+            mutation{
+                respondToFollowRequests(decisions: [
+                    {fromUser: "user1", status: "accepted"}, {fromUser: "user2", status: "accepted"}
+                ]){
+                    followRequests{
+                        status
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+        )
+        self.assertEqual(
+            'Argument "decisions" must have at most 1 items',
+            json.loads(response.content)['errors'][0]['message']
+        )
+
     @staticmethod
     def create_data():
         user1, profile1, token1 = create_user('user1', 'user1@gmail.com', 'user1')
@@ -179,7 +354,7 @@ class TestIdea(GraphQLTestCase):
         FollowRequest.objects.create(from_user=user1, to_user=user3, status='pending')
 
         # User2 follow user3
-        profile3.followers.add(user2)
-        profile2.followed.add(user2)
+        Follow.objects.create(follower=user2, followee=user3)
+        reconcile()
 
         return token1, token2, token3
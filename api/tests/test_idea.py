@@ -1,8 +1,15 @@
 import json
+from unittest import mock
 from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.db import connection
 from django.db.models import Q
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
-from api.models import Idea, Profile
+from api.auth import get_tokens_cache
+from api.models import Idea, Follow
+from api.timeline import rebuild_timeline, fan_out_idea
 from .utils import create_user
 
 
@@ -12,6 +19,10 @@ class TestIdea(GraphQLTestCase):
     def setUpTestData(cls):
         cls.token_user1, cls.token_user2, cls.token_user3 = cls.create_data()
 
+    def setUp(self):
+        # Responses cached by a previous test
+        cache.clear()
+
     def test_create_idea(self):
         # Do query
         response = self.query(
@@ -38,6 +49,91 @@ class TestIdea(GraphQLTestCase):
         self.assertEqual(content['data']['createIdea']['idea']['visibility'], idea.visibility.upper())
         self.assertEqual(content['data']['createIdea']['idea']['text'], idea.text)
 
+    def test_create_idea_rolled_back(self):
+        # The idea is not created without its timeline entries
+        with mock.patch('api.timeline.fan_out_idea', side_effect=RuntimeError('fan-out failed')):
+            response = self.query(
+                'mutation{ createIdea(ideaData: {text: "new_idea", visibility: "public"}){ idea{ text } } }',
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+        self.assertEqual('fan-out failed', json.loads(response.content)['errors'][0]['message'])
+        self.assertFalse(Idea.objects.filter(text='new_idea').exists())
+
+    def test_create_ideas(self):
+        def create_ideas(count):
+            ideas = ', '.join(
+                f'{{text: "batch idea {number}", visibility: "{("public", "protected", "private")[number % 3]}"}}'
+                for number in range(count)
+            )
+            # The user is loaded in every call
+            get_tokens_cache().clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.query(
+                    f'''
+                    mutation{{
+                        createIdeas(ideas: [{ideas}]){{
+                            ideas{{
+                                text
+                                visibility
+                            }}
+                        }}
+                    }}
+                    ''',
+                    headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+                )
+            self.assertResponseNoErrors(response)
+            return json.loads(response.content)['data']['createIdeas']['ideas'], len(context.captured_queries)
+
+        ideas, queries = create_ideas(3)
+        self.assertEqual(['batch idea 0', 'batch idea 1', 'batch idea 2'], [idea['text'] for idea in ideas])
+        self.assertEqual(3, Idea.objects.filter(user__username='user3', text__startswith='batch idea').count())
+        # The query count does not depend on the number of ideas
+        self.assertEqual(queries, create_ideas(30)[1])
+
+        # The protected ideas are in the timeline of the followers
+        response = self.query(
+            '''
+            {
+                allIdeas(first: 100){
+                    edges{
+                        node{
+                            text
+                        }
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user2}'}
+        )
+        texts = [edge['node']['text'] for edge in json.loads(response.content)['data']['allIdeas']['edges']]
+        self.assertIn('batch idea 1', texts)
+        self.assertIn('batch idea 0', texts)
+        self.assertNotIn('batch idea 2', texts)
+
+    @override_settings(MUTATIONS={'MAX_BATCH_SIZE': 2})
+    def test_create_ideas_limit(self):
+        response = self.query(
+            '''
+            mutation{
+                createIdeas(ideas: [
+                    {text: "a", visibility: "public"},
+                    {text: "b", visibility: "public"},
+                    {text: "c", visibility: "public"}
+                ]){
+                    ideas{
+                        text
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user3}'}
+        )
+        self.assertEqual(
+            'Argument "ideas" must have at most 2 items',
+            json.loads(response.content)['errors'][0]['message']
+        )
+        self.assertFalse(Idea.objects.filter(text__in=['a', 'b', 'c']).exists())
+
     def test_update_visibility(self):
         # Do query
         response = self.query(
@@ -91,10 +187,14 @@ class TestIdea(GraphQLTestCase):
             '''
             {
                 ideas{
-                    text
-                    visibility
-                    user{
-                        username
+                    edges{
+                        node{
+                            text
+                            visibility
+                            user{
+                                username
+                            }
+                        }
                     }
                 }
             }
@@ -106,8 +206,8 @@ class TestIdea(GraphQLTestCase):
         # Check response and database
         self.assertResponseNoErrors(response)
         ideas = Idea.objects.filter(user__username='user1')
-        self.assertEqual(len(ideas), len(content['data']['ideas']))
-        self.assertEqual('user1', content['data']['ideas'][0]['user']['username'])
+        self.assertEqual(len(ideas), len(content['data']['ideas']['edges']))
+        self.assertEqual('user1', content['data']['ideas']['edges'][0]['node']['user']['username'])
 
     def test_get_from_other_user(self):
         """ An user (user1) wants to get the ideas from a followed user (user2) """
@@ -116,10 +216,14 @@ class TestIdea(GraphQLTestCase):
             '''
             {
                 ideas(username: "user2"){
-                    text
-                    visibility
-                    user{
-                        username
+                    edges{
+                        node{
+                            text
+                            visibility
+                            user{
+                                username
+                            }
+                        }
                     }
                 }
             }
@@ -134,8 +238,40 @@ class TestIdea(GraphQLTestCase):
             Q(user__username='user2', visibility='public')
             | Q(user__username='user2', visibility='protected')
         ).order_by('-created_date')
-        self.assertEqual(len(ideas), len(content['data']['ideas']))
-        self.assertEqual('user2', content['data']['ideas'][0]['user']['username'])
+        self.assertEqual(len(ideas), len(content['data']['ideas']['edges']))
+        self.assertEqual('user2', content['data']['ideas']['edges'][0]['node']['user']['username'])
+
+    def test_ideas_visible_to_the_viewer(self):
+        """ The follow of the author is checked in the same query as the ideas """
+        query = '''
+            query ideas($username: String){
+                ideas(username: $username){
+                    edges{
+                        node{
+                            text
+                        }
+                    }
+                }
+            }
+            '''
+
+        def get_texts(token, username):
+            # Authenticated before counting the queries
+            self.query('{ __typename }', headers={'HTTP_AUTHORIZATION': f'JWT {token}'})
+            with CaptureQueriesContext(connection) as context:
+                response = self.query(
+                    query, variables={'username': username}, headers={'HTTP_AUTHORIZATION': f'JWT {token}'}
+                )
+            self.assertResponseNoErrors(response)
+            self.assertEqual(1, len(context.captured_queries))
+            return [edge['node']['text'] for edge in json.loads(response.content)['data']['ideas']['edges']]
+
+        # User3 does not follow user2, user2 follows user3
+        self.assertEqual([], get_texts(self.token_user3, 'user2'))
+        self.assertEqual(['idea1 from user3'], get_texts(self.token_user2, 'user3'))
+        self.assertEqual(['idea2 from user1'], get_texts(self.token_user2, 'user1'))
+        # The private ideas are only visible for their author
+        self.assertEqual(['idea2 from user1', 'idea1 from user1'], get_texts(self.token_user1, 'user1'))
 
     def test_get_all_ideas(self):
         """
@@ -147,10 +283,14 @@ class TestIdea(GraphQLTestCase):
             '''
             {
                 allIdeas{
-                    text
-                    visibility
-                    user{
-                        username
+                    edges{
+                        node{
+                            text
+                            visibility
+                            user{
+                                username
+                            }
+                        }
                     }
                 }
             }
@@ -161,14 +301,104 @@ class TestIdea(GraphQLTestCase):
 
         # Check response and database
         self.assertResponseNoErrors(response)
-        request_profile = Profile.objects.get(user__username='user1')
-        followed_list = request_profile.followed.values_list('username', flat=True)
+        followed_list = Follow.objects.filter(follower__username='user1').values_list('followee__username', flat=True)
         ideas = Idea.objects.filter(
             Q(visibility='public')
             | Q(user__username='user1')
             | Q(user__username__in=followed_list, visibility='protected')
         ).order_by('-created_date')
-        self.assertEqual(len(ideas), len(content['data']['allIdeas']))
+        self.assertEqual(len(ideas), len(content['data']['allIdeas']['edges']))
+
+    def test_paginate_all_ideas(self):
+        """ An user (user1) reads its timeline one idea at a time, following the cursors """
+        query = '''
+            query allIdeas($after: String){
+                allIdeas(first: 1, after: $after){
+                    edges{
+                        node{
+                            text
+                        }
+                    }
+                    pageInfo{
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+            '''
+        texts = []
+        after = None
+        has_next_page = True
+        while has_next_page:
+            response = self.query(
+                query,
+                variables={'after': after},
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+            self.assertResponseNoErrors(response)
+            content = json.loads(response.content)['data']['allIdeas']
+            self.assertEqual(1, len(content['edges']))
+            texts.append(content['edges'][0]['node']['text'])
+            after = content['pageInfo']['endCursor']
+            has_next_page = content['pageInfo']['hasNextPage']
+
+        # Same ideas, same order and no duplicates than the full timeline
+        expected = Idea.objects.filter(
+            Q(visibility='public')
+            | Q(user__username='user1')
+            | Q(user__username__in=['user2', 'user3'], visibility='protected')
+        ).order_by('-created_date', '-id').values_list('text', flat=True)
+        self.assertEqual(list(expected), texts)
+
+    def test_all_ideas_query_count(self):
+        """ The authors of the ideas are loaded in a single query, whatever the number of ideas """
+        def count_queries():
+            # Without the cached response and user
+            cache.clear()
+            get_tokens_cache().clear()
+            with CaptureQueriesContext(connection) as context:
+                response = self.query(
+                    '''
+                    {
+                        allIdeas{
+                            edges{
+                                node{
+                                    text
+                                    user{
+                                        username
+                                    }
+                                }
+                            }
+                        }
+                    }
+                    ''',
+                    headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+                )
+            self.assertResponseNoErrors(response)
+            return len(context.captured_queries)
+
+        queries = count_queries()
+        for number in range(4, 10):
+            user, profile, token = create_user(f'user{number}', f'user{number}@gmail.com', f'user{number}')
+            fan_out_idea(Idea.objects.create(user=user, text=f'idea1 from user{number}', visibility='public'))
+
+        self.assertEqual(queries, count_queries())
+
+    def test_invalid_cursor(self):
+        response = self.query(
+            '''
+            {
+                allIdeas(after: "not-a-cursor"){
+                    edges{
+                        cursor
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+        )
+
+        self.assertResponseHasErrors(response)
 
     @staticmethod
     def create_data():
@@ -177,16 +407,14 @@ class TestIdea(GraphQLTestCase):
         user3, profile3, token3 = create_user('user3', 'user3@gmail.com', 'user3')
 
         # User1 follow user2 and user3, user2 follow user3
-        profile1.followed.add(user2)
-        profile1.followed.add(user3)
-        profile2.followers.add(user1)
-        profile3.followers.add(user1)
-        profile2.followed.add(user3)
-        profile3.followers.add(user2)
+        Follow.objects.create(follower=user1, followee=user2)
+        Follow.objects.create(follower=user1, followee=user3)
+        Follow.objects.create(follower=user2, followee=user3)
 
         Idea.objects.create(user=user1, text='idea1 from user1', visibility='private')
         Idea.objects.create(user=user1, text='idea2 from user1', visibility='public')
         Idea.objects.create(user=user2, text='idea1 from user2', visibility='protected')
         Idea.objects.create(user=user3, text='idea1 from user3', visibility='protected')
+        rebuild_timeline()
 
         return token1, token2, token3
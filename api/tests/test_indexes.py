@@ -0,0 +1,41 @@
+from unittest import skipUnless
+
+from django.db import connection, IntegrityError
+from django.test import TestCase
+
+from api.models import Idea, FollowRequest
+from .utils import create_user
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans checked with the SQLite EXPLAIN QUERY PLAN output')
+class TestIndexes(TestCase):
+    """ The hot filters of the resolvers are served by their composite index """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, profile1, token1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, profile2, token2 = create_user('user2', 'user2@gmail.com', 'user2')
+        FollowRequest.objects.create(from_user=cls.user1, to_user=cls.user2)
+
+    def assertUsesIndex(self, queryset, index):
+        self.assertIn(f'USING INDEX {index}', queryset.explain())
+
+    def test_ideas_of_user(self):
+        ideas = Idea.objects.filter(user=self.user1).order_by('-created_date', '-id')
+        self.assertUsesIndex(ideas, 'idea_user_date_idx')
+
+    def test_ideas_of_user_by_visibility(self):
+        ideas = Idea.objects.filter(user=self.user1, visibility='protected').order_by('-created_date', '-id')
+        self.assertUsesIndex(ideas, 'idea_user_visibility_date_idx')
+
+    def test_public_ideas(self):
+        ideas = Idea.objects.filter(visibility='public').order_by('-created_date', '-id')
+        self.assertUsesIndex(ideas, 'idea_visibility_date_idx')
+
+    def test_requests_by_status(self):
+        requests = FollowRequest.objects.filter(to_user=self.user2, status='pending')
+        self.assertUsesIndex(requests, 'request_to_user_status_idx')
+
+    def test_unique_follow_request(self):
+        with self.assertRaises(IntegrityError):
+            FollowRequest.objects.create(from_user=self.user1, to_user=self.user2)
@@ -0,0 +1,97 @@
+import json
+from unittest import mock
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api import metrics
+from api.instrumentation import _recorder
+from api.models import Idea, Follow
+from .utils import create_user
+
+
+@override_settings(SQL_INSTRUMENTATION={'SAMPLE_RATE': 1})
+class TestInstrumentation(GraphQLTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        user2, _, _ = create_user('user2', 'user2@gmail.com', 'user2')
+        Follow.objects.create(follower=user2, followee=cls.user1)
+        Idea.objects.create(text='idea', visibility='public', user=cls.user1)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def query_as_user1(self, query):
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            response = self.query(query, headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'})
+        self.assertResponseNoErrors(response)
+        self.assertEqual(1, len(logs.records))
+        return json.loads(logs.records[0].getMessage())
+
+    def test_operation(self):
+        data = self.query_as_user1('''
+            query timeline{
+                allIdeas{
+                    edges{
+                        node{
+                            text
+                        }
+                    }
+                }
+            }
+            ''')
+        self.assertEqual('timeline', data['operation'])
+        self.assertGreater(data['queries'], 0)
+        self.assertEqual(0, data['duplicates'])
+        # Recorded only while the operation is executed
+        self.assertIsNone(_recorder.get())
+
+        self.assertEqual(1, metrics.get_metrics()['sql.timeline.operations'])
+        self.assertEqual(data['queries'], metrics.get_metrics()['sql.timeline.queries'])
+
+    def test_duplicates(self):
+        data = self.query_as_user1('''
+            {
+                first: followersByUser{
+                    edges{
+                        node{
+                            username
+                        }
+                    }
+                }
+                second: followersByUser{
+                    edges{
+                        node{
+                            username
+                        }
+                    }
+                }
+            }
+            ''')
+        self.assertEqual('anonymous', data['operation'])
+        self.assertEqual(2, data['queries'])
+        self.assertEqual(1, data['duplicates'])
+        self.assertEqual(2, data['duplicated_statements'][0]['count'])
+
+    @override_settings(SQL_INSTRUMENTATION={'SAMPLE_RATE': 0})
+    def test_not_sampled(self):
+        with self.assertNoLogs('api.instrumentation'):
+            response = self.query(
+                '{ followersByUser{ edges{ node{ username } } } }',
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+        self.assertResponseNoErrors(response)
+        self.assertFalse([name for name in metrics.get_metrics() if name.startswith('sql.')])
+
+    @override_settings(SQL_INSTRUMENTATION={'SAMPLE_RATE': 1, 'MAX_OPERATIONS': 1})
+    def test_operation_names_bounded(self):
+        with mock.patch('api.instrumentation._operations', set()):
+            for name in ('first', 'second', 'third'):
+                self.query_as_user1(f'query {name}{{ followersByUser{{ edges{{ node{{ username }} }} }} }}')
+
+        operations = {name.split('.')[1] for name in metrics.get_metrics() if name.startswith('sql.')}
+        self.assertEqual({'first', 'other'}, operations)
+        self.assertEqual(2, metrics.get_metrics()['sql.other.operations'])
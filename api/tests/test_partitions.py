@@ -0,0 +1,80 @@
+from datetime import date, datetime, timezone
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from api import partitions
+from api.models import Profile, Idea, TimelineEntry
+from api.partitions import add_months, get_bound, get_partition_month, get_partition_name
+from .utils import create_user
+
+
+class TestPartitions(TestCase):
+
+    def test_months(self):
+        self.assertEqual(date(2027, 1, 1), add_months(date(2026, 11, 1), 2))
+        self.assertEqual(date(2025, 12, 1), add_months(date(2026, 1, 1), -1))
+
+    def test_partition_names(self):
+        self.assertEqual('api_idea_y2026m03', get_partition_name(date(2026, 3, 1)))
+        self.assertEqual(date(2026, 3, 1), get_partition_month('api_idea_y2026m03'))
+        self.assertIsNone(get_partition_month('api_idea_default'))
+
+    @skipIf(connection.vendor == 'postgresql', 'The commands only fail without PostgreSQL')
+    def test_postgresql_only(self):
+        # The test database is SQLite
+        with self.assertRaises(CommandError):
+            call_command('partition_ideas', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('archive_ideas', '2025-01', stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The ideas can only be partitioned in PostgreSQL')
+class TestPartitionedIdeas(TestCase):
+
+    def setUp(self):
+        self.user, _, _ = create_user('user1', 'user1@gmail.com', 'user1')
+        self.current = partitions.month_start(datetime.now(timezone.utc))
+        self.old = Idea.objects.create(user=self.user, text='old', created_date=get_bound(add_months(self.current, -2)))
+        self.new = Idea.objects.create(user=self.user, text='new')
+        for idea in [self.old, self.new]:
+            TimelineEntry.objects.create(owner=None, idea=idea, created_date=idea.created_date)
+
+    def count(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
+
+    def test_convert_and_detach(self):
+        partitions.convert(1)
+
+        self.assertTrue(partitions.is_partitioned())
+        self.assertEqual([add_months(self.current, count) for count in range(-2, 2)], partitions.get_partitions())
+        self.assertEqual(['new', 'old'], list(Idea.objects.order_by('-created_date').values_list('text', flat=True)))
+        self.assertEqual(1, self.count(get_partition_name(add_months(self.current, -2))))
+
+        # An idea beyond the partitions goes to the default one, and is moved to its partition once created
+        future = Idea.objects.create(user=self.user, text='future', created_date=get_bound(add_months(self.current, 2)))
+        self.assertEqual(1, self.count(partitions.DEFAULT_PARTITION))
+        self.assertEqual([get_partition_name(add_months(self.current, 2))], partitions.create_partitions(2))
+        self.assertEqual(0, self.count(partitions.DEFAULT_PARTITION))
+        self.assertEqual(future, Idea.objects.get(text='future'))
+
+        names = partitions.detach_partitions(self.current)
+        self.assertEqual([get_partition_name(add_months(self.current, count)) for count in [-2, -1]], names)
+        self.assertEqual(['future', 'new'], list(Idea.objects.order_by('text').values_list('text', flat=True)))
+        self.assertFalse(TimelineEntry.objects.filter(idea_id=self.old.pk).exists())
+        self.assertEqual(2, Profile.objects.get(user=self.user).idea_count)
+
+    def test_delete_author_of_archived_ideas(self):
+        partitions.convert(0)
+        partitions.detach_partitions(self.current)
+
+        # The archived ideas don't reference the users, the deferred constraints are checked as in a commit
+        self.user.delete()
+        connection.check_constraints()
+        self.assertEqual(1, self.count(get_partition_name(add_months(self.current, -2))))
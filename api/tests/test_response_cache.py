@@ -0,0 +1,165 @@
+import json
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api import metrics
+from api.auth import get_tokens_cache
+from api.models import User, FollowRequest, Idea
+from .utils import create_user
+
+
+# Only the response cache metrics
+@override_settings(SQL_INSTRUMENTATION={'SAMPLE_RATE': 0})
+class TestResponseCache(GraphQLTestCase):
+    ALL_IDEAS = '''
+        {
+            allIdeas{
+                edges{
+                    node{
+                        text
+                    }
+                }
+            }
+        }
+        '''
+    FOLLOWERS = '''
+        {
+            followersByUser{
+                edges{
+                    node{
+                        username
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, _, cls.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        FollowRequest.objects.create(from_user=cls.user1, to_user=cls.user2, status='pending')
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def query(self, *args, **kwargs):
+        # The caches are invalidated once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().query(*args, **kwargs)
+
+    def query_as(self, token, query, variables=None):
+        response = self.query(query, variables=variables, headers={'HTTP_AUTHORIZATION': f'JWT {token}'})
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']
+
+    def get_timeline(self, token):
+        return [edge['node']['text'] for edge in self.query_as(token, self.ALL_IDEAS)['allIdeas']['edges']]
+
+    def create_idea(self, token, text, visibility):
+        self.query_as(
+            token,
+            '''
+            mutation createIdea($text: String!, $visibility: String!){
+                createIdea(ideaData: {text: $text, visibility: $visibility}){
+                    idea{
+                        id
+                    }
+                }
+            }
+            ''',
+            variables={'text': text, 'visibility': visibility}
+        )
+
+    def accept_user1(self):
+        self.query_as(
+            self.token_user2,
+            '''
+            mutation{
+                updateFollowRequest(followRequestData: {fromUser: "user1", status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            '''
+        )
+
+    def test_cached_response(self):
+        self.create_idea(self.token_user1, 'idea from user1', 'private')
+        self.assertEqual(['idea from user1'], self.get_timeline(self.token_user1))
+
+        # Not even the user is loaded, the formatting of the query does not matter
+        with CaptureQueriesContext(connection) as context:
+            data = self.query_as(self.token_user1, ' '.join(self.ALL_IDEAS.split()))
+        self.assertEqual(0, len(context.captured_queries))
+        self.assertEqual('idea from user1', data['allIdeas']['edges'][0]['node']['text'])
+        self.assertEqual({'response_cache.hits': 1, 'response_cache.misses': 1}, metrics.get_metrics())
+
+        # Cached per user
+        self.assertEqual([], self.get_timeline(self.token_user2))
+
+    def test_create_idea_invalidates_followers(self):
+        self.accept_user1()
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+        self.create_idea(self.token_user2, 'protected from user2', 'protected')
+        self.assertEqual(['protected from user2'], self.get_timeline(self.token_user1))
+
+        self.create_idea(self.token_user2, 'public from user2', 'public')
+        self.assertEqual(['public from user2', 'protected from user2'], self.get_timeline(self.token_user1))
+        self.assertEqual(0, metrics.get_metrics().get('response_cache.hits', 0))
+
+    def test_delete_idea_invalidates_on_commit(self):
+        self.create_idea(self.token_user1, 'idea from user1', 'private')
+        self.assertEqual(['idea from user1'], self.get_timeline(self.token_user1))
+        idea = Idea.objects.get(text='idea from user1')
+
+        # Until the delete is committed the cached responses are kept, so no read can cache the idea again
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = super().query(
+                'mutation deleteIdea($id: ID){ deleteIdea(id: $id){ idea{ text } } }',
+                variables={'id': idea.pk}, headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+        self.assertResponseNoErrors(response)
+        self.assertEqual(['idea from user1'], self.get_timeline(self.token_user1))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+    def test_follow_request_invalidates_follows(self):
+        self.assertEqual({'followersByUser': {'edges': []}}, self.query_as(self.token_user2, self.FOLLOWERS))
+
+        self.accept_user1()
+        self.assertEqual(
+            {'followersByUser': {'edges': [{'node': {'username': 'user1'}}]}},
+            self.query_as(self.token_user2, self.FOLLOWERS)
+        )
+
+    def test_update_user_invalidates_usernames(self):
+        self.accept_user1()
+        self.query_as(self.token_user2, self.FOLLOWERS)
+
+        self.query_as(self.token_user1, 'mutation{ updateUser(userData: {username: "renamed"}){ user{ username } } }')
+        self.assertEqual(
+            {'followersByUser': {'edges': [{'node': {'username': 'renamed'}}]}},
+            self.query_as(self.token_user2, self.FOLLOWERS)
+        )
+
+    def test_metrics_view(self):
+        self.get_timeline(self.token_user1)
+        self.get_timeline(self.token_user1)
+
+        # Only for staff users
+        self.assertEqual(403, self.client.get('/graphql/metrics/').status_code)
+        response = self.client.get('/graphql/metrics/', HTTP_AUTHORIZATION=f'JWT {self.token_user1}')
+        self.assertEqual(403, response.status_code)
+
+        User.objects.filter(pk=self.user1.pk).update(is_staff=True)
+        get_tokens_cache().clear()
+        response = self.client.get('/graphql/metrics/', HTTP_AUTHORIZATION=f'JWT {self.token_user1}')
+        self.assertEqual({'response_cache.hits': 1, 'response_cache.misses': 1}, json.loads(response.content))
@@ -0,0 +1,93 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test.utils import override_settings
+from graphene_django.utils.testing import GraphQLTestCase
+
+from api import response_cache, routers
+from api.models import Follow
+from .utils import create_user
+
+
+class RecordingRouter:
+    """ Records the databases chosen for the reads, which all go to the test database """
+    databases = []
+
+    def db_for_read(self, model, **hints):
+        self.databases.append(routers.ReplicaRouter().db_for_read(model, **hints))
+        return 'default'
+
+
+@override_settings(
+    DATABASE_ROUTERS=['api.tests.test_routers.RecordingRouter', 'api.routers.ReplicaRouter'],
+    REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 60},
+)
+class TestReplicaRouter(GraphQLTestCase):
+    TIMELINE = '{ allIdeas{ edges{ node{ text } } } }'
+    REQUESTS = '{ requests{ status } }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, _, cls.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        Follow.objects.create(follower=cls.user2, followee=cls.user1)
+
+    def setUp(self):
+        cache.clear()
+
+    def query(self, *args, **kwargs):
+        # The caches are invalidated once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().query(*args, **kwargs)
+
+    def get_databases(self, query, token):
+        """ Databases read by the operation """
+        headers = {'HTTP_AUTHORIZATION': f'JWT {token}'}
+        # The user is authenticated once, reading from the primary
+        self.query('{ __typename }', headers=headers)
+        RecordingRouter.databases = []
+        response = self.query(query, headers=headers)
+        self.assertResponseNoErrors(response)
+        return set(RecordingRouter.databases)
+
+    def create_idea(self, token):
+        return self.get_databases(
+            'mutation{ createIdea(ideaData: {text: "idea", visibility: "protected"}){ idea{ id } } }', token
+        )
+
+    def test_queries_read_from_replicas(self):
+        self.assertEqual({'replica'}, self.get_databases(self.REQUESTS, self.token_user1))
+
+    def test_mutations_use_primary(self):
+        self.assertEqual({'default'}, self.create_idea(self.token_user1))
+
+    def test_read_your_writes(self):
+        self.create_idea(self.token_user1)
+        self.assertEqual({'default'}, self.get_databases(self.REQUESTS, self.token_user1))
+        # Other users are not affected
+        self.assertEqual({'replica'}, self.get_databases(self.REQUESTS, self.token_user2))
+
+    @override_settings(REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 0})
+    def test_sticky_window(self):
+        self.create_idea(self.token_user1)
+        self.assertEqual({'replica'}, self.get_databases(self.REQUESTS, self.token_user1))
+
+    def test_recently_invalidated(self):
+        with override_settings(REPLICAS={'ALIASES': ['replica'], 'STICKY_SECONDS': 0}):
+            self.get_databases(self.TIMELINE, self.token_user2)
+        # The feed of the follower changes, its next response is read from the primary
+        self.create_idea(self.token_user1)
+        self.assertEqual({'default'}, self.get_databases(self.TIMELINE, self.token_user2))
+
+    def test_without_replicas(self):
+        with override_settings(REPLICAS={'ALIASES': [], 'STICKY_SECONDS': 60}):
+            self.assertEqual({'default'}, self.get_databases(self.REQUESTS, self.token_user1))
+
+    def test_get_read_database(self):
+        self.assertEqual('replica', routers.get_read_database(AnonymousUser(), 'query'))
+        self.assertEqual('default', routers.get_read_database(AnonymousUser(), 'mutation'))
+        self.assertEqual('default', routers.get_read_database(AnonymousUser(), None))
+        invalidated_at = response_cache.get_invalidated_at([response_cache.new_version()])
+        self.assertEqual('default', routers.get_read_database(self.user1, 'query', invalidated_at))
+        self.assertEqual('replica', routers.get_read_database(self.user1, 'query', invalidated_at - 60))
+        # Versions without time
+        self.assertEqual(0, response_cache.get_invalidated_at(['a' * 32]))
@@ -0,0 +1,137 @@
+import json
+from django.core.cache import cache
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql_jwt.shortcuts import get_token
+
+from api.models import Idea, Follow
+from .utils import create_user
+
+
+class TestSearch(GraphQLTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, cls.token = create_user('searcher', 'searcher@gmail.com', 'searcher')
+        for username in ['anna', 'annabel', 'ann', 'hannah', 'joanna', 'bob']:
+            create_user(username, f'{username}@gmail.com', username)
+
+    def search_users(self, query, first=None):
+        response = self.query(
+            '''
+            query searchUsers($query: String!, $first: Int){
+                searchUsers(query: $query, first: $first){
+                    username
+                }
+            }
+            ''',
+            variables={'query': query, 'first': first},
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token}'}
+        )
+        self.assertResponseNoErrors(response)
+        return [user['username'] for user in json.loads(response.content)['data']['searchUsers']]
+
+    def test_prefix_first(self):
+        # The prefix matches in alphabetical order, then the other matches
+        self.assertEqual(['ann', 'anna', 'annabel', 'hannah', 'joanna'], self.search_users('ann'))
+        self.assertEqual(['anna', 'annabel', 'hannah', 'joanna'], self.search_users('ANNA'))
+
+    def test_short_query_only_prefix(self):
+        self.assertEqual(['ann', 'anna', 'annabel'], self.search_users('an'))
+        self.assertEqual([], self.search_users('  '))
+
+    def test_bounded(self):
+        self.assertEqual(['ann', 'anna'], self.search_users('ann', first=2))
+        self.assertEqual(['ann', 'anna', 'annabel', 'hannah'], self.search_users('ann', first=4))
+
+
+class TestSearchIdeas(GraphQLTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, cls.token = create_user('reader', 'reader@gmail.com', 'reader')
+        followed, _, _ = create_user('followed', 'followed@gmail.com', 'followed')
+        stranger, _, _ = create_user('stranger', 'stranger@gmail.com', 'stranger')
+        Follow.objects.create(follower=cls.user, followee=followed)
+
+        for user, visibility in [(cls.user, 'private'), (followed, 'public'), (followed, 'protected'),
+                                 (followed, 'private'), (stranger, 'public'), (stranger, 'protected')]:
+            Idea.objects.create(text=f'Green tea by {user.username} ({visibility})', visibility=visibility, user=user)
+        Idea.objects.create(text='Black coffee', visibility='public', user=stranger)
+
+    def setUp(self):
+        cache.clear()
+
+    def query(self, *args, **kwargs):
+        # The caches are invalidated once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().query(*args, **kwargs)
+
+    def search_ideas(self, query, first=None, after=None):
+        response = self.query(
+            '''
+            query searchIdeas($query: String!, $first: Int, $after: String){
+                searchIdeas(query: $query, first: $first, after: $after){
+                    edges{
+                        node{
+                            text
+                        }
+                    }
+                    pageInfo{
+                        hasNextPage
+                        endCursor
+                    }
+                }
+            }
+            ''',
+            variables={'query': query, 'first': first, 'after': after},
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token}'}
+        )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['searchIdeas']
+
+    def search_texts(self, query):
+        return [edge['node']['text'] for edge in self.search_ideas(query)['edges']]
+
+    def test_visibility(self):
+        self.assertEqual([
+            'Green tea by stranger (public)',
+            'Green tea by followed (protected)',
+            'Green tea by followed (public)',
+            'Green tea by reader (private)',
+        ], self.search_texts('tea'))
+
+    def test_all_the_words(self):
+        self.assertEqual(['Green tea by stranger (public)'], self.search_texts('GREEN stranger'))
+        self.assertEqual(['Black coffee'], self.search_texts('coffee'))
+        self.assertEqual([], self.search_texts('green coffee'))
+        self.assertEqual([], self.search_texts('  '))
+
+    def test_paginate(self):
+        first_page = self.search_ideas('tea', first=3)
+        self.assertEqual(3, len(first_page['edges']))
+        self.assertTrue(first_page['pageInfo']['hasNextPage'])
+
+        second_page = self.search_ideas('tea', first=3, after=first_page['pageInfo']['endCursor'])
+        self.assertEqual(['Green tea by reader (private)'], [edge['node']['text'] for edge in second_page['edges']])
+        self.assertFalse(second_page['pageInfo']['hasNextPage'])
+
+    def test_updated_text(self):
+        idea = Idea.objects.get(text='Black coffee')
+        self.assertEqual(['Black coffee'], self.search_texts('coffee'))
+
+        response = self.query(
+            '''
+            mutation updateIdea($id: ID!){
+                updateIdea(ideaData: {id: $id, text: "Iced coffee"}){
+                    idea{
+                        text
+                    }
+                }
+            }
+            ''',
+            variables={'id': idea.pk},
+            headers={'HTTP_AUTHORIZATION': f'JWT {get_token(idea.user)}'}
+        )
+        self.assertResponseNoErrors(response)
+        self.assertEqual(['Iced coffee'], self.search_texts('coffee'))
+        self.assertEqual([], self.search_texts('black'))
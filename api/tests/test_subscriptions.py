@@ -0,0 +1,139 @@
+import json
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TransactionTestCase
+
+from api import subscriptions
+from api.models import Follow
+from api.schema import schema
+from api.views import AsyncGraphQLView
+from api.websocket import websocket_application
+from .utils import create_user
+
+
+class TestSubscriptions(TransactionTestCase):
+    SUBSCRIPTION = '''
+        subscription{
+            newIdeas{
+                text
+                visibility
+                user{
+                    username
+                }
+            }
+        }
+        '''
+
+    def setUp(self):
+        cache.clear()
+        subscriptions._subscribers = None
+        subscriptions._broker = None
+        self.user1, _, self.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        self.user2, _, self.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        self.user3, _, self.token_user3 = create_user('user3', 'user3@gmail.com', 'user3')
+        # User2 follows user1
+        Follow.objects.create(follower=self.user2, followee=self.user1)
+
+    async def connect(self, token, path='/graphql/'):
+        communicator = ApplicationCommunicator(websocket_application, {
+            'type': 'websocket', 'path': path, 'subprotocols': ['graphql-ws'],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual('websocket.accept', (await communicator.receive_output(1))['type'])
+        await self.send(communicator, {'type': 'connection_init', 'payload': {'authToken': token}})
+        return communicator
+
+    async def send(self, communicator, message):
+        await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self, communicator):
+        return json.loads((await communicator.receive_output(5))['text'])
+
+    async def subscribe(self, token):
+        communicator = await self.connect(token)
+        self.assertEqual({'type': 'connection_ack'}, await self.receive(communicator))
+        await self.send(communicator, {'type': 'start', 'id': '1', 'payload': {'query': self.SUBSCRIPTION}})
+        return communicator
+
+    async def create_idea(self, token, text, visibility):
+        request = AsyncRequestFactory().post(
+            '/graphql/',
+            json.dumps({
+                'query': 'mutation create($text: String, $visibility: String){ '
+                         'createIdea(ideaData: {text: $text, visibility: $visibility}){ idea{ id } } }',
+                'variables': {'text': text, 'visibility': visibility},
+            }),
+            content_type='application/json'
+        )
+        request.META['HTTP_AUTHORIZATION'] = f'JWT {token}'
+        request.user = AnonymousUser()
+        response = await AsyncGraphQLView.as_view(schema=schema)(request)
+        self.assertNotIn('errors', json.loads(response.content))
+
+    async def receive_idea(self, communicator):
+        message = await self.receive(communicator)
+        self.assertEqual('data', message['type'])
+        self.assertEqual('1', message['id'])
+        return message['payload']['data']['newIdeas']
+
+    async def test_new_ideas(self):
+        follower = await self.subscribe(self.token_user2)
+        other = await self.subscribe(self.token_user3)
+        author = await self.subscribe(self.token_user1)
+
+        await self.create_idea(self.token_user1, 'private', 'private')
+        await self.create_idea(self.token_user1, 'protected', 'protected')
+        await self.create_idea(self.token_user1, 'public', 'public')
+
+        self.assertEqual(
+            {'text': 'private', 'visibility': 'PRIVATE', 'user': {'username': 'user1'}},
+            await self.receive_idea(author)
+        )
+        self.assertEqual('protected', (await self.receive_idea(author))['text'])
+        self.assertEqual('public', (await self.receive_idea(author))['text'])
+        # Only the ideas each viewer is allowed to see
+        self.assertEqual('protected', (await self.receive_idea(follower))['text'])
+        self.assertEqual('public', (await self.receive_idea(follower))['text'])
+        self.assertEqual('public', (await self.receive_idea(other))['text'])
+
+        for communicator in [follower, other, author]:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(1)
+        self.assertEqual({}, subscriptions.get_subscribers().subscriptions)
+
+    async def test_stop(self):
+        communicator = await self.subscribe(self.token_user2)
+        await self.send(communicator, {'type': 'stop', 'id': '1'})
+        self.assertEqual({'type': 'complete', 'id': '1'}, await self.receive(communicator))
+
+        await self.create_idea(self.token_user1, 'public', 'public')
+        self.assertTrue(await communicator.receive_nothing(0.2))
+
+    async def test_invalid_token(self):
+        communicator = await self.connect('not-a-token')
+        self.assertEqual('connection_error', (await self.receive(communicator))['type'])
+
+        await self.send(communicator, {'type': 'start', 'id': '1', 'payload': {'query': self.SUBSCRIPTION}})
+        self.assertEqual('error', (await self.receive(communicator))['type'])
+
+    async def test_only_subscriptions(self):
+        communicator = await self.connect(self.token_user2)
+        self.assertEqual({'type': 'connection_ack'}, await self.receive(communicator))
+
+        await self.send(communicator, {'type': 'start', 'id': '1', 'payload': {'query': '{ users{ username } }'}})
+        self.assertEqual(
+            {'type': 'error', 'id': '1', 'payload': {'message': 'Only subscriptions are supported over WebSocket'}},
+            await self.receive(communicator)
+        )
+        await self.send(
+            communicator, {'type': 'start', 'id': '2', 'payload': {'query': 'subscription{ newIdeas{ unknown } }'}}
+        )
+        self.assertEqual('error', (await self.receive(communicator))['type'])
+
+    async def test_other_paths_rejected(self):
+        communicator = ApplicationCommunicator(websocket_application, {
+            'type': 'websocket', 'path': '/other/', 'subprotocols': ['graphql-ws'],
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual('websocket.close', (await communicator.receive_output(1))['type'])
@@ -0,0 +1,133 @@
+import json
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from api.counters import reconcile
+from api.models import Follow, FollowRequest, Suggestion
+from api.suggestions import rebuild_suggestions
+from .utils import create_user
+
+
+class TestSuggestions(GraphQLTestCase):
+    SUGGESTIONS = '''
+        query suggestedUsers($first: Int){
+            suggestedUsers(first: $first){
+                username
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        cls.tokens = {}
+        for number in range(1, 7):
+            username = f'user{number}'
+            cls.users[username], _, cls.tokens[username] = create_user(username, f'{username}@gmail.com', username)
+
+        # User1 follows user2 and user3, who both follow user4; user3 also follows user5 and user1
+        for follower, followee in [
+            ('user1', 'user2'), ('user1', 'user3'), ('user2', 'user4'), ('user3', 'user4'),
+            ('user3', 'user5'), ('user3', 'user1'), ('user6', 'user1'),
+        ]:
+            Follow.objects.create(follower=cls.users[follower], followee=cls.users[followee])
+        reconcile()
+        rebuild_suggestions()
+
+    def setUp(self):
+        cache.clear()
+
+    def query_as(self, username, query, variables=None):
+        # The suggestions are refreshed once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.query(
+                query, variables=variables, headers={'HTTP_AUTHORIZATION': f'JWT {self.tokens[username]}'}
+            )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']
+
+    def get_suggestions(self, username, first=None):
+        data = self.query_as(username, self.SUGGESTIONS, {'first': first})
+        return [user['username'] for user in data['suggestedUsers']]
+
+    def test_ranked_by_mutual_follows(self):
+        # Neither itself nor the users it already follows
+        self.assertEqual(['user4', 'user5'], self.get_suggestions('user1'))
+        self.assertEqual(['user4'], self.get_suggestions('user1', first=1))
+        self.assertEqual(2, Suggestion.objects.get(user=self.users['user1'], suggested=self.users['user4']).mutual)
+        self.assertEqual(['user2', 'user3'], self.get_suggestions('user6'))
+
+    def test_single_query(self):
+        self.get_suggestions('user1')
+
+        with CaptureQueriesContext(connection) as context:
+            self.get_suggestions('user1')
+        self.assertEqual(1, len(context.captured_queries))
+
+    def test_refreshed_on_follow(self):
+        FollowRequest.objects.create(from_user=self.users['user1'], to_user=self.users['user5'], status='pending')
+        self.query_as('user5', '''
+            mutation{
+                updateFollowRequest(followRequestData: {fromUser: "user1", status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            ''')
+
+        self.assertEqual(['user4'], self.get_suggestions('user1'))
+        # User1 is followed by user6, which is suggested the new followee of user1
+        self.assertEqual(['user2', 'user3', 'user5'], self.get_suggestions('user6'))
+
+    def test_refreshed_on_unfollow(self):
+        self.query_as('user1', 'mutation{ deleteFollowed(followed: "user2"){ followedCount } }')
+
+        self.assertEqual(['user4', 'user5'], self.get_suggestions('user1'))
+        self.assertEqual(1, Suggestion.objects.get(user=self.users['user1'], suggested=self.users['user4']).mutual)
+        self.assertEqual(['user3'], self.get_suggestions('user6'))
+
+    def follow(self, follower, followee):
+        FollowRequest.objects.create(from_user=self.users[follower], to_user=self.users[followee], status='pending')
+        self.query_as(followee, '''
+            mutation($fromUser: String){
+                updateFollowRequest(followRequestData: {fromUser: $fromUser, status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            ''', {'fromUser': follower})
+
+    def test_mutual_follows_incremented(self):
+        self.follow('user2', 'user5')
+
+        # Only the suggestions of the follower are recomputed, the ones of its followers are incremented
+        self.assertEqual(['user4', 'user5'], self.get_suggestions('user1'))
+        self.assertEqual(2, Suggestion.objects.get(user=self.users['user1'], suggested=self.users['user5']).mutual)
+
+    def test_deleted_user(self):
+        self.query_as('user3', 'mutation{ deleteUser{ user{ username } } }')
+
+        self.assertEqual(['user4'], self.get_suggestions('user1'))
+        self.assertEqual(1, Suggestion.objects.get(user=self.users['user1'], suggested=self.users['user4']).mutual)
+        self.assertEqual(['user2'], self.get_suggestions('user6'))
+
+        call_command('rebuild_suggestions', stdout=open('/dev/null', 'w'))
+        self.assertEqual(['user4'], self.get_suggestions('user1'))
+        self.assertEqual(['user2'], self.get_suggestions('user6'))
+
+    @override_settings(SUGGESTIONS={'MAX_SUGGESTIONS': 1})
+    def test_top_suggestions(self):
+        rebuild_suggestions()
+        self.assertEqual(['user4'], self.get_suggestions('user1'))
+        self.assertEqual(1, Suggestion.objects.filter(user=self.users['user1']).count())
+
+        # A new suggestion takes the place of the last one if it has more mutual follows
+        self.query_as('user3', 'mutation{ deleteFollowed(followed: "user4"){ followedCount } }')
+        self.follow('user2', 'user5')
+        self.assertEqual(['user5'], self.get_suggestions('user1'))
+        self.assertEqual(1, Suggestion.objects.filter(user=self.users['user1']).count())
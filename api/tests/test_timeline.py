@@ -0,0 +1,222 @@
+import json
+from io import StringIO
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.auth import get_tokens_cache
+from api.models import Idea, FollowRequest, Profile, TimelineEntry
+from .utils import create_user
+
+
+class TestTimeline(GraphQLTestCase):
+    ALL_IDEAS = '''
+        {
+            allIdeas(first: 100){
+                edges{
+                    node{
+                        text
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        cls.user2, _, cls.token_user2 = create_user('user2', 'user2@gmail.com', 'user2')
+        FollowRequest.objects.create(from_user=cls.user1, to_user=cls.user2, status='pending')
+
+    def setUp(self):
+        # Responses cached by a previous test, and users cached with the flags of its profile
+        cache.clear()
+        get_tokens_cache().clear()
+
+    def query(self, *args, **kwargs):
+        # The caches are invalidated once the mutations are committed
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().query(*args, **kwargs)
+
+    def get_timeline(self, token):
+        response = self.query(self.ALL_IDEAS, headers={'HTTP_AUTHORIZATION': f'JWT {token}'})
+        self.assertResponseNoErrors(response)
+        content = json.loads(response.content)
+        return [edge['node']['text'] for edge in content['data']['allIdeas']['edges']]
+
+    def create_idea(self, token, text, visibility):
+        response = self.query(
+            '''
+            mutation createIdea($text: String!, $visibility: String!){
+                createIdea(ideaData: {text: $text, visibility: $visibility}){
+                    idea{
+                        id
+                    }
+                }
+            }
+            ''',
+            variables={'text': text, 'visibility': visibility},
+            headers={'HTTP_AUTHORIZATION': f'JWT {token}'}
+        )
+        self.assertResponseNoErrors(response)
+        return json.loads(response.content)['data']['createIdea']['idea']['id']
+
+    def accept_user1(self):
+        response = self.query(
+            '''
+            mutation{
+                updateFollowRequest(followRequestData: {fromUser: "user1", status: "accepted"}){
+                    followRequest{
+                        status
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user2}'}
+        )
+        self.assertResponseNoErrors(response)
+
+    def test_fan_out_on_create(self):
+        self.create_idea(self.token_user2, 'public from user2', 'public')
+        self.create_idea(self.token_user2, 'private from user2', 'private')
+        self.create_idea(self.token_user1, 'private from user1', 'private')
+
+        self.assertEqual(['private from user1', 'public from user2'], self.get_timeline(self.token_user1))
+        self.assertEqual(['private from user2', 'public from user2'], self.get_timeline(self.token_user2))
+        # A single shared entry for the public idea
+        self.assertEqual(1, TimelineEntry.objects.filter(owner__isnull=True).count())
+
+    def test_follow_and_unfollow(self):
+        self.create_idea(self.token_user2, 'protected from user2', 'protected')
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+        self.accept_user1()
+        self.assertEqual(['protected from user2'], self.get_timeline(self.token_user1))
+
+        self.create_idea(self.token_user2, 'another protected from user2', 'protected')
+        self.assertEqual(
+            ['another protected from user2', 'protected from user2'],
+            self.get_timeline(self.token_user1)
+        )
+
+        response = self.query(
+            '''
+            mutation{
+                deleteFollowed(followed: "user2"){
+                    followed{
+                        username
+                    }
+                }
+            }
+            ''',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+        )
+        self.assertResponseNoErrors(response)
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+    def test_update_visibility(self):
+        self.accept_user1()
+        idea_id = self.create_idea(self.token_user2, 'idea from user2', 'private')
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+        response = self.query(
+            '''
+            mutation updateIdea($id: ID!){
+                updateIdea(ideaData: {id: $id, visibility: "protected"}){
+                    idea{
+                        visibility
+                    }
+                }
+            }
+            ''',
+            variables={'id': idea_id},
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user2}'}
+        )
+        self.assertResponseNoErrors(response)
+        self.assertEqual(['idea from user2'], self.get_timeline(self.token_user1))
+
+    @override_settings(TIMELINE={'FANOUT_MAX_FOLLOWERS': 0})
+    def test_fallback_for_accounts_with_many_followers(self):
+        self.accept_user1()
+        self.create_idea(self.token_user2, 'protected from user2', 'protected')
+
+        # The idea is not copied into the timeline of user1, that reads the feed with the fallback query
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user1).exists())
+        self.assertEqual(['protected from user2'], self.get_timeline(self.token_user1))
+
+    @override_settings(TIMELINE={'FANOUT_MAX_FOLLOWERS': 0})
+    def test_partial_timeline_flag(self):
+        self.accept_user1()
+        self.assertFalse(Profile.objects.get(user=self.user1).partial_timeline)
+
+        # user2 stops fanning out its ideas, and user1 reads the fallback until it unfollows it
+        self.create_idea(self.token_user2, 'protected from user2', 'protected')
+        self.assertTrue(Profile.objects.get(user=self.user1).partial_timeline)
+        response = self.query(
+            'mutation{ deleteFollowed(followed: "user2"){ followed{ username } } }',
+            headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+        )
+        self.assertResponseNoErrors(response)
+        self.assertFalse(Profile.objects.get(user=self.user1).partial_timeline)
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+    @override_settings(TIMELINE={'FANOUT_MAX_FOLLOWERS': 0})
+    def test_fanout_disabled_once(self):
+        _, _, token_user3 = create_user('user3', 'user3@gmail.com', 'user3')
+        self.accept_user1()
+        self.get_timeline(self.token_user1)
+        self.get_timeline(token_user3)
+
+        # Only the tokens of user2 and its followers are forgotten
+        self.create_idea(self.token_user2, 'protected 1', 'protected')
+        self.assertIsNone(get_tokens_cache().get(self.token_user1))
+        self.assertIsNotNone(get_tokens_cache().get(token_user3))
+
+        # Its next ideas neither load its followers nor update their flags
+        with CaptureQueriesContext(connection) as context:
+            self.create_idea(self.token_user2, 'protected 2', 'protected')
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual([], [sql for sql in queries if 'FROM "api_follow"' in sql and 'LIMIT' in sql])
+        self.assertEqual([], [sql for sql in queries if 'UPDATE "api_profile" SET "partial_timeline"' in sql])
+        self.assertEqual(['protected 2', 'protected 1'], self.get_timeline(self.token_user1))
+
+    def test_pages_merge_both_buckets(self):
+        self.create_idea(self.token_user1, 'private 1', 'private')
+        self.create_idea(self.token_user2, 'public 2', 'public')
+        self.create_idea(self.token_user1, 'private 3', 'private')
+
+        texts = []
+        after = None
+        while True:
+            response = self.query(
+                '''
+                query allIdeas($after: String){
+                    allIdeas(first: 1, after: $after){
+                        edges{ node{ text } }
+                        pageInfo{ hasNextPage endCursor }
+                    }
+                }
+                ''',
+                variables={'after': after},
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+            self.assertResponseNoErrors(response)
+            page = json.loads(response.content)['data']['allIdeas']
+            texts += [edge['node']['text'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+
+        self.assertEqual(['private 3', 'public 2', 'private 1'], texts)
+
+    def test_rebuild_command(self):
+        self.accept_user1()
+        Idea.objects.create(user=self.user2, text='protected from user2', visibility='protected')
+        Idea.objects.create(user=self.user2, text='public from user2', visibility='public')
+        self.assertEqual([], self.get_timeline(self.token_user1))
+
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(['public from user2', 'protected from user2'], self.get_timeline(self.token_user1))
@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+from graphene_django.utils.testing import GraphQLTestCase
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api import tracing
+from api.models import Idea
+from .utils import create_user
+
+
+class TestTracing(GraphQLTestCase):
+    QUERY = '''
+        query timeline{
+            allIdeas{
+                edges{
+                    node{
+                        text
+                    }
+                }
+            }
+        }
+        '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1, _, cls.token_user1 = create_user('user1', 'user1@gmail.com', 'user1')
+        Idea.objects.create(text='idea', visibility='public', user=cls.user1)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traces.jsonl')
+        # The exporter of the settings of each test
+        tracing._exporter = None
+        self.addCleanup(setattr, tracing, '_exporter', None)
+
+    def get_traces(self, **options):
+        with override_settings(TRACING={'SAMPLE_RATE': 1, 'FILE': self.path, **options}):
+            response = self.query(self.QUERY, headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'})
+        self.assertResponseNoErrors(response)
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as traces:
+            return [json.loads(line) for line in traces]
+
+    def test_spans(self):
+        traces = self.get_traces(SLOW_FIELD_MS=0)
+        self.assertEqual(1, len(traces))
+        root, *spans = traces[0]
+
+        self.assertEqual('timeline', root['name'])
+        self.assertEqual('SERVER', root['kind'])
+        self.assertEqual(['auth', 'Query.allIdeas', 'execute', 'serialize'], [span['name'] for span in spans])
+        for span in spans:
+            self.assertEqual(root['traceId'], span['traceId'])
+            self.assertEqual(root['id'], span['parentId'])
+            self.assertGreaterEqual(span['timestamp'], root['timestamp'])
+            self.assertLessEqual(span['duration'], root['duration'])
+
+    def test_only_slow_fields(self):
+        traces = self.get_traces(SLOW_FIELD_MS=60 * 1000)
+        self.assertEqual(['timeline', 'auth', 'execute', 'serialize'], [span['name'] for span in traces[0]])
+
+    def test_not_sampled(self):
+        self.assertEqual([], self.get_traces(SAMPLE_RATE=0))
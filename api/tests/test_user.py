@@ -1,5 +1,7 @@
 import json
 from graphene_django.utils.testing import GraphQLTestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from api.models import User
 from .utils import create_user
@@ -94,6 +96,30 @@ class TestUser(GraphQLTestCase):
         deleted_user = User.objects.filter(username='user1').first()
         self.assertEqual(None, deleted_user)
 
+    def test_search_loads_only_selected_fields(self):
+        # Do query
+        with CaptureQueriesContext(connection) as context:
+            response = self.query(
+                '''
+                {
+                    user(username: "user"){
+                        username
+                    }
+                }
+                ''',
+                headers={'HTTP_AUTHORIZATION': f'JWT {self.token_user1}'}
+            )
+        content = json.loads(response.content)
+
+        # Check response and the columns read by the search
+        self.assertResponseNoErrors(response)
+        self.assertEqual([{'username': 'user1'}], content['data']['user'])
+        search = [query['sql'] for query in context.captured_queries if 'LIKE' in query['sql']]
+        self.assertEqual(1, len(search))
+        self.assertIn('"username"', search[0])
+        self.assertNotIn('"password"', search[0])
+        self.assertNotIn('"email"', search[0])
+
     def test_login(self):
         response = self.query(
             '''
@@ -0,0 +1,187 @@
+from itertools import islice
+
+# Third party
+from django.conf import settings
+from django.db.models import Q, Count, F, Exists, OuterRef
+
+# Local
+from .auth import get_tokens_cache, invalidate_followers, invalidate_users
+from .models import User, Profile, Idea, Follow, TimelineEntry
+
+
+FANOUT_MAX_FOLLOWERS = 10000
+BATCH_SIZE = 1000
+
+
+def get_fanout_limit():
+    return getattr(settings, 'TIMELINE', {}).get('FANOUT_MAX_FOLLOWERS', FANOUT_MAX_FOLLOWERS)
+
+
+def _insert(entries):
+    """ Insert the entries in batches, without loading them all in memory """
+    entries = iter(entries)
+    batch = list(islice(entries, BATCH_SIZE))
+    while batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        batch = list(islice(entries, BATCH_SIZE))
+
+
+def has_partial_timeline(user):
+    """ Whether the user follows an account whose protected ideas are not fanned out """
+    partial = getattr(user, 'partial_timeline', None)
+    if partial is None:
+        # Users not loaded by the authentication, which selects the flag along with them
+        partial = Profile.objects.filter(user=user, partial_timeline=True).exists()
+    return partial
+
+
+def home_timeline(user):
+    """
+    Timeline entries visible for the user, as the querysets of its own bucket and the public one, or None when
+    the timeline is not complete because the user follows an account whose protected ideas are not fanned out,
+    and the feed must be built at read time. Each bucket is read as an ordered range scan of
+    timeline_owner_date_idx, and the paginator merges them, instead of a BitmapOr of both and a sort.
+    """
+    if has_partial_timeline(user):
+        return None
+
+    # The entries have the date of their idea, which lets PostgreSQL read a single partition of the ideas for each one
+    entries = TimelineEntry.objects.filter(idea__created_date=F('created_date')).select_related('idea')
+    return [entries.filter(owner=user), entries.filter(owner__isnull=True)]
+
+
+def has_fanout(user):
+    """ Whether the protected ideas of the user are copied into the timelines of its followers """
+    fanout = getattr(user, 'timeline_fanout', None)
+    if fanout is None:
+        # Users not loaded by the authentication, which selects the flag along with them
+        fanout = not Profile.objects.filter(user=user, timeline_fanout=False).exists()
+    return fanout
+
+
+def disable_fanout(user):
+    """
+    The user has too many followers, which will read the feed with the fallback query. Only the process that
+    flips the flag updates the followers, and forgets the tokens it has cached of them and of the user
+    """
+    user.timeline_fanout = False
+    if Profile.objects.filter(user=user, timeline_fanout=True).update(timeline_fanout=False):
+        Profile.objects.filter(user__following__followee=user).update(partial_timeline=True)
+        invalidate_users([user.pk])
+        invalidate_followers(user)
+
+
+def update_partial_flags(users=None):
+    """
+    Recalculates the partial_timeline flag of the users (all of them by default) from the accounts they follow,
+    and forgets their cached tokens, which have the flag
+    """
+    profiles = Profile.objects.all() if users is None else Profile.objects.filter(user__in=users)
+    profiles.update(partial_timeline=Exists(
+        Follow.objects.filter(follower=OuterRef('user'), followee__profile__timeline_fanout=False)
+    ))
+    if users is None:
+        get_tokens_cache().clear()
+    else:
+        invalidate_users(getattr(user, 'pk', user) for user in users)
+
+
+def fan_out_idea(idea):
+    """ Copy a new idea into every timeline where it is visible """
+    fan_out_ideas(idea.user, [idea])
+
+
+def fan_out_ideas(user, ideas):
+    """ Copy new ideas of a user into every timeline where they are visible, loading its followers only once """
+    entries = []
+    followers = None
+    for idea in ideas:
+        if idea.visibility == 'public':
+            entries.append(TimelineEntry(owner=None, idea=idea, created_date=idea.created_date))
+            continue
+
+        entries.append(TimelineEntry(owner=user, idea=idea, created_date=idea.created_date))
+        if idea.visibility == 'protected':
+            if followers is None and not has_fanout(user):
+                followers = []
+            elif followers is None:
+                limit = get_fanout_limit()
+                followers = list(Follow.objects.filter(followee=user).values_list('follower', flat=True)[:limit + 1])
+                if len(followers) > limit:
+                    disable_fanout(user)
+                    followers = []
+            entries += [
+                TimelineEntry(owner_id=follower, idea=idea, created_date=idea.created_date)
+                for follower in followers
+            ]
+
+    _insert(entries)
+
+
+def refresh_idea(idea):
+    """ Rewrite the entries of an idea whose visibility has changed """
+    TimelineEntry.objects.filter(idea=idea).delete()
+    fan_out_idea(idea)
+
+
+def follow_added(follower, followed):
+    """ The protected ideas of the followed user are now visible for the follower """
+    follows_added([follower], followed)
+
+
+def follows_added(followers, followed):
+    """ The protected ideas of the followed user are now visible for all the new followers """
+    if not followers:
+        return
+    ideas = Idea.objects.filter(user=followed, visibility='protected').values_list('id', 'created_date')
+    _insert(
+        TimelineEntry(owner=follower, idea_id=pk, created_date=date)
+        for pk, date in ideas.iterator()
+        for follower in followers
+    )
+    update_partial_flags(followers)
+
+
+def follow_removed(follower, followed):
+    TimelineEntry.objects.filter(owner=follower, idea__user=followed).delete()
+    update_partial_flags([follower])
+
+
+def rebuild_public():
+    TimelineEntry.objects.filter(owner__isnull=True).delete()
+    ideas = Idea.objects.filter(visibility='public').values_list('id', 'created_date')
+    _insert(TimelineEntry(owner=None, idea_id=pk, created_date=date) for pk, date in ideas.iterator())
+
+
+def rebuild_user(user):
+    """ Rebuild the timeline of a user from its own ideas and the ideas of the users it follows """
+    TimelineEntry.objects.filter(owner=user).delete()
+
+    ideas = Idea.objects.filter(
+        Q(user=user, visibility__in=['protected', 'private'])
+        | Q(user__in=Follow.objects.filter(follower=user).values('followee'), visibility='protected')
+    ).values_list('id', 'created_date')
+    _insert(TimelineEntry(owner=user, idea_id=pk, created_date=date) for pk, date in ideas.iterator())
+
+
+def update_fanout_flags():
+    limit = get_fanout_limit()
+    crowded = Profile.objects.annotate(followers=Count('user__followers')).filter(followers__gt=limit)
+    Profile.objects.exclude(id__in=crowded.values('id')).update(timeline_fanout=True)
+    Profile.objects.filter(id__in=crowded.values('id')).update(timeline_fanout=False)
+    update_partial_flags()
+
+
+def rebuild_timeline(users=None):
+    """
+    Rebuild the public bucket and the timeline of the given users (all of them by default).
+    The fan-out flags are only recalculated on a full rebuild, because enabling the fan-out of an account
+    requires the timelines of all its followers to be rebuilt.
+    """
+    if users is None:
+        update_fanout_flags()
+        rebuild_public()
+        users = User.objects.all()
+
+    for user in users.iterator():
+        rebuild_user(user)
@@ -0,0 +1,172 @@
+import json
+import logging
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from threading import Lock
+from uuid import uuid4
+
+# Third party
+from django.conf import settings
+from graphene.utils.thenables import maybe_thenable
+
+
+SAMPLE_RATE = 0
+SLOW_FIELD_MS = 50
+SERVICE_NAME = 'z1-graphql'
+
+logger = logging.getLogger(__name__)
+
+_exporter = None
+
+
+def get_options():
+    return getattr(settings, 'TRACING', {})
+
+
+def new_id():
+    return uuid4().hex[:16]
+
+
+class Trace:
+    """ Spans of a request in the Zipkin v2 format, children of the span of the whole request """
+
+    def __init__(self):
+        self.trace_id = uuid4().hex
+        self.id = new_id()
+        self.start = time.time()
+        self.operation = None
+        self.spans = []
+        # The root fields of the asynchronous view add their spans from several threads
+        self.lock = Lock()
+
+    def add_span(self, name, start, duration, tags=None):
+        span = {
+            'traceId': self.trace_id,
+            'id': new_id(),
+            'parentId': self.id,
+            'name': name,
+            'timestamp': int(start * 1000000),
+            'duration': max(int(duration * 1000000), 1),
+            'localEndpoint': {'serviceName': get_options().get('SERVICE_NAME', SERVICE_NAME)},
+            'tags': tags or {},
+        }
+        with self.lock:
+            self.spans.append(span)
+
+    def get_spans(self):
+        root = {
+            'traceId': self.trace_id,
+            'id': self.id,
+            'kind': 'SERVER',
+            'name': self.operation or 'graphql',
+            'timestamp': int(self.start * 1000000),
+            'duration': max(int((time.time() - self.start) * 1000000), 1),
+            'localEndpoint': {'serviceName': get_options().get('SERVICE_NAME', SERVICE_NAME)},
+            'tags': {'graphql.operation': self.operation or ''},
+        }
+        return [root, *self.spans]
+
+
+class FileExporter:
+    """ Appends the spans of each trace to a file, one JSON list per line """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+
+    def export(self, spans):
+        line = json.dumps(spans)
+        with self.lock, open(self.path, 'a') as output:
+            output.write(line + '\n')
+
+
+class ZipkinExporter:
+    """ Sends the spans of each trace to a Zipkin compatible collector, in a background thread """
+
+    def __init__(self, url):
+        self.url = url
+        self.pool = ThreadPoolExecutor(1, thread_name_prefix='tracing')
+
+    def export(self, spans):
+        self.pool.submit(self.send, spans)
+
+    def send(self, spans):
+        request = urllib.request.Request(
+            self.url, json.dumps(spans).encode(), {'Content-Type': 'application/json'}, method='POST'
+        )
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except OSError:
+            logger.warning('The spans could not be sent to %s', self.url, exc_info=True)
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        options = get_options()
+        if options.get('EXPORTER', 'file') == 'zipkin':
+            _exporter = ZipkinExporter(options['ZIPKIN_URL'])
+        else:
+            _exporter = FileExporter(options.get('FILE', 'traces.jsonl'))
+
+    return _exporter
+
+
+def start_trace(request):
+    """ Starts the trace of the request if it is sampled """
+    sampled = random.random() < get_options().get('SAMPLE_RATE', SAMPLE_RATE)
+    request.trace = Trace() if sampled else None
+
+    return request.trace
+
+
+def finish_trace(request):
+    trace = getattr(request, 'trace', None)
+    request.trace = None
+    if trace is not None:
+        get_exporter().export(trace.get_spans())
+
+
+@contextmanager
+def span(request, name):
+    """ Span of a phase of the request (auth, execute, serialize), if its trace is sampled """
+    trace = getattr(request, 'trace', None)
+    if trace is None:
+        yield
+        return
+
+    start, counter = time.time(), time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter() - counter)
+
+
+class TracingMiddleware:
+    """
+    Times the resolvers of the Query and Mutation fields of the sampled requests (TRACING), including the
+    middlewares before it. Only the fields slower than SLOW_FIELD_MS get a span, the fast ones are not recorded.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = getattr(info.context, 'trace', None)
+        if trace is None or len(info.path) > 1:
+            return next(root, info, **kwargs)
+        if trace.operation is None:
+            trace.operation = info.operation.name.value if info.operation.name else 'anonymous'
+
+        name = f'{info.parent_type.name}.{info.field_name}'
+        start, counter = time.time(), time.perf_counter()
+        return maybe_thenable(next(root, info, **kwargs), partial(self.on_resolve, trace, name, start, counter))
+
+    @staticmethod
+    def on_resolve(trace, name, start, counter, result):
+        duration = time.perf_counter() - counter
+        if duration * 1000 >= get_options().get('SLOW_FIELD_MS', SLOW_FIELD_MS):
+            trace.add_span(name, start, duration, {'graphql.field': name})
+
+        return result
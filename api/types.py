@@ -1,6 +1,38 @@
 import graphene
+from graphene.utils.str_converters import to_camel_case
 from graphene_django.types import DjangoObjectType
 from api.models import User, FollowRequest, Idea
+from api.loaders import get_loaders
+from api.optimizer import get_selections
+
+
+def selects_counters(info):
+    """ Whether the selection of a field of UserType reads the counters of the profile """
+    selections = get_selections(info, info.field_asts)
+    return any(to_camel_case(counter) in selections for counter in UserType.optimizer_hints)
+
+
+def load_user(instance, field, info):
+    """
+    Resolve a foreign key to User through the request DataLoader, unless it is already loaded.
+    The users selecting their counters are loaded along with their profile, in the same query
+    """
+    descriptor = getattr(type(instance), field)
+    with_profile = selects_counters(info)
+    if descriptor.is_cached(instance):
+        user = getattr(instance, field)
+        if user is None or not with_profile or User.profile.is_cached(user):
+            return user
+
+    loaders = get_loaders(info)
+    loader = loaders.user_with_profile if with_profile else loaders.user
+    return loader.load(getattr(instance, descriptor.field.attname))
+
+
+def get_counter(user, counter):
+    """ Counter of the profile of a user, 0 for the users without profile (created by createsuperuser) """
+    profile = getattr(user, 'profile', None)
+    return getattr(profile, counter) if profile is not None else 0
 
 
 class UserType(DjangoObjectType):
@@ -8,14 +40,57 @@ class UserType(DjangoObjectType):
         model = User
         fields = ('username', 'email', 'password')
 
+    # Denormalized counters of the profile, selected along with the users by the optimizer
+    followers_count = graphene.Int()
+    followed_count = graphene.Int()
+    idea_count = graphene.Int()
+    pending_request_count = graphene.Int()
+    optimizer_hints = {
+        'followers_count': ['profile__followers_count'],
+        'followed_count': ['profile__followed_count'],
+        'idea_count': ['profile__idea_count'],
+        'pending_request_count': ['profile__pending_request_count'],
+    }
+
+    def resolve_followers_count(self, info):
+        return get_counter(self, 'followers_count')
+
+    def resolve_followed_count(self, info):
+        return get_counter(self, 'followed_count')
+
+    def resolve_idea_count(self, info):
+        return get_counter(self, 'idea_count')
+
+    def resolve_pending_request_count(self, info):
+        return get_counter(self, 'pending_request_count')
+
 
 class FollowRequestType(DjangoObjectType):
     class Meta:
         model = FollowRequest
         fields = '__all__'
 
+    def resolve_from_user(self, info):
+        return load_user(self, 'from_user', info)
+
+    def resolve_to_user(self, info):
+        return load_user(self, 'to_user', info)
+
 
 class IdeaType(DjangoObjectType):
     class Meta:
         model = Idea
-        fields = '__all__'
+        exclude = ('search_vector',)
+
+    def resolve_user(self, info):
+        return load_user(self, 'user', info)
+
+
+class IdeaConnection(graphene.relay.Connection):
+    class Meta:
+        node = IdeaType
+
+
+class UserConnection(graphene.relay.Connection):
+    class Meta:
+        node = UserType
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    Thread safe mapping that keeps only the most recently used `maxsize` items.
+    With a `ttl` (in seconds), the items also expire that long after being set.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            expires, value = self.items[key]
+            if expires is not None and expires <= time.monotonic():
+                del self.items[key]
+                return default
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            self.items[key] = expires, value
+            self.items.move_to_end(key)
+            if len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def delete_matching(self, predicate):
+        """ Removes the items whose value matches the predicate """
+        with self.lock:
+            for key in [key for key, (expires, value) in self.items.items() if predicate(value)]:
+                del self.items[key]
+
+    def values(self):
+        """ Values of the items not expired yet """
+        now = time.monotonic()
+        with self.lock:
+            return [value for expires, value in self.items.values() if expires is None or expires > now]
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
@@ -1,3 +1,234 @@
-from django.shortcuts import render
+import asyncio
+import json
 
-# Create your views here.
+# Third party
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse
+from django.utils.decorators import classonlymethod
+from graphene_django.views import GraphQLView as BaseGraphQLView, HttpError
+from graphql.execution import ExecutionResult
+from promise import Promise
+
+# Local
+from . import instrumentation, metrics, response_cache, routers, tracing
+from .auth import authenticate_request
+from .backend import get_backend, get_query_hash
+from .executors import DatabaseExecutor, run_in_pool
+
+
+PERSISTED_QUERIES_TIMEOUT = 24 * 60 * 60
+
+
+def get_persisted_query(query, extensions):
+    """
+    Automatic Persisted Queries: the client sends only the sha256 of a query it has sent before.
+    If the hash is unknown the client must send it again with the query, and it is stored.
+    """
+    persisted_query = extensions.get('persistedQuery')
+    if not persisted_query:
+        return query
+
+    query_hash = persisted_query.get('sha256Hash')
+    key = f'graphql:persisted-query:{query_hash}'
+    if query is None:
+        query = cache.get(key)
+        if query is None:
+            raise HttpError(HttpResponse(), 'PersistedQueryNotFound')
+    else:
+        if get_query_hash(query) != query_hash:
+            raise HttpError(HttpResponseBadRequest(), 'provided sha does not match query')
+        options = getattr(settings, 'GRAPHQL_DOCUMENTS', {})
+        cache.set(key, query, options.get('PERSISTED_QUERIES_TIMEOUT', PERSISTED_QUERIES_TIMEOUT))
+
+    return query
+
+
+class GraphQLView(BaseGraphQLView):
+    """ GraphQL endpoint with cached documents, Automatic Persisted Queries and cached responses """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('backend', get_backend())
+        super().__init__(**kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        tracing.start_trace(request)
+        try:
+            with tracing.span(request, 'auth'):
+                authenticate_request(request)
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            tracing.finish_trace(request)
+
+    def json_encode(self, request, d, pretty=False):
+        with tracing.span(request, 'serialize'):
+            return super().json_encode(request, d, pretty)
+
+    @staticmethod
+    def get_graphql_params(request, data):
+        query, variables, operation_name, id = BaseGraphQLView.get_graphql_params(request, data)
+
+        extensions = request.GET.get('extensions') or data.get('extensions') or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest('Extensions are invalid JSON.'))
+
+        return get_persisted_query(query, extensions), variables, operation_name, id
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        document = self.get_document(request, query)
+        key, invalidated_at = self.get_response_key(request, document, variables, operation_name)
+        if key is not None:
+            cached_data = response_cache.get_response(key)
+            if cached_data is not None:
+                return ExecutionResult(data=cached_data)
+
+        operation_type = self.get_operation_type(document, operation_name)
+        database = routers.get_read_database(request.user, operation_type, invalidated_at)
+        try:
+            with tracing.span(request, 'execute'), routers.reading_from(database):
+                result = super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            instrumentation.finish(request)
+        if operation_type == 'mutation':
+            routers.stick_to_primary(request.user)
+        if key is not None and result is not None and not result.errors and not result.invalid:
+            response_cache.set_response(key, result.data)
+
+        return result
+
+    def get_document(self, request, query):
+        if not query:
+            return None
+        try:
+            return self.get_backend(request).document_from_string(self.schema, query)
+        except Exception:
+            # Syntax errors are reported when executing
+            return None
+
+    @staticmethod
+    def get_operation_type(document, operation_name):
+        return document.get_operation_type(operation_name) if document is not None else None
+
+    @staticmethod
+    def get_response_key(request, document, variables, operation_name):
+        """ Key of the cached response and the time its data was last invalidated, (None, None) if not cacheable """
+        if document is None:
+            return None, None
+
+        return response_cache.get_response_key(document, request.user, variables, operation_name)
+
+
+class AsyncGraphQLView(GraphQLView):
+    """
+    GraphQL endpoint for ASGI. The request is handled in the event loop, so no thread is held while waiting for
+    the client, and the operations are executed with the DatabaseExecutor: every resolver runs in its bounded
+    thread pool, the root fields of queries concurrently. ATOMIC_MUTATIONS is not supported.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Marked as a coroutine function like Django does since 4.1, so it is awaited by the handler
+        view = super().as_view(**initkwargs)
+        view._is_coroutine = asyncio.coroutines._is_coroutine
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() not in ('get', 'post') or self.batch:
+            return await run_in_pool(super().dispatch, request, *args, **kwargs)
+
+        try:
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await run_in_pool(super().dispatch, request, *args, **kwargs)
+
+            tracing.start_trace(request)
+            with tracing.span(request, 'auth'):
+                await run_in_pool(authenticate_request, request)
+            result, status_code = await self.get_response_async(request, data)
+            return HttpResponse(status=status_code, content=result, content_type='application/json')
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(request, {'errors': [self.format_error(e)]})
+            return response
+        finally:
+            tracing.finish_trace(request)
+
+    async def get_response_async(self, request, data):
+        query, variables, operation_name, id = await run_in_pool(self.get_graphql_params, request, data)
+        with tracing.span(request, 'execute'):
+            execution_result = await self.execute_graphql_request_async(request, query, variables, operation_name)
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response['errors'] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response['data'] = execution_result.data
+
+        return self.json_encode(request, response), status_code
+
+    async def execute_graphql_request_async(self, request, query, variables, operation_name):
+        if not query:
+            raise HttpError(HttpResponseBadRequest('Must provide query string.'))
+
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        key, invalidated_at = await run_in_pool(self.get_response_key, request, document, variables, operation_name)
+        if key is not None:
+            cached_data = await run_in_pool(response_cache.get_response, key)
+            if cached_data is not None:
+                return ExecutionResult(data=cached_data)
+
+        operation_type = document.get_operation_type(operation_name)
+        if request.method.lower() == 'get' and operation_type and operation_type != 'query':
+            raise HttpError(HttpResponseNotAllowed(
+                ['POST'], f'Can only perform a {operation_type} operation from a POST request.'
+            ))
+
+        database = await run_in_pool(routers.get_read_database, request.user, operation_type, invalidated_at)
+        # Started before the execution, so the database threads record the operation too
+        instrumentation.get_recorder(request)
+        try:
+            # The database threads run in a copy of this context
+            with routers.reading_from(database):
+                result = await Promise.resolve(document.execute(
+                    root_value=self.get_root_value(request),
+                    variable_values=variables,
+                    operation_name=operation_name,
+                    context_value=self.get_context(request),
+                    middleware=self.get_middleware(request),
+                    executor=DatabaseExecutor(),
+                    return_promise=True
+                ))
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+        finally:
+            instrumentation.finish(request)
+
+        if operation_type == 'mutation':
+            await run_in_pool(routers.stick_to_primary, request.user)
+        if key is not None and not result.errors and not result.invalid:
+            await run_in_pool(response_cache.set_response, key, result.data)
+
+        return result
+
+
+def metrics_view(request):
+    """ Counters of the process, for the staff users unless METRICS['PUBLIC'] """
+    if not getattr(settings, 'METRICS', {}).get('PUBLIC', False):
+        authenticate_request(request)
+        if not request.user.is_staff:
+            return JsonResponse(
+                {'errors': [{'message': 'You do not have permission to perform this action'}]}, status=403
+            )
+
+    return JsonResponse(metrics.get_metrics())
@@ -0,0 +1,201 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Third party
+from graphql.execution import ExecutionResult
+from graphql_jwt.exceptions import JSONWebTokenError
+from rx import Observable
+
+# Local
+from .auth import get_user_by_token
+from .backend import get_backend
+from .executors import run_in_pool
+from .models import Idea
+from .schema import schema
+from .subscriptions import get_subscribers
+from .views import GraphQLView
+
+
+PATH = '/graphql/'
+PROTOCOL = 'graphql-ws'
+
+
+def get_token(payload):
+    """ JWT of the connection_init payload, as `authToken` or as an `Authorization` header value """
+    token = payload.get('authToken') or payload.get('Authorization') or ''
+    return token.split(' ', 1)[1] if token.startswith('JWT ') else token
+
+
+class Operation:
+    """ newIdeas subscription started by a connection, with the queue of the ideas delivered to it """
+
+    def __init__(self, document, variables, operation_name):
+        self.document = document
+        self.variables = variables
+        self.operation_name = operation_name
+        self.queue = asyncio.Queue()
+        self.key = None
+        self.task = None
+
+
+class Connection:
+    """
+    WebSocket of a client using the graphql-ws protocol (subscriptions-transport-ws). The client authenticates in
+    connection_init with its JWT, and then starts and stops subscriptions. Each subscription is executed again
+    for every new idea its viewer is allowed to see, with the idea as root value, and sent as a data message.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.user = None
+        self.operations = {}
+        self.loop = asyncio.get_running_loop()
+
+    async def send_message(self, type, id=None, payload=None):
+        message = {'type': type}
+        if id is not None:
+            message['id'] = id
+        if payload is not None:
+            message['payload'] = payload
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def handle(self, message):
+        """ Handles a message of the client, returning False when the connection must be closed """
+        type = message.get('type')
+        if type == 'connection_init':
+            await self.init(message.get('payload') or {})
+        elif type == 'start':
+            await self.start(message.get('id'), message.get('payload') or {})
+        elif type == 'stop':
+            await self.stop(message.get('id'))
+        elif type == 'connection_terminate':
+            return False
+        else:
+            await self.send_message('error', message.get('id'), {'message': f'Unknown message type "{type}"'})
+
+        return True
+
+    async def init(self, payload):
+        try:
+            self.user = await run_in_pool(get_user_by_token, get_token(payload), None)
+        except JSONWebTokenError as e:
+            self.user = None
+            await self.send_message('connection_error', payload={'message': str(e)})
+            return
+        if self.user is None:
+            await self.send_message('connection_error', payload={'message': 'Invalid token'})
+        else:
+            await self.send_message('connection_ack')
+
+    async def start(self, id, payload):
+        if self.user is None:
+            await self.send_message('error', id, {'message': 'You do not have permission to perform this action'})
+            return
+        if id in self.operations:
+            await self.stop(id)
+
+        query = payload.get('query') or ''
+        try:
+            document = get_backend().document_from_string(schema, query)
+        except Exception as e:
+            await self.send_message('error', id, GraphQLView.format_error(e))
+            return
+        if document.get_operation_type(payload.get('operationName')) != 'subscription':
+            await self.send_message('error', id, {'message': 'Only subscriptions are supported over WebSocket'})
+            return
+
+        operation = Operation(document, payload.get('variables'), payload.get('operationName'))
+        # Validation and cost errors are reported before subscribing, the resolver does nothing until an idea arrives
+        result = self.execute_document(operation, None)
+        if isinstance(result, ExecutionResult):
+            await self.send_message('error', id, GraphQLView.format_error(result.errors[0]))
+            return
+        operation.key = get_subscribers().add(self.user.pk, lambda idea_id: self.deliver(operation, idea_id))
+        operation.task = asyncio.ensure_future(self.run(id, operation))
+        self.operations[id] = operation
+
+    def deliver(self, operation, idea_id):
+        """ Called by the broker from any thread """
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(operation.queue.put_nowait, idea_id)
+
+    async def run(self, id, operation):
+        while True:
+            idea_id = await operation.queue.get()
+            result = await run_in_pool(self.execute, operation, idea_id)
+            if result is None:
+                continue
+
+            payload = {'data': result.data}
+            if result.errors:
+                payload['errors'] = [GraphQLView.format_error(error) for error in result.errors]
+            await self.send_message('data', id, payload)
+
+    def execute_document(self, operation, root_value):
+        """ Observable of the results of the subscription, or the ExecutionResult of its errors """
+        return operation.document.execute(
+            root_value=root_value,
+            variable_values=operation.variables,
+            operation_name=operation.operation_name,
+            context_value=SimpleNamespace(user=self.user),
+            allow_subscriptions=True
+        )
+
+    def execute(self, operation, idea_id):
+        """ Result of the subscription for a new idea, None if it has been deleted since it was published """
+        idea = Idea.objects.select_related('user').filter(pk=idea_id).first()
+        if idea is None:
+            return None
+
+        result = self.execute_document(operation, idea)
+        if not isinstance(result, Observable):
+            return result
+
+        # The resolver emits only the idea, synchronously
+        results = []
+        result.subscribe(results.append)
+        return results[0] if results else ExecutionResult(data=None)
+
+    async def stop(self, id):
+        operation = self.operations.pop(id, None)
+        if operation is None:
+            return
+        get_subscribers().remove(operation.key)
+        operation.task.cancel()
+        await self.send_message('complete', id)
+
+    def close(self):
+        for operation in self.operations.values():
+            get_subscribers().remove(operation.key)
+            operation.task.cancel()
+        self.operations.clear()
+
+
+async def websocket_application(scope, receive, send):
+    """ ASGI application of the WebSocket connections, the newIdeas subscriptions in /graphql/ """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'] != PATH or PROTOCOL not in scope.get('subprotocols', []):
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+    await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+    connection = Connection(send)
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                data = json.loads(message.get('text') or '')
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                await connection.send_message('error', payload={'message': 'Messages must be JSON objects'})
+            elif not await connection.handle(data):
+                break
+        await send({'type': 'websocket.close', 'code': 1000})
+    finally:
+        connection.close()